@@ -0,0 +1,150 @@
+"""
+Composite write actions: several steps of a client flow in one transaction.
+
+    submit_feedback        resolve the student (find or create by email),
+                           check they are registered, insert the feedback
+    register_and_checkin   resolve the student, register them (or accept an
+                           existing registration), mark them present
+
+Every step runs on the caller's cursor inside one transaction. A step that
+cannot go ahead raises ActionFailed with an HTTP status and the step name;
+the caller rolls the whole transaction back, so an action either happens
+completely or leaves no trace (no half-created student, no registration
+without the check-in). Unexpected errors roll back the same way.
+
+StepTimer records how long each step took, for debug responses.
+"""
+import time
+from contextlib import contextmanager
+
+from seats import claim_seat, integrity_errors, REGISTERED, ALREADY_REGISTERED, EVENT_NOT_FOUND
+
+
+class ActionFailed(Exception):
+    def __init__(self, status, message, step=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.step = step
+
+
+class StepTimer:
+    def __init__(self):
+        self.steps = []             # [(name, milliseconds)]
+        self.current = None
+
+    @contextmanager
+    def step(self, name):
+        self.current = name
+        started = time.perf_counter()
+        try:
+            yield
+        except ActionFailed as e:
+            e.step = e.step or name
+            raise
+        finally:
+            self.steps.append((name, round((time.perf_counter() - started) * 1000, 3)))
+
+    def server_timing(self):
+        """Server-Timing header value"""
+        return ', '.join(f"{name.replace(' ', '_')};dur={ms}" for name, ms in self.steps)
+
+
+def _sql(query, use_mysql):
+    return query if use_mysql else query.replace('%s', '?')
+
+
+def _fetchone(cursor, query, params, use_mysql):
+    cursor.execute(_sql(query, use_mysql), params)
+    return cursor.fetchone()
+
+
+def resolve_student(cursor, student, use_mysql, new_id=None):
+    """
+    `student` is {'student_id'} or {'college_id', 'name', 'email'}.
+    Returns (student_id, is_new). `new_id` is called for the ID of a new
+    student on sharded deployments (None: AUTOINCREMENT).
+    """
+    student_id = student.get('student_id')
+    if student_id:
+        if not _fetchone(cursor, "SELECT 1 FROM Students WHERE student_id = %s", (student_id,), use_mysql):
+            raise ActionFailed(404, 'Student not found')
+        return student_id, False
+
+    college_id, name, email = student.get('college_id'), student.get('name'), student.get('email')
+    if not all([college_id, name, email]):
+        raise ActionFailed(400, 'student_id, or college_id, name and email, are required')
+    row = _fetchone(cursor, "SELECT student_id FROM Students WHERE email = %s", (email,), use_mysql)
+    if row:
+        return row[0], False
+    try:
+        if new_id is None:
+            cursor.execute(_sql("INSERT INTO Students (college_id, name, email) VALUES (%s, %s, %s)", use_mysql),
+                           (college_id, name, email))
+            return cursor.lastrowid, True
+        student_id = new_id(cursor)
+        cursor.execute(_sql("INSERT INTO Students (student_id, college_id, name, email) VALUES (%s, %s, %s, %s)",
+                            use_mysql), (student_id, college_id, name, email))
+        return student_id, True
+    except integrity_errors():
+        # Created concurrently under the same email: the failed INSERT did
+        # not end the transaction, so just read the winner's row
+        row = _fetchone(cursor, "SELECT student_id FROM Students WHERE email = %s", (email,), use_mysql)
+        if not row:
+            raise
+        return row[0], False
+
+
+def submit_feedback(cursor, timer, student, event_id, rating, feedback_text, use_mysql, new_id=None):
+    """Returns {'student_id', 'is_new_student'}"""
+    with timer.step('resolve student'):
+        student_id, is_new = resolve_student(cursor, student, use_mysql, new_id)
+
+    with timer.step('check registration'):
+        if not _fetchone(cursor, "SELECT 1 FROM Events WHERE event_id = %s", (event_id,), use_mysql):
+            raise ActionFailed(404, 'Event not found')
+        if not _fetchone(cursor, "SELECT 1 FROM Registrations WHERE student_id = %s AND event_id = %s",
+                         (student_id, event_id), use_mysql):
+            raise ActionFailed(403, 'Student is not registered for this event')
+
+    with timer.step('insert feedback'):
+        try:
+            cursor.execute(_sql(
+                "INSERT INTO Feedback (student_id, event_id, rating, feedback_text) VALUES (%s, %s, %s, %s)",
+                use_mysql
+            ), (student_id, event_id, rating, feedback_text))
+        except integrity_errors():
+            raise ActionFailed(409, 'Feedback already submitted for this student and event')
+
+    return {'student_id': student_id, 'is_new_student': is_new}
+
+
+def register_and_checkin(cursor, timer, student, event_id, use_mysql, attendance_upsert_sql, new_id=None):
+    """
+    Returns {'student_id', 'is_new_student', 'newly_registered', 'already_present'}.
+    A full event fails the whole action (409): a walk-in cannot be checked
+    in from the waitlist, and nothing is left on it.
+    """
+    with timer.step('resolve student'):
+        student_id, is_new = resolve_student(cursor, student, use_mysql, new_id)
+
+    with timer.step('register'):
+        outcome, _ = claim_seat(cursor, student_id, event_id, use_mysql)
+        if outcome == EVENT_NOT_FOUND:
+            raise ActionFailed(404, 'Event not found')
+        if outcome not in (REGISTERED, ALREADY_REGISTERED):
+            raise ActionFailed(409, 'Event is full')
+
+    with timer.step('check in'):
+        row = _fetchone(cursor, "SELECT status FROM Attendance WHERE student_id = %s AND event_id = %s",
+                        (student_id, event_id), use_mysql)
+        already_present = row is not None and row[0] == 'present'
+        if not already_present:
+            cursor.execute(attendance_upsert_sql, (student_id, event_id, 'present'))
+
+    return {
+        'student_id': student_id,
+        'is_new_student': is_new,
+        'newly_registered': outcome == REGISTERED,
+        'already_present': already_present,
+    }
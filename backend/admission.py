@@ -0,0 +1,179 @@
+"""
+Admission control for registration rushes.
+
+Requests are classified as:
+
+    exempt    /health, /metrics — never limited
+    priority  GET requests and /staff/* — may use every concurrency slot
+    write     everything else — per-client token bucket, and only the
+              non-reserved slots
+
+Concurrency slots are lock files held with flock(), so the limit is global
+across gunicorn workers on one host and a crashed worker releases its slot
+automatically. A request that finds no free slot waits in a bounded queue
+(also lock files) until its deadline, then is shed with 503 + Retry-After.
+Rate-limited clients get 429 + Retry-After.
+
+Token buckets are per worker process; the effective per-client rate is
+ADMISSION_CLIENT_RATE times the number of workers.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: slots are limited per process only
+    fcntl = None
+
+
+class TokenBuckets:
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()   # client -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, client, now=None):
+        """Consume one token. Returns 0 if allowed, else seconds until the next token."""
+        now = now or time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                self._buckets[client] = (tokens - 1, now)
+                self._buckets.move_to_end(client)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+                return 0
+            self._buckets[client] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+
+class SlotPool:
+    """A fixed set of slots, each one a lock file shared by all workers"""
+
+    def __init__(self, directory, name, size):
+        self.size = size
+        self.paths = [os.path.join(directory, f"{name}-{i}.lock") for i in range(size)]
+        self._fds = {}
+        self._held = set()             # slots held by threads of this process
+        self._lock = threading.Lock()
+        if fcntl is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _fd(self, index):
+        if index not in self._fds:
+            self._fds[index] = os.open(self.paths[index], os.O_RDWR | os.O_CREAT, 0o600)
+        return self._fds[index]
+
+    def try_acquire(self, indexes):
+        with self._lock:
+            for index in indexes:
+                if index in self._held:
+                    continue
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(self._fd(index), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                self._held.add(index)
+                return index
+        return None
+
+    def release(self, index):
+        with self._lock:
+            if index in self._held:
+                if fcntl is not None:
+                    fcntl.flock(self._fd(index), fcntl.LOCK_UN)
+                self._held.discard(index)
+
+
+class AdmissionController:
+    def __init__(self, directory, slots, reserved, queue_size, queue_timeout,
+                 client_rate, client_burst, max_queue_age=None, poll_interval=0.005):
+        self.slots = SlotPool(directory, 'slot', slots)
+        self.queue = SlotPool(directory, 'queue', queue_size)
+        self.shared = list(range(slots - reserved))
+        # Priority traffic tries its reserved slots first, then the shared ones
+        self.priority = list(range(slots - reserved, slots)) + self.shared
+        self.queue_timeout = queue_timeout
+        self.max_queue_age = max_queue_age
+        self.poll_interval = poll_interval
+        self.buckets = TokenBuckets(client_rate, client_burst)
+        self.stats = {'admitted': 0, 'rate_limited': 0, 'queue_full': 0, 'timed_out': 0, 'stale': 0}
+
+    @staticmethod
+    def classify(method, path):
+        if path in ('/health', '/metrics'):
+            return 'exempt'
+        if method in ('GET', 'HEAD', 'OPTIONS') or path.startswith('/staff/') or path == '/batch':
+            return 'priority'
+        return 'write'
+
+    def admit(self, traffic_class, client, request_start=None):
+        """
+        Returns (slot, None) when admitted, or (None, (status, message,
+        retry_after)) when the request should be rejected.
+        """
+        now = time.time()
+        # Already waited too long in the proxy / gunicorn backlog: the client
+        # has probably given up, so don't spend a database connection on it
+        if self.max_queue_age and request_start and now - request_start > self.max_queue_age:
+            self.stats['stale'] += 1
+            return None, (503, 'Server is busy, please retry', 1)
+
+        if traffic_class == 'write':
+            wait = self.buckets.take(client)
+            if wait:
+                self.stats['rate_limited'] += 1
+                return None, (429, 'Too many requests, please retry', math.ceil(wait))
+            indexes = self.shared
+        else:
+            indexes = self.priority
+
+        slot = self.slots.try_acquire(indexes)
+        if slot is not None:
+            self.stats['admitted'] += 1
+            return slot, None
+
+        # Bounded wait queue
+        ticket = self.queue.try_acquire(range(self.queue.size))
+        if ticket is None:
+            self.stats['queue_full'] += 1
+            return None, (503, 'Server is busy, please retry', 2)
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                slot = self.slots.try_acquire(indexes)
+                if slot is not None:
+                    self.stats['admitted'] += 1
+                    return slot, None
+        finally:
+            self.queue.release(ticket)
+        self.stats['timed_out'] += 1
+        return None, (503, 'Server is busy, please retry', max(1, math.ceil(self.queue_timeout)))
+
+    def release(self, slot):
+        self.slots.release(slot)
+
+
+def parse_request_start(value):
+    """
+    X-Request-Start as set by the proxy ("t=1700000000.123", or an integer
+    in seconds, milliseconds or microseconds). Returns epoch seconds or None.
+    """
+    if not value:
+        return None
+    try:
+        number = float(value.strip().lstrip('t='))
+    except ValueError:
+        return None
+    for scale in (1, 1e3, 1e6):
+        if number / scale < 1e10:
+            return number / scale
+    return None
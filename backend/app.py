@@ -1,10 +1,43 @@
 
 import os
-import pymysql
+import json
+import gzip
+import base64
 import sqlite3
+import time
+import zlib
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g, has_request_context, stream_with_context, send_from_directory
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.test import EnvironBuilder
+from werkzeug.wsgi import wrap_file
+from sharding import ShardRouter, DEFAULT_SHARD, merge_rows
+from replicas import ReplicaSet
+from archive import create_archive_schema
+from checkin import TokenSigner, ScanDedup, load_secret
+from auth import StudentTokens
+from admission import AdmissionController, parse_request_start
+from seats import (claim_seat, release_seat, set_capacity, REGISTERED, WAITLISTED,
+                   ALREADY_REGISTERED, ALREADY_WAITLISTED, EVENT_NOT_FOUND)
+from idempotency import IdempotencyStore, fingerprint, REPLAY, MISMATCH, IN_PROGRESS
+from actions import ActionFailed, StepTimer, submit_feedback, register_and_checkin
+from series import (parse_rule, expand, create_series_schema, create_occurrences, occurrences,
+                    update_occurrences, cancel_occurrences, carry_over_registrations, EDITABLE_FIELDS)
+from sync import (SYNC_TABLES, MAX_ACTIONS, MYSQL_SETTLE_SECONDS, create_changelog, changes_since, apply_actions,
+                  missing_triggers, changelog_horizon)
+from breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+import metrics
+from snapshots import SnapshotStore, SnapshotScheduler
+from cache import Cache, Generations, MemoryCache, SQLiteCache, TieredCache
+from tracing import TracingMiddleware, Exporter, TracedJSONProvider, current_trace, traced
+from profiling import Profiler, REQUEST_MODES, WORKER_MODES
+from recommend import RecommendationBuilder, RecommendationIndex, date_key
+from deletion import delete_events, delete_children
+from deadlines import QueryCancelled, BoundedConnection, BoundedCursor, bounded, watchdog
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -12,10 +45,73 @@ CORS(app)  # Enable CORS for all routes
 # Read DB config from config.py (env variables will be used in Railway)
 try:
     from config import MYSQL_CONFIG, USE_MYSQL
+    from config import SHARDS, SHARD_ID_STRIDE, SHARD_ID_FLOOR
+    from config import READ_REPLICAS, REPLICA_MAX_LAG, REPLICA_LAG_CHECK_INTERVAL, READ_AFTER_WRITE_PIN
+    from config import CHECKIN_SECRET, CHECKIN_SECRET_FILE, CHECKIN_TOKEN_GRACE, CHECKIN_DEDUP_SECONDS
+    from config import STUDENT_TOKEN_TTL
+    from config import (ADMISSION_CONTROL, ADMISSION_DIR, ADMISSION_SLOTS, ADMISSION_RESERVED_SLOTS,
+                        ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_CLIENT_RATE,
+                        ADMISSION_CLIENT_BURST, ADMISSION_MAX_QUEUE_AGE, TRUSTED_PROXY_COUNT)
+    from config import IDEMPOTENCY_DB, IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS
+    from config import DB_BREAKER_THRESHOLD, DB_BREAKER_PROBE_INTERVAL, MYSQL_CONNECT_TIMEOUT, MYSQL_FALLBACK_SQLITE
+    from config import SNAPSHOT_SCHEDULER, SNAPSHOT_DIR, SNAPSHOT_INTERVAL, SNAPSHOT_MAX_AGE
+    from config import (CACHE_BACKEND, CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_DB, CACHE_MAX_BYTES,
+                        CACHE_GENERATIONS_FILE)
+    from config import TRACE_SAMPLE_RATE, TRACE_FILE, TRACE_SERVICE_NAME
+    from config import ADMIN_TOKEN, PROFILE_DIR, PROFILE_SAMPLE_INTERVAL, PROFILE_MAX_SECONDS
+    from config import BATCH_MAX_REQUESTS, BATCH_MAX_PARALLEL
+    from config import RECOMMEND_SCHEDULER, RECOMMEND_DIR, RECOMMEND_INTERVAL, RECOMMEND_TOP_K
+    from config import DELETE_BATCH_SIZE
+    from config import DB_DEADLINE, DB_REPORT_DEADLINE
 except Exception:
     # Fallback: simple defaults (only used if config.py missing)
     import os
     USE_MYSQL = False
+    SHARDS = os.getenv("SHARDS", "")
+    SHARD_ID_STRIDE = int(os.getenv("SHARD_ID_STRIDE", 100))
+    SHARD_ID_FLOOR = int(os.getenv("SHARD_ID_FLOOR", 0))
+    READ_REPLICAS = os.getenv("READ_REPLICAS", "")
+    REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 5))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", 2))
+    READ_AFTER_WRITE_PIN = float(os.getenv("READ_AFTER_WRITE_PIN", 10))
+    CHECKIN_SECRET = os.getenv("CHECKIN_SECRET", "")
+    CHECKIN_SECRET_FILE = os.getenv("CHECKIN_SECRET_FILE", ".checkin_secret")
+    CHECKIN_TOKEN_GRACE = int(os.getenv("CHECKIN_TOKEN_GRACE", 12 * 3600))
+    STUDENT_TOKEN_TTL = int(os.getenv("STUDENT_TOKEN_TTL", 30 * 24 * 3600))
+    CHECKIN_DEDUP_SECONDS = float(os.getenv("CHECKIN_DEDUP_SECONDS", 60))
+    ADMISSION_CONTROL = False
+    ADMISSION_DIR = ADMISSION_SLOTS = ADMISSION_RESERVED_SLOTS = ADMISSION_QUEUE_SIZE = None
+    ADMISSION_QUEUE_TIMEOUT = ADMISSION_CLIENT_RATE = ADMISSION_CLIENT_BURST = ADMISSION_MAX_QUEUE_AGE = None
+    TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", 1))
+    IDEMPOTENCY_DB = os.getenv("IDEMPOTENCY_DB", "idempotency.db")
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 86400))
+    IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", 100000))
+    DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", 3))
+    DB_BREAKER_PROBE_INTERVAL = float(os.getenv("DB_BREAKER_PROBE_INTERVAL", 5))
+    MYSQL_CONNECT_TIMEOUT = int(os.getenv("MYSQL_CONNECT_TIMEOUT", 5))
+    MYSQL_FALLBACK_SQLITE = os.getenv("MYSQL_FALLBACK_SQLITE", "")
+    SNAPSHOT_SCHEDULER = 'off'
+    SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "report_snapshots")
+    SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", 5))
+    SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", 300))
+    CACHE_BACKEND = 'off'
+    CACHE_TTL = CACHE_MAX_ENTRIES = CACHE_DB = CACHE_MAX_BYTES = CACHE_GENERATIONS_FILE = None
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+    TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+    TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "campus-events")
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+    PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+    BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 20))
+    BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", 4))
+    RECOMMEND_SCHEDULER = 'off'
+    RECOMMEND_DIR = os.getenv("RECOMMEND_DIR", "recommendations")
+    RECOMMEND_INTERVAL = float(os.getenv("RECOMMEND_INTERVAL", 30))
+    RECOMMEND_TOP_K = int(os.getenv("RECOMMEND_TOP_K", 20))
+    DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", 1000))
+    DB_DEADLINE = float(os.getenv("DB_DEADLINE", 5))
+    DB_REPORT_DEADLINE = float(os.getenv("DB_REPORT_DEADLINE", 30))
     MYSQL_CONFIG = {
         "host": os.getenv("MYSQLHOST", "localhost"),
         "user": os.getenv("MYSQLUSER", "root"),
@@ -29,24 +125,279 @@ except Exception:
 # Database type string used by health endpoint / logs
 DB_TYPE = 'mysql' if USE_MYSQL else 'sqlite'
 
+# Import only the driver in use: SQLite deployments never load PyMySQL
+if USE_MYSQL:
+    import pymysql
+
+
+# Per-college shard routing (single default shard unless SHARDS is set)
+shard_router = ShardRouter(SHARDS, USE_MYSQL, MYSQL_CONFIG,
+                           id_stride=SHARD_ID_STRIDE, id_floor=SHARD_ID_FLOOR)
+
+# Read replicas for GET traffic on the default shard (none unless READ_REPLICAS is set)
+replica_set = ReplicaSet(READ_REPLICAS, USE_MYSQL, MYSQL_CONFIG,
+                         max_lag=REPLICA_MAX_LAG, check_interval=REPLICA_LAG_CHECK_INTERVAL)
+
+# Cookie / header carrying "read from the primary until <unix time>" after a write
+PIN_COOKIE = 'pin_primary'
+PIN_HEADER = 'X-Pin-Primary-Until'
+
+# QR check-in tokens and student access tokens (verified without touching the database)
+checkin_secret = load_secret(CHECKIN_SECRET, CHECKIN_SECRET_FILE)
+checkin_signer = TokenSigner(checkin_secret, CHECKIN_TOKEN_GRACE)
+student_tokens = StudentTokens(checkin_secret, STUDENT_TOKEN_TTL)
+checkin_dedup = ScanDedup(CHECKIN_DEDUP_SECONDS)
+
+# Idempotency-Key replay store, shared by all workers on this host
+idempotency_store = IdempotencyStore(IDEMPOTENCY_DB, ttl=IDEMPOTENCY_TTL, max_keys=IDEMPOTENCY_MAX_KEYS)
+
+def replayable(status):
+    """Responses worth replaying; anything else (5xx, 429, 409 ...) can be retried for real"""
+    return status < 500 and status not in (408, 409, 425, 429)
+
+# request.remote_addr is the address the trusted proxies saw, not a client-chosen header
+if TRUSTED_PROXY_COUNT > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+# Admission control: per-client token buckets + global slots for write rushes
+admission = None
+if ADMISSION_CONTROL:
+    admission = AdmissionController(
+        ADMISSION_DIR, ADMISSION_SLOTS, ADMISSION_RESERVED_SLOTS,
+        ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT,
+        ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST,
+        max_queue_age=ADMISSION_MAX_QUEUE_AGE
+    )
+
+# Response cache for hot read routes, invalidated by write routes (see cache.py)
+response_cache = None
+if CACHE_BACKEND != 'off':
+    if CACHE_BACKEND == 'sqlite':
+        cache_backend = SQLiteCache(CACHE_DB, max_bytes=CACHE_MAX_BYTES)
+    elif CACHE_BACKEND == 'tiered':
+        cache_backend = TieredCache(MemoryCache(CACHE_MAX_ENTRIES), SQLiteCache(CACHE_DB, max_bytes=CACHE_MAX_BYTES))
+    else:
+        cache_backend = MemoryCache(CACHE_MAX_ENTRIES)
+    response_cache = Cache(cache_backend, Generations(CACHE_GENERATIONS_FILE), ttl=CACHE_TTL)
+    metrics.gauge('campus_cache_hits', 'Response cache hits by route (this worker)',
+                  lambda: {(('route', r),): c['hits'] for r, c in response_cache.stats.items()})
+    metrics.gauge('campus_cache_misses', 'Response cache misses by route (this worker)',
+                  lambda: {(('route', r),): c['misses'] for r, c in response_cache.stats.items()})
+
+# Cache namespaces each write route invalidates when it succeeds. 'student'
+# means student:<student_id from the request body>; 'students' covers every
+# student (used where other students can be affected, e.g. promotions).
+CACHE_INVALIDATES = {
+    'create_event': ('events',),
+    'delete_event': ('events', 'students'),
+    'update_event_capacity': ('events', 'students'),
+    'register_student': ('events', 'student'),
+    'unregister_student': ('events', 'students'),
+    'mark_attendance_student': ('student',),
+    'mark_attendance_staff': ('student',),
+    'collect_feedback': ('student',),
+    'checkin': ('students',),
+    'apply_offline_actions': ('events', 'students'),
+    'submit_feedback_action': ('student',),
+    'create_series': ('events',),
+    'update_series': ('events', 'students'),
+    'cancel_series': ('events', 'students'),
+    'register_series': ('events', 'students'),
+    'register_and_checkin_action': ('events', 'student'),
+}
+
+# Per-request tracing (see tracing.py): every response carries X-Request-ID;
+# sampled requests are exported as OTLP/JSON lines to TRACE_FILE
+trace_exporter = Exporter(TRACE_FILE, TRACE_SERVICE_NAME) if TRACE_FILE and TRACE_SAMPLE_RATE > 0 else None
+app.wsgi_app = TracingMiddleware(app.wsgi_app, trace_exporter, TRACE_SAMPLE_RATE)
+if trace_exporter is not None:
+    metrics.gauge('campus_traces_dropped_total', 'Sampled traces dropped because the export queue was full',
+                  lambda: trace_exporter.stats['dropped'])
+app.json = TracedJSONProvider(app)
+
+# On-demand profiling of this worker (see profiling.py), for ADMIN_TOKEN holders
+profiler = Profiler(PROFILE_DIR, sample_interval=PROFILE_SAMPLE_INTERVAL, max_seconds=PROFILE_MAX_SECONDS)
+
+def admin_authorized():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def student_authorized(student_id):
+    """The request carries this student's access token (see auth.py), or is from staff"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and student_tokens.verify(token.strip()) == student_id:
+        return True
+    return admin_authorized()
+
+# POST routes that only read (large request bodies); they do not pin reads
+# to the primary
+READ_ONLY_POSTS = {'batch_get', 'get_student_analysis_batch'}
+
+# Statement deadline per route (see deadlines.py); every other route gets
+# DB_DEADLINE. Reports scan whole tables when their snapshot is missing.
+ROUTE_DEADLINES = {
+    'get_registrations_report': DB_REPORT_DEADLINE,
+    'get_attendance_report': DB_REPORT_DEADLINE,
+    'get_feedback_report': DB_REPORT_DEADLINE,
+    'get_event_analysis_report': DB_REPORT_DEADLINE,
+    'get_top_students_report': DB_REPORT_DEADLINE,
+    'get_events_by_type_report': DB_REPORT_DEADLINE,
+    'get_student_analysis_report': DB_REPORT_DEADLINE,
+    'get_student_analysis_batch': DB_REPORT_DEADLINE,
+    'get_student_participation_report': DB_REPORT_DEADLINE,
+    # Cascading deletes work through child rows in many short batches
+    'delete_event': DB_REPORT_DEADLINE,
+    'cancel_series': DB_REPORT_DEADLINE,
+}
+# Seconds a client is told to wait after a cancelled statement
+DEADLINE_RETRY_AFTER = 5
+
+def cached_json(namespaces, build):
+    """
+    Serve this GET from the response cache, or run build() and cache its
+    result. A (body, status) tuple or Response from build() is passed
+    through uncached.
+    """
+    if response_cache is None:
+        result = build()
+        return result if isinstance(result, (tuple, Response)) else jsonify(result)
+    full_key = response_cache.key(namespaces, request.full_path)
+    payload = response_cache.get(request.endpoint, full_key)
+    if payload is None:
+        result = build()
+        if isinstance(result, (tuple, Response)):
+            return result
+        payload = app.json.dumps(result, separators=(',', ':')).encode()
+        response_cache.set(full_key, payload)
+    return Response(payload, mimetype='application/json')
+
+class DatabaseUnavailable(Exception):
+    """The primary database is down and no fallback is configured"""
+
+def probe_mysql():
+    db = pymysql.connect(**MYSQL_CONFIG, connect_timeout=MYSQL_CONNECT_TIMEOUT)
+    try:
+        db.ping(reconnect=False)
+    finally:
+        db.close()
+
+# Circuit breaker around the primary MySQL connection
+mysql_breaker = CircuitBreaker(probe_mysql, failure_threshold=DB_BREAKER_THRESHOLD,
+                               probe_interval=DB_BREAKER_PROBE_INTERVAL)
+BREAKER_STATES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+metrics.gauge('campus_db_breaker_state', 'Primary DB circuit breaker: 0 closed, 1 open, 2 half-open',
+              lambda: BREAKER_STATES[mysql_breaker.state])
+metrics.gauge('campus_db_breaker_opened_total', 'Times the primary DB breaker has opened',
+              lambda: mysql_breaker.stats['opened'])
+metrics.gauge('campus_db_breaker_probes_total', 'Background probes of the primary DB',
+              lambda: mysql_breaker.stats['probes'])
+DB_FALLBACK_CONNECTIONS = metrics.counter('campus_db_fallback_connections_total',
+                                          'Connections opened on MYSQL_FALLBACK_SQLITE instead of MySQL')
+DB_FAST_FAILURES = metrics.counter('campus_db_fast_failures_total',
+                                   'Requests rejected with 503 because the primary DB is unavailable')
+DB_STATEMENTS_CANCELLED = metrics.counter('campus_db_statements_cancelled_total',
+                                          'Statements cancelled at their route deadline, by route')
+metrics.gauge('campus_db_kill_queries_total', 'KILL QUERY sent for MySQL statements past their deadline',
+              lambda: watchdog.stats['kills'])
+metrics.gauge('campus_db_kill_query_failures_total', 'KILL QUERY attempts that failed (side connection or KILL)',
+              lambda: watchdog.stats['kill_failures'])
+
+
+def get_db(shard=None):
+    if shard is not None and shard != DEFAULT_SHARD:
+        connections = g.setdefault('_shard_connections', {})
+        if shard not in connections:
+            connections[shard] = traced(shard_router.connect(shard))
+        return connections[shard]
 
-def get_db():
     db = getattr(g, '_database', None)
     if db is None:
         if USE_MYSQL:
-            try:
-                db = g._database = pymysql.connect(**MYSQL_CONFIG)
-            except Exception as e:
-                print(f"MySQL connection failed: {e}")
-                print("Falling back to SQLite...")
-                db = g._database = sqlite3.connect('events.db')
+            db = g._database = traced(connect_primary())
         else:
-            db = g._database = sqlite3.connect('events.db')
+            db = g._database = traced(sqlite3.connect('events.db'))
     return db
 
-def execute_query(query, params=None, fetch=False):
-    """Execute a query and return results as dictionaries"""
-    db = get_db()
+def connect_primary():
+    """
+    MySQL connection through the circuit breaker. While MySQL is down (or
+    the breaker is open) this returns the MYSQL_FALLBACK_SQLITE database,
+    or raises DatabaseUnavailable when no fallback is configured.
+    """
+    error = None
+    if mysql_breaker.allow():
+        try:
+            db = pymysql.connect(**MYSQL_CONFIG, connect_timeout=MYSQL_CONNECT_TIMEOUT)
+            mysql_breaker.record_success()
+            return db
+        except Exception as e:
+            print(f"MySQL connection failed: {e}")
+            mysql_breaker.record_failure(e)
+            error = e
+    if not MYSQL_FALLBACK_SQLITE:
+        if has_request_context():
+            # Routes turn most exceptions into a 500; database_unavailable_after_error() makes it a 503
+            g._database_unavailable = True
+        raise DatabaseUnavailable(error or mysql_breaker.last_error)
+    DB_FALLBACK_CONNECTIONS.inc()
+    return sqlite3.connect(MYSQL_FALLBACK_SQLITE)
+
+def reads_pinned_to_primary():
+    """
+    Reads stay on the primary outside GET requests (so duplicate checks see
+    the latest rows), after a write in this request, and while the client's
+    read-after-write pin from a recent write is still valid.
+    """
+    if not has_request_context() or request.method != 'GET' or getattr(g, '_wrote', False):
+        return True
+    until = request.headers.get(PIN_HEADER) or request.cookies.get(PIN_COOKIE)
+    try:
+        return until is not None and float(until) > time.time()
+    except ValueError:
+        return False
+
+def get_read_db(shard=None):
+    """Connection for reads: a usable replica if there is one, else the primary"""
+    if not replica_set.enabled or shard not in (None, DEFAULT_SHARD) or reads_pinned_to_primary():
+        return get_db(shard)
+    if not hasattr(g, '_replica_database'):
+        g._replica_index, replica_db = replica_set.open()
+        g._replica_database = traced(replica_db)
+    return g._replica_database or get_db(shard)
+
+def drop_replica():
+    """Stop using this request's replica after an error; later reads go to the primary"""
+    replica_set.mark_failed(g._replica_index)
+    try:
+        g._replica_database.close()
+    except Exception:
+        pass
+    g._replica_database = None
+
+def statement_cancelled(error, query):
+    if has_request_context():
+        # Routes turn most exceptions into a 500; cancel_overrun_response() makes it a 503
+        g._query_cancelled = True
+        DB_STATEMENTS_CANCELLED.inc(route=request.endpoint or 'unknown')
+    print(f"Query cancelled: {error}")
+    print(f"Query: {query}")
+
+def bounded_cursor(db):
+    """A cursor of `db` whose statements run under the request's deadline, like execute_query()'s"""
+    return BoundedCursor(db.cursor(), db, lambda: g.get('_deadline'), statement_cancelled)
+
+def bounded_db(db):
+    """`db` for helpers that open their own cursors (deletion.py), with bounded_cursor()s"""
+    return BoundedConnection(db, lambda: g.get('_deadline'), statement_cancelled)
+
+def execute_query(query, params=None, fetch=False, shard=None):
+    """
+    Execute a query and return results as dictionaries. Inside a request
+    the statement runs under the route's deadline (see deadlines.py).
+    """
+    db = get_read_db(shard) if fetch else get_db(shard)
+    if not fetch and has_request_context():
+        g._wrote = True
     cursor = db.cursor()
     
     try:
@@ -54,21 +405,30 @@ def execute_query(query, params=None, fetch=False):
             # Convert MySQL placeholders to SQLite placeholders if using SQLite
             if not USE_MYSQL and '%s' in query:
                 query = query.replace('%s', '?')
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        
-        if fetch:
-            # Get column names
-            columns = [description[0] for description in cursor.description]
-            # Fetch all rows and convert to dictionaries
-            rows = cursor.fetchall()
-            return [dict(zip(columns, row)) for row in rows]
-        else:
-            db.commit()
-            return cursor.lastrowid
+        with bounded(db, g.get('_deadline'), query) as statement:
+            if params:
+                cursor.execute(statement, params)
+            else:
+                cursor.execute(statement)
+
+            if fetch:
+                # Get column names
+                columns = [description[0] for description in cursor.description]
+                # Fetch all rows and convert to dictionaries
+                rows = cursor.fetchall()
+                return [dict(zip(columns, row)) for row in rows]
+        db.commit()
+        return cursor.lastrowid
+    except QueryCancelled as e:
+        db.rollback()
+        statement_cancelled(e, query)
+        raise
     except Exception as e:
         db.rollback()
+        if db is getattr(g, '_replica_database', None):
+            print(f"Replica query failed, retrying on primary: {e}")
+            drop_replica()
+            return execute_query(query, params, fetch, shard)
         print(f"Query error: {e}")
         print(f"Query: {query}")
         print(f"Params: {params}")
@@ -78,15 +438,637 @@ def execute_query(query, params=None, fetch=False):
 
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
+    # pop, not getattr: a streamed response re-pushes this context after
+    # teardown and must open fresh connections rather than reuse closed ones
+    db = g.pop('_database', None)
     if db is not None:
         db.close()
+    for shard_db in g.pop('_shard_connections', {}).values():
+        shard_db.close()
+    replica_db = g.pop('_replica_database', None)
+    if replica_db is not None:
+        replica_db.close()
+
+# First hook, so the route name is on the trace even if a later hook answers
+@app.before_request
+def name_trace():
+    trace = current_trace()
+    if trace is not None and request.url_rule is not None:
+        trace.root.name = f"HTTP {request.method} {request.url_rule.rule}"
+        trace.root.attributes['http.route'] = request.url_rule.rule
+
+@app.before_request
+def start_request_profile():
+    mode = request.headers.get('X-Profile')
+    if mode not in REQUEST_MODES or not admin_authorized():
+        return None
+    route = request.url_rule.rule if request.url_rule is not None else request.path
+    handle = profiler.start_request(mode, f"{request.method} {route}")
+    if handle is None:
+        g._profile_busy = True
+    else:
+        g._profile = handle
+    return None
+
+# Registered first, so it runs after every other after_request hook
+@app.after_request
+def finish_request_profile(response):
+    handle = g.pop('_profile', None)
+    if handle is not None:
+        response.headers['X-Profile-Output'] = profiler.finish_request(handle)
+    elif g.pop('_profile_busy', False):
+        response.headers['X-Profile'] = 'busy'
+    return response
+
+@app.teardown_request
+def abandon_request_profile(exception):
+    # Unhandled exception: after_request never ran, but the profile still has to stop
+    handle = g.pop('_profile', None)
+    if handle is not None:
+        profiler.finish_request(handle)
+
+# Runs before admission control so replays cost neither a token nor a slot
+@app.before_request
+def idempotency_check():
+    key = request.headers.get('Idempotency-Key')
+    if request.method != 'POST' or not key:
+        return None
+    if len(key) > 255:
+        return jsonify({'error': 'Idempotency-Key is too long'}), 400
+
+    state, stored = idempotency_store.begin(
+        key, fingerprint(request.method, request.path, request.get_data())
+    )
+    if state == REPLAY:
+        response = Response(stored['body'], status=stored['status'], content_type=stored['content_type'])
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+    if state == MISMATCH:
+        return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+    if state == IN_PROGRESS:
+        response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    g._idempotency_key = key
+    return None
+
+@app.after_request
+def idempotency_store_response(response):
+    key = g.pop('_idempotency_key', None)
+    if key is not None:
+        if replayable(response.status_code) and not response.is_streamed:
+            idempotency_store.complete(key, response.status_code, response.get_data(), response.content_type)
+        else:
+            idempotency_store.abandon(key)
+    return response
+
+@app.teardown_request
+def idempotency_abandon(exception):
+    # Unhandled exception: after_request never ran for this key
+    key = g.pop('_idempotency_key', None)
+    if key is not None:
+        idempotency_store.abandon(key)
+
+def database_unavailable_response():
+    DB_FAST_FAILURES.inc()
+    response = jsonify({'error': 'Database is unavailable, please retry'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(DB_BREAKER_PROBE_INTERVAL)))
+    return response
+
+@app.errorhandler(DatabaseUnavailable)
+def handle_database_unavailable(e):
+    return database_unavailable_response()
+
+@app.after_request
+def database_unavailable_after_error(response):
+    """A route that caught DatabaseUnavailable answered 500; it is a 503 the client can retry"""
+    if g.pop('_database_unavailable', False) and response.status_code == 500 and not response.is_streamed:
+        return database_unavailable_response()
+    return response
+
+def deadline_exceeded_response():
+    response = jsonify({'error': 'The request ran past its database deadline, please retry'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(DEADLINE_RETRY_AFTER)
+    return response
+
+@app.errorhandler(QueryCancelled)
+def handle_query_cancelled(e):
+    return deadline_exceeded_response()
+
+@app.after_request
+def cancel_overrun_response(response):
+    """A route that caught QueryCancelled answered 500; it is a 503 the client can retry"""
+    if g.pop('_query_cancelled', False) and response.status_code == 500 and not response.is_streamed:
+        return deadline_exceeded_response()
+    return response
+
+@app.before_request
+def fail_fast_when_database_down():
+    """With no fallback configured, an open breaker rejects requests before any route work"""
+    if not USE_MYSQL or MYSQL_FALLBACK_SQLITE or request.path in ('/health', '/metrics'):
+        return None
+    if not mysql_breaker.allow():
+        return database_unavailable_response()
+    return None
+
+@app.before_request
+def start_snapshot_scheduler():
+    if snapshot_scheduler is not None:
+        snapshot_scheduler.ensure_started()
+
+def client_key():
+    """
+    Rate-limit key: the student an access token authenticates, else the
+    client address (see TRUSTED_PROXY_COUNT). Unsigned headers such as
+    X-Client-Id are ignored: a client could rotate them to escape its limit.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    student_id = student_tokens.verify(token.strip()) if scheme.lower() == 'bearer' else None
+    if student_id is not None:
+        return f"student:{student_id}"
+    return request.remote_addr or 'unknown'
+
+@app.before_request
+def admission_check():
+    if admission is None:
+        return None
+    traffic_class = admission.classify(request.method, request.path)
+    if traffic_class == 'exempt':
+        return None
+    slot, rejection = admission.admit(
+        traffic_class, client_key(), parse_request_start(request.headers.get('X-Request-Start'))
+    )
+    if rejection is not None:
+        status, message, retry_after = rejection
+        response = jsonify({'error': message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    g._admission_slot = slot
+    return None
+
+@app.teardown_request
+def release_admission_slot(exception):
+    slot = g.pop('_admission_slot', None)
+    if slot is not None:
+        admission.release(slot)
+
+# After admission control, so time spent queued for a slot is not charged
+@app.before_request
+def start_deadline():
+    if request.path not in ('/health', '/metrics'):
+        renew_deadline()
+
+def renew_deadline():
+    """Start this request's deadline; streamed responses renew it per page, so a slow reader is not cut off"""
+    budget = ROUTE_DEADLINES.get(request.endpoint, DB_DEADLINE)
+    if budget > 0:
+        g._deadline = time.monotonic() + budget
+
+@app.after_request
+def invalidate_cache_after_write(response):
+    namespaces = CACHE_INVALIDATES.get(request.endpoint)
+    if response_cache is None or namespaces is None or response.status_code >= 400:
+        return response
+    for namespace in namespaces:
+        if namespace == 'student':
+            student_id = (request.get_json(silent=True) or {}).get('student_id')
+            namespace = f"student:{student_id}" if student_id is not None else 'students'
+        response_cache.invalidate(namespace)
+    return response
+
+@app.after_request
+def pin_reads_after_write(response):
+    """Tell the client to read from the primary for a while after a successful write"""
+    if replica_set.enabled and request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400 \
+            and request.endpoint not in READ_ONLY_POSTS:
+        until = f"{time.time() + READ_AFTER_WRITE_PIN:.3f}"
+        response.headers[PIN_HEADER] = until
+        response.set_cookie(PIN_COOKIE, until, max_age=int(READ_AFTER_WRITE_PIN) + 1, samesite='Lax')
+    return response
+
+def query_all_shards(query, params=None, key=None, reverse=False, limit=None):
+    """Run a read on every shard and merge the rows (see sharding.merge_rows)"""
+    return merge_rows(
+        [execute_query(query, params, fetch=True, shard=shard) for shard in shard_router.shards],
+        key=key, reverse=reverse, limit=limit
+    )
+
+@contextmanager
+def transaction(shard=None):
+    """
+    Cursor whose statements commit together, or all roll back on an
+    exception. Each statement runs under the request's deadline.
+    """
+    db = get_db(shard)
+    cursor = bounded_cursor(db)
+    try:
+        yield cursor
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def attendance_upsert_sql():
+    """INSERT-or-UPDATE of one attendance row, params (student_id, event_id, status)"""
+    if USE_MYSQL:
+        return """
+            INSERT INTO Attendance (student_id, event_id, status) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE status = VALUES(status)
+        """
+    return """
+        INSERT INTO Attendance (student_id, event_id, status) VALUES (?, ?, ?)
+        ON CONFLICT(student_id, event_id) DO UPDATE SET status = excluded.status
+    """
+
+def checkin_upsert_sql():
+    """
+    attendance_upsert_sql() for a check-in, params (status, student_id,
+    event_id): writes nothing unless the Registrations row still exists
+    """
+    if USE_MYSQL:
+        return """
+            INSERT INTO Attendance (student_id, event_id, status)
+            SELECT R.student_id, R.event_id, %s FROM Registrations R
+            WHERE R.student_id = %s AND R.event_id = %s
+            ON DUPLICATE KEY UPDATE status = VALUES(status)
+        """
+    return """
+        INSERT INTO Attendance (student_id, event_id, status)
+        SELECT R.student_id, R.event_id, ? FROM Registrations R
+        WHERE R.student_id = ? AND R.event_id = ?
+        ON CONFLICT(student_id, event_id) DO UPDATE SET status = excluded.status
+    """
+
+def issue_checkin_token(student_id, event_id, event_date=None, shard=None):
+    """Check-in token valid until the event's day is over; None if the event is gone"""
+    if event_date is None:
+        rows = execute_query("SELECT date FROM Events WHERE event_id = %s", (event_id,), fetch=True,
+                             shard=shard if shard is not None else shard_router.for_id(event_id))
+        if not rows:
+            return None
+        event_date = rows[0]['date']
+    return checkin_signer.issue(student_id, event_id, event_date)
+
+def upsert_attendance(student_id, event_id, status, shard=None):
+    """Insert or update one attendance row in a single statement (no SELECT first)"""
+    execute_query(attendance_upsert_sql(), (student_id, event_id, status), shard=shard)
+
+def insert_with_id(shard, table, columns, values):
+    """
+    INSERT one row and return its ID. On a sharded deployment the ID is
+    allocated from the shard's sequence in the same transaction.
+    """
+    placeholders = ', '.join(['%s'] * len(columns))
+    if not shard_router.enabled:
+        return execute_query(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            tuple(values), shard=shard
+        )
+
+    id_column = 'event_id' if table == 'Events' else 'student_id'
+    db = get_db(shard)
+    cursor = bounded_cursor(db)
+    try:
+        new_id = shard_router.allocate_id(cursor, shard, table)
+        cursor.execute(
+            shard_router.sql(f"INSERT INTO {table} ({id_column}, {', '.join(columns)}) VALUES (%s, {placeholders})"),
+            (new_id, *values)
+        )
+        db.commit()
+        return new_id
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+
+# Indexes backing /events/search. Every one ends in (date, event_id) so a
+# keyset page is a range seek no matter how many past events exist.
+EVENT_INDEXES = [
+    ('idx_events_date', 'Events', 'date, event_id'),
+    ('idx_events_type_date', 'Events', 'type, date, event_id'),
+    ('idx_events_college_date', 'Events', 'college_id, date, event_id'),
+    ('idx_events_college_type_date', 'Events', 'college_id, type, date, event_id'),
+    ('idx_events_name', 'Events', 'name, event_id'),
+]
+
+# Archived rows are only read per student (student_analysis event_details)
+ARCHIVE_INDEXES = [
+    ('idx_registrations_archive_student', 'RegistrationsArchive', 'student_id, event_id'),
+    ('idx_attendance_archive_student', 'AttendanceArchive', 'student_id, event_id'),
+    ('idx_feedback_archive_student', 'FeedbackArchive', 'student_id, event_id'),
+]
+
+# Per-student history pages: seek on student_id, read rows already in date
+# order, and carry the join / cursor columns so no sort is needed
+STUDENT_HISTORY_INDEXES = [
+    ('idx_registrations_student_date', 'Registrations', 'student_id, registration_date, event_id'),
+    ('idx_feedback_student_date', 'Feedback', 'student_id, feedback_date, event_id, rating'),
+    ('idx_registrations_archive_student_date', 'RegistrationsArchive', 'student_id, registration_date, event_id'),
+    ('idx_feedback_archive_student_date', 'FeedbackArchive', 'student_id, feedback_date, event_id, rating'),
+]
+
+# Event roster: registrations of one event in registration order, carrying
+# student_id for the Attendance / Feedback lookups; ChangeLog by event for
+# the roster's ETag
+ROSTER_INDEXES = [
+    ('idx_registrations_event_date', 'Registrations', 'event_id, registration_date, reg_id, student_id'),
+    ('idx_changelog_event', 'ChangeLog', 'event_id, seq'),
+]
+
+# Deleting an event (see deletion.py): batched deletes and the orphan scan
+# seek on event_id in every child table. Attendance's also lists an event's
+# rows in attendance order for /staff/attendance/<id>.
+DELETION_INDEXES = [
+    ('idx_attendance_event_date', 'Attendance', 'event_id, attendance_date, student_id'),
+    ('idx_feedback_event', 'Feedback', 'event_id, student_id'),
+    ('idx_registrations_archive_event', 'RegistrationsArchive', 'event_id, student_id'),
+    ('idx_attendance_archive_event', 'AttendanceArchive', 'event_id, student_id'),
+    ('idx_feedback_archive_event', 'FeedbackArchive', 'event_id, student_id'),
+]
+
+def create_index(cursor, index_name, table, columns):
+    """Create an index if it is missing (SQLite and MySQL)"""
+    try:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+    except Exception:
+        # MySQL has no CREATE INDEX IF NOT EXISTS — a duplicate key name is fine
+        try:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+        except Exception as e:
+            if 'Duplicate key name' not in str(e):
+                print(f"Could not create index {index_name}: {e}")
+
+def add_column(cursor, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless it exists. Returns True if it was added."""
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    except Exception as e:
+        if 'duplicate column' not in str(e).lower():
+            print(f"Could not add {table}.{column}: {e}")
+        return False
+
+def create_schema(cursor):
+    """Create tables and indexes on one database (default DB or a shard)"""
+    # CREATE TABLES (works for both MySQL and SQLite — uses compatible SQL)
+    # Events
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Events (
+                event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                college_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL,
+                date TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+    except Exception:
+        # Try MySQL-style schema (explicit INT AUTO_INCREMENT if needed)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Events (
+                event_id INT AUTO_INCREMENT PRIMARY KEY,
+                college_id VARCHAR(100) NOT NULL,
+                name VARCHAR(255) NOT NULL,
+                type VARCHAR(100) NOT NULL,
+                date DATE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+    # Students
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Students (
+                student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                college_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                email TEXT NOT NULL UNIQUE,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+    except Exception:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Students (
+                student_id INT AUTO_INCREMENT PRIMARY KEY,
+                college_id VARCHAR(100) NOT NULL,
+                name VARCHAR(255) NOT NULL,
+                email VARCHAR(255) NOT NULL UNIQUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+    # Seat limits (NULL capacity = unlimited); see seats.py
+    if add_column(cursor, 'Events', 'capacity', 'INTEGER NULL'):
+        print("Added Events.capacity")
+    if add_column(cursor, 'Events', 'seats_taken', 'INTEGER NOT NULL DEFAULT 0'):
+        print("Added Events.seats_taken")
+        seats_taken_added = True
+    else:
+        seats_taken_added = False
+
+    # Recurring event series (see series.py); occurrences carry series_id
+    create_series_schema(cursor)
+    if add_column(cursor, 'Events', 'series_id', 'INTEGER NULL'):
+        print("Added Events.series_id")
+    create_index(cursor, 'idx_events_series', 'Events', 'series_id, date, event_id')
+
+    # Registrations
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Registrations (
+                reg_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                event_id INTEGER NOT NULL,
+                registration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(student_id, event_id)
+            );
+        """)
+    except Exception:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Registrations (
+                reg_id INT AUTO_INCREMENT PRIMARY KEY,
+                student_id INT NOT NULL,
+                event_id INT NOT NULL,
+                registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(student_id, event_id)
+            );
+        """)
+
+    # Attendance
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Attendance (
+                att_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                event_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attendance_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(student_id, event_id)
+            );
+        """)
+    except Exception:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Attendance (
+                att_id INT AUTO_INCREMENT PRIMARY KEY,
+                student_id INT NOT NULL,
+                event_id INT NOT NULL,
+                status ENUM('present','absent') NOT NULL,
+                attendance_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(student_id, event_id)
+            );
+        """)
+
+    # Feedback
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Feedback (
+                feedback_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                event_id INTEGER NOT NULL,
+                rating INTEGER NOT NULL,
+                feedback_text TEXT,
+                feedback_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(student_id, event_id)
+            );
+        """)
+    except Exception:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Feedback (
+                feedback_id INT AUTO_INCREMENT PRIMARY KEY,
+                student_id INT NOT NULL,
+                event_id INT NOT NULL,
+                rating INT NOT NULL,
+                feedback_text TEXT,
+                feedback_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(student_id, event_id)
+            );
+        """)
+
+    # Waitlist for full events (promoted in waitlist_id order)
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Waitlist (
+                waitlist_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                event_id INTEGER NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(student_id, event_id)
+            );
+        """)
+    except Exception:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Waitlist (
+                waitlist_id INT AUTO_INCREMENT PRIMARY KEY,
+                student_id INT NOT NULL,
+                event_id INT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(student_id, event_id)
+            );
+        """)
+
+    create_index(cursor, 'idx_waitlist_event', 'Waitlist', 'event_id, waitlist_id')
+
+    if seats_taken_added:
+        # Existing events: count the registrations they already have
+        cursor.execute("""
+            UPDATE Events SET seats_taken = (
+                SELECT COUNT(*) FROM Registrations R WHERE R.event_id = Events.event_id
+            )
+        """)
+
+    # Indexes (composite, so the planner can seek on the filter and read
+    # rows already in date order instead of sorting)
+    for index_name, table, columns in EVENT_INDEXES:
+        create_index(cursor, index_name, table, columns)
+
+    # Cold storage for archive.py
+    create_archive_schema(cursor)
+    for index_name, table, columns in ARCHIVE_INDEXES:
+        create_index(cursor, index_name, table, columns)
+    for index_name, table, columns in STUDENT_HISTORY_INDEXES:
+        create_index(cursor, index_name, table, columns)
+
+    # Change log for offline sync (filled by triggers)
+    create_changelog(cursor)
+    create_index(cursor, 'idx_changelog_student', 'ChangeLog', 'student_id, seq')
+    # Latest change to one event's row, for the per-student history ETags
+    create_index(cursor, 'idx_changelog_table_event', 'ChangeLog', 'table_name, event_id, seq')
+    for index_name, table, columns in ROSTER_INDEXES:
+        create_index(cursor, index_name, table, columns)
+    for index_name, table, columns in DELETION_INDEXES:
+        create_index(cursor, index_name, table, columns)
+
+    if shard_router.enabled:
+        shard_router.create_sequences(cursor)
+
+# Bump whenever create_schema() changes. A database that already records
+# this version skips the schema check, so it runs once per deploy rather
+# than once per worker start.
+SCHEMA_VERSION = 19
+
+def schema_version(cursor):
+    """Version recorded by ensure_schema(), or 0 for a new / older database"""
+    try:
+        cursor.execute("SELECT version FROM SchemaVersion")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    except Exception:
+        return 0
+
+def ensure_schema(db):
+    """
+    Bring a database up to SCHEMA_VERSION. Workers starting together
+    serialize on a lock (GET_LOCK on MySQL, a write transaction on SQLite);
+    the first one migrates and the rest find the new version and return.
+    Returns True if create_schema() ran.
+    """
+    cursor = db.cursor()
+    is_sqlite = isinstance(db, sqlite3.Connection)
+    try:
+        if schema_version(cursor) == SCHEMA_VERSION:
+            return False
+        if is_sqlite:
+            # Lets deletion.py return freed pages with incremental_vacuum;
+            # only takes effect on a database that has no tables yet
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("BEGIN IMMEDIATE")
+        else:
+            cursor.execute("SELECT GET_LOCK('campus_events_schema', 120)")
+        try:
+            if schema_version(cursor) == SCHEMA_VERSION:
+                return False
+            create_schema(cursor)
+            cursor.execute("CREATE TABLE IF NOT EXISTS SchemaVersion (version INTEGER NOT NULL)")
+            cursor.execute("DELETE FROM SchemaVersion")
+            cursor.execute(f"INSERT INTO SchemaVersion (version) VALUES ({SCHEMA_VERSION})")
+            db.commit()
+            return True
+        finally:
+            if is_sqlite:
+                if db.in_transaction:
+                    db.rollback()
+            else:
+                cursor.execute("SELECT RELEASE_LOCK('campus_events_schema')")
+    finally:
+        cursor.close()
 
 def init_db():
     """
     Initialize DB connection and create tables.
     Tries MySQL first (using MYSQL_CONFIG + env vars). If MySQL fails,
     falls back to SQLite and continues. This function will NOT raise.
+
+    No connection is kept open afterwards, so the module can be imported
+    once before gunicorn forks (--preload); each worker opens its own
+    connections on first use.
     """
     try:
         current_db_type = 'sqlite'
@@ -121,11 +1103,16 @@ def init_db():
                 print("✅ Connected to MySQL (init_db)")
             except Exception as e:
                 print("❌ MySQL connection failed in init_db():", e)
-                print("ℹ️ Falling back to SQLite...")
+                if not MYSQL_FALLBACK_SQLITE:
+                    # No fallback: requests get 503 until MySQL is back
+                    print("ℹ️ No MYSQL_FALLBACK_SQLITE configured, skipping schema setup")
+                    return
+                print(f"ℹ️ Falling back to SQLite ({MYSQL_FALLBACK_SQLITE})...")
 
         if current_db_type == 'sqlite' or db is None:
-            import sqlite3
-            db = sqlite3.connect('events.db', check_same_thread=False)
+            sqlite_path = MYSQL_FALLBACK_SQLITE if USE_MYSQL else 'events.db'
+            # Generous timeout: another worker may be migrating right now
+            db = sqlite3.connect(sqlite_path, check_same_thread=False, timeout=120)
             # Use row factory so fetch results can be dict-like in some places
             try:
                 db.row_factory = sqlite3.Row
@@ -133,162 +1120,362 @@ def init_db():
                 pass
             cursor = db.cursor()
             current_db_type = 'sqlite'
-            print("✅ Using SQLite fallback (events.db)")
+            print(f"✅ Using SQLite fallback ({sqlite_path})")
 
-        # CREATE TABLES (works for both MySQL and SQLite — uses compatible SQL)
-        # Events
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Events (
-                    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    college_id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    type TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-        except Exception:
-            # Try MySQL-style schema (explicit INT AUTO_INCREMENT if needed)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Events (
-                    event_id INT AUTO_INCREMENT PRIMARY KEY,
-                    college_id VARCHAR(100) NOT NULL,
-                    name VARCHAR(255) NOT NULL,
-                    type VARCHAR(100) NOT NULL,
-                    date DATE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-        # Students
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Students (
-                    student_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    college_id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    email TEXT NOT NULL UNIQUE,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-        except Exception:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Students (
-                    student_id INT AUTO_INCREMENT PRIMARY KEY,
-                    college_id VARCHAR(100) NOT NULL,
-                    name VARCHAR(255) NOT NULL,
-                    email VARCHAR(255) NOT NULL UNIQUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-        # Registrations
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Registrations (
-                    reg_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_id INTEGER NOT NULL,
-                    event_id INTEGER NOT NULL,
-                    registration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_id, event_id)
-                );
-            """)
-        except Exception:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Registrations (
-                    reg_id INT AUTO_INCREMENT PRIMARY KEY,
-                    student_id INT NOT NULL,
-                    event_id INT NOT NULL,
-                    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_id, event_id)
-                );
-            """)
-
-        # Attendance
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Attendance (
-                    att_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_id INTEGER NOT NULL,
-                    event_id INTEGER NOT NULL,
-                    status TEXT NOT NULL,
-                    attendance_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_id, event_id)
-                );
-            """)
-        except Exception:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Attendance (
-                    att_id INT AUTO_INCREMENT PRIMARY KEY,
-                    student_id INT NOT NULL,
-                    event_id INT NOT NULL,
-                    status ENUM('present','absent') NOT NULL,
-                    attendance_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_id, event_id)
-                );
-            """)
-
-        # Feedback
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Feedback (
-                    feedback_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_id INTEGER NOT NULL,
-                    event_id INTEGER NOT NULL,
-                    rating INTEGER NOT NULL,
-                    feedback_text TEXT,
-                    feedback_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_id, event_id)
-                );
-            """)
-        except Exception:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS Feedback (
-                    feedback_id INT AUTO_INCREMENT PRIMARY KEY,
-                    student_id INT NOT NULL,
-                    event_id INT NOT NULL,
-                    rating INT NOT NULL,
-                    feedback_text TEXT,
-                    feedback_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_id, event_id)
-                );
-            """)
-
-        # commit if DB supports commit()
-        try:
-            db.commit()
-        except Exception:
-            pass
+        cursor.close()
+        if ensure_schema(db):
+            print(f"Database initialized successfully using {current_db_type.upper()}!")
+        else:
+            print(f"Database schema is current (version {SCHEMA_VERSION}) using {current_db_type.upper()}")
+        db.close()
 
-        print(f"Database initialized successfully using {current_db_type.upper()}!")
+        # Per-college shards get the same schema
+        for shard in shard_router.shards:
+            if shard == DEFAULT_SHARD:
+                continue
+            try:
+                shard_db = shard_router.connect_for_init(shard)
+                if ensure_schema(shard_db):
+                    print(f"✅ Initialized {shard} ({shard_router.targets[shard]})")
+                shard_db.close()
+            except Exception as e:
+                print(f"❌ Could not initialize {shard}: {e}")
 
     except Exception as e:
         print("Database initialization error (unexpected):", e)
         print("Please check your database configuration.")
 
 
+def prepare_shard_ids():
+    """
+    Seed ShardSequence on the default database (sharding may be enabled on
+    a database whose schema is already current), and refuse to start when
+    SHARD_ID_FLOOR is not above its legacy IDs: those rows would be routed
+    to other shards by id % SHARD_ID_STRIDE, and new IDs could collide with
+    them.
+    """
+    if not shard_router.enabled:
+        return
+    try:
+        db = get_db()
+    except DatabaseUnavailable:
+        print("ℹ️ Default database unavailable, SHARD_ID_FLOOR not checked")
+        return
+    cursor = db.cursor()
+    try:
+        shard_router.create_sequences(cursor)
+        db.commit()
+        clashes = shard_router.legacy_ids_above_floor(cursor)
+    finally:
+        cursor.close()
+    if clashes:
+        details = ', '.join(f"{table}: {count}" for table, count in clashes.items())
+        raise RuntimeError(f"SHARD_ID_FLOOR={SHARD_ID_FLOOR} is not above the existing IDs on the default "
+                           f"database ({details} rows); set it above MAX(event_id, student_id, series_id)")
+
+def check_changelog_triggers():
+    """
+    Refuse to start when a database lacks its ChangeLog triggers: nothing
+    would be logged, and sync, ETags, snapshots and recommendations would
+    serve stale data without any error (see sync.py).
+    """
+    problems = []
+    for shard in shard_router.shards:
+        try:
+            db = get_db(shard)
+        except DatabaseUnavailable:
+            print(f"ℹ️ {shard} database unavailable, ChangeLog triggers not checked")
+            continue
+        cursor = db.cursor()
+        try:
+            missing = missing_triggers(cursor, not isinstance(db, sqlite3.Connection))
+        finally:
+            cursor.close()
+        if missing:
+            problems.append(f"{shard}: {', '.join(missing)}")
+    if problems:
+        raise RuntimeError("ChangeLog triggers are missing (" + '; '.join(problems) + "); on MySQL with binary "
+                           "logging, grant SUPER or set log_bin_trust_function_creators=1, then restart")
+
 # Initialize the database when the app starts
 with app.app_context():
     init_db()
+    prepare_shard_ids()
+    check_changelog_triggers()
 
 # API Endpoints
 
 # Health Check
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({
+    health = {
         'status': 'healthy',
         'database': DB_TYPE,
         'timestamp': str(datetime.now())
-    })
+    }
+    if replica_set.enabled:
+        health['replicas'] = replica_set.status()
+    if admission is not None:
+        health['admission'] = admission.stats
+    if response_cache is not None:
+        health['cache'] = response_cache.status()
+    if USE_MYSQL:
+        health['database_breaker'] = mysql_breaker.status()
+        health['database_fallback'] = MYSQL_FALLBACK_SQLITE or None
+        if mysql_breaker.state != CLOSED:
+            health['status'] = 'degraded'
+    return jsonify(health)
+
+# Prometheus metrics for this worker process
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4')
+
+# Whole-worker profiling (see profiling.py); only this worker is profiled
+@app.route('/admin/profile', methods=['POST'])
+def profile_worker():
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'sample')
+    if mode not in WORKER_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(WORKER_MODES)}"}), 400
+    try:
+        seconds = float(data.get('seconds', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seconds must be a number'}), 400
+    if seconds <= 0:
+        return jsonify({'error': 'seconds must be positive'}), 400
+    name = profiler.start_worker(mode, seconds)
+    if name is None:
+        return jsonify({'error': 'A profile is already running on this worker'}), 409
+    return jsonify({'output': name, 'pid': os.getpid(),
+                    'seconds': min(seconds, PROFILE_MAX_SECONDS)}), 202
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    return jsonify(profiler.list())
+
+@app.route('/admin/profiles/<path:name>', methods=['GET'])
+def get_profile(name):
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True)
+
+# Read batches: several GETs in one round trip. Sub-requests run through
+# the normal routes but skip the request hooks (the batch itself was
+# admitted, traced and profiled as one request) and reuse this request's
+# database connections.
+BATCH_FORWARDED_HEADERS = ('Cookie', PIN_HEADER, 'X-Admin-Token', 'Authorization')
+BATCH_BODY_TYPES = ('application/json', 'application/x-ndjson')
+
+def batch_environ(spec):
+    """WSGI environ for one sub-request spec, or raise ValueError"""
+    if isinstance(spec, str):
+        spec = {'path': spec}
+    if not isinstance(spec, dict) or not isinstance(spec.get('path'), str) or not spec['path'].startswith('/'):
+        raise ValueError("each request needs a 'path' starting with /")
+    if spec.get('method', 'GET').upper() != 'GET':
+        raise ValueError('only GET requests can be batched')
+    headers = {name: request.headers[name] for name in BATCH_FORWARDED_HEADERS if name in request.headers}
+    extra = spec.get('headers') or {}
+    if not isinstance(extra, dict):
+        raise ValueError("'headers' must be an object")
+    headers.update({str(k): str(v) for k, v in extra.items()})
+    headers.pop('Accept-Encoding', None)     # bodies are embedded as JSON, never compressed
+    environ = EnvironBuilder(path=spec['path'], method='GET', headers=headers,
+                             base_url=request.host_url).get_environ()
+    environ['REMOTE_ADDR'] = request.remote_addr
+    trace = current_trace()
+    if trace is not None:
+        environ['campus.trace'] = trace
+    return environ
+
+def run_subrequest(environ):
+    """Dispatch one GET to its route; returns the multiplexed entry"""
+    with app.request_context(environ):
+        try:
+            try:
+                rv = app.dispatch_request()
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            response = app.make_response(rv)
+            data = response.get_data()
+        except Exception as e:
+            return {'status': 500, 'body': {'error': str(e)}}
+        entry = {'status': response.status_code}
+        if response.headers.get('ETag'):
+            entry['etag'] = response.headers['ETag']
+        if response.mimetype == 'application/json' and data:
+            entry['body'] = json.loads(data)
+        elif response.mimetype == 'application/x-ndjson':
+            entry['body'] = [json.loads(line) for line in data.splitlines() if line.strip()]
+        else:
+            entry['body'] = data.decode('utf-8', 'replace')
+            entry['content_type'] = response.content_type
+        return entry
+
+def run_subrequests_on_thread(indexed_environs):
+    # One app context per thread: its sub-requests share that thread's connections
+    with app.app_context():
+        return [(index, run_subrequest(environ)) for index, environ in indexed_environs]
+
+@app.route('/batch', methods=['POST'])
+def batch_get():
+    """
+    {"requests": ["/events", {"id": "att", "path": "/attendance", "headers": {...}}],
+     "parallel": false}
+    Returns {"responses": [{"id", "status", "body", "etag"?}, ...]} in request
+    order. Sequential batches share this request's connection; parallel ones
+    run on up to BATCH_MAX_PARALLEL threads, one connection each.
+    """
+    data = request.get_json(silent=True) or {}
+    specs = data.get('requests')
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'requests must be a non-empty list'}), 400
+    if len(specs) > BATCH_MAX_REQUESTS:
+        return jsonify({'error': f'At most {BATCH_MAX_REQUESTS} requests per batch'}), 400
+    try:
+        environs = [batch_environ(spec) for spec in specs]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if data.get('parallel') and len(environs) > 1 and BATCH_MAX_PARALLEL > 1:
+        threads = min(BATCH_MAX_PARALLEL, len(environs))
+        shares = [list(enumerate(environs))[i::threads] for i in range(threads)]
+        results = [None] * len(environs)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for share in pool.map(run_subrequests_on_thread, shares):
+                for index, entry in share:
+                    results[index] = entry
+    else:
+        results = [run_subrequest(environ) for environ in environs]
+
+    for spec, entry in zip(specs, results):
+        entry['id'] = spec.get('id', spec.get('path')) if isinstance(spec, dict) else spec
+    return jsonify({'responses': results})
 
 # Get All Events
 @app.route('/events', methods=['GET'])
 def get_events():
     try:
-        events = execute_query("SELECT * FROM Events ORDER BY date", fetch=True)
-        return jsonify(events)
+        return cached_json(('events',), lambda: query_all_shards("SELECT * FROM Events ORDER BY date", key='date'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Search Events (server-side filters with keyset pagination)
+SEARCH_SORTS = {
+    'date': ('date', 'ASC'),
+    '-date': ('date', 'DESC'),
+    'name': ('name', 'ASC'),
+    '-name': ('name', 'DESC'),
+}
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError('Invalid cursor')
+    return values
+
+@app.route('/events/search', methods=['GET'])
+def search_events():
+    return cached_json(('events',), search_events_page)
+
+def search_events_page():
+    """
+    Filters: when=upcoming|past|all, from/to (YYYY-MM-DD, inclusive), type,
+    college_id, q (name prefix). sort=date|-date|name|-name, limit, cursor.
+    Pages are keyset-based: pass back next_cursor to continue.
+    """
+    args = request.args
+    sort = args.get('sort')
+    when = args.get('when', 'all')
+    if sort is None:
+        sort = '-date' if when == 'past' else 'date'
+    if sort not in SEARCH_SORTS:
+        return jsonify({'error': f"sort must be one of {', '.join(SEARCH_SORTS)}"}), 400
+    if when not in ('upcoming', 'past', 'all'):
+        return jsonify({'error': 'when must be upcoming, past or all'}), 400
+
+    try:
+        limit = min(max(int(args.get('limit', SEARCH_DEFAULT_LIMIT)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    conditions = []
+    params = []
+
+    today = datetime.now().date().isoformat()
+    if when == 'upcoming':
+        conditions.append("date >= %s")
+        params.append(today)
+    elif when == 'past':
+        conditions.append("date < %s")
+        params.append(today)
+    if args.get('from'):
+        conditions.append("date >= %s")
+        params.append(args['from'])
+    if args.get('to'):
+        conditions.append("date <= %s")
+        params.append(args['to'])
+    if args.get('type'):
+        conditions.append("type = %s")
+        params.append(args['type'])
+    if args.get('college_id'):
+        conditions.append("college_id = %s")
+        params.append(args['college_id'])
+    prefix = args.get('q')
+    if prefix:
+        # Range instead of LIKE so the name index is usable on both dialects
+        conditions.append("name >= %s AND name < %s")
+        params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+
+    sort_column, direction = SEARCH_SORTS[sort]
+    cursor = args.get('cursor')
+    if cursor:
+        try:
+            last_value, last_id = decode_cursor(cursor)
+        except Exception:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        op = '>' if direction == 'ASC' else '<'
+        conditions.append(f"({sort_column} {op} %s OR ({sort_column} = %s AND event_id {op} %s))")
+        params.extend([last_value, last_value, last_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        SELECT event_id, college_id, name, type, date
+        FROM Events
+        {where}
+        ORDER BY {sort_column} {direction}, event_id {direction}
+        LIMIT {limit + 1}
+    """
+
+    try:
+        # A college filter pins the search to one shard; otherwise every shard
+        # returns its first limit + 1 rows and the merge keeps the global first
+        if args.get('college_id'):
+            shards = [shard_router.for_college(args['college_id'])]
+        else:
+            shards = shard_router.shards
+        events = merge_rows(
+            [execute_query(query, tuple(params), fetch=True, shard=shard) for shard in shards],
+            key=(sort_column, 'event_id'), reverse=(direction == 'DESC'), limit=limit + 1
+        )
+        next_cursor = None
+        if len(events) > limit:
+            events = events[:limit]
+            last = events[-1]
+            next_cursor = encode_cursor([str(last[sort_column]), last['event_id']])
+        return {'events': events, 'next_cursor': next_cursor}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -300,25 +1487,199 @@ def create_event():
     name = data.get('name')
     event_type = data.get('type')
     date = data.get('date')
+    capacity = data.get('capacity')  # optional; None = unlimited
 
     if not all([college_id, name, event_type, date]):
         return jsonify({'error': 'Missing data'}), 400
+    if capacity is not None and (not isinstance(capacity, int) or capacity < 0):
+        return jsonify({'error': 'Capacity must be a non-negative integer'}), 400
 
     try:
-        if USE_MYSQL:
-            event_id = execute_query(
-                "INSERT INTO Events (college_id, name, type, date) VALUES (%s, %s, %s, %s)",
-                (college_id, name, event_type, date)
-            )
-        else:
-            event_id = execute_query(
-                "INSERT INTO Events (college_id, name, type, date) VALUES (?, ?, ?, ?)",
-                (college_id, name, event_type, date)
-            )
+        event_id = insert_with_id(
+            shard_router.for_college(college_id), 'Events',
+            ('college_id', 'name', 'type', 'date', 'capacity'),
+            (college_id, name, event_type, date, capacity)
+        )
         return jsonify({'message': 'Event created successfully', 'event_id': event_id}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Recurring event series (see series.py)
+def series_from_date():
+    """?from=YYYY-MM-DD (default today): series edits only touch occurrences from this date on"""
+    value = request.args.get('from') or (request.get_json(silent=True) or {}).get('from')
+    if not value:
+        return datetime.now().date().isoformat()
+    datetime.strptime(value, '%Y-%m-%d')
+    return value
+
+def load_series(cursor, series_id):
+    cursor.execute(shard_router.sql(
+        "SELECT series_id, college_id, name, type, rule, start_date, capacity FROM EventSeries WHERE series_id = %s"
+    ), (series_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([d[0] for d in cursor.description], row))
+
+@app.route('/series', methods=['POST'])
+def create_series():
+    """
+    {college_id, name, type, start_date, rule, capacity?}: store the series
+    and insert every occurrence in one transaction.
+    """
+    data = request.get_json(silent=True) or {}
+    series = {k: data.get(k) for k in ('college_id', 'name', 'type', 'capacity')}
+    if not all([series['college_id'], series['name'], series['type'], data.get('start_date')]):
+        return jsonify({'error': 'Missing data'}), 400
+    capacity = series['capacity']
+    if capacity is not None and (not isinstance(capacity, int) or capacity < 0):
+        return jsonify({'error': 'Capacity must be a non-negative integer'}), 400
+    try:
+        rule = parse_rule(data.get('rule'))
+        dates = expand(rule, data['start_date'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    shard = shard_router.for_college(series['college_id'])
+    try:
+        with transaction(shard) as cursor:
+            values = (series['college_id'], series['name'], series['type'], data['rule'], dates[0], capacity)
+            if shard_router.enabled:
+                series_id = shard_router.allocate_id(cursor, shard, 'EventSeries')
+                cursor.execute(shard_router.sql(
+                    "INSERT INTO EventSeries (series_id, college_id, name, type, rule, start_date, capacity) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+                ), (series_id, *values))
+                event_ids = shard_router.allocate_ids(cursor, shard, 'Events', len(dates))
+            else:
+                cursor.execute(shard_router.sql(
+                    "INSERT INTO EventSeries (college_id, name, type, rule, start_date, capacity) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)"
+                ), values)
+                series_id, event_ids = cursor.lastrowid, None
+            create_occurrences(cursor, series_id, series, dates, USE_MYSQL, event_ids)
+            events = occurrences(cursor, series_id, USE_MYSQL)
+        return jsonify({'message': 'Series created', 'series_id': series_id, 'events': events}), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/series/<int:series_id>', methods=['GET'])
+def get_series(series_id):
+    try:
+        cursor = bounded_cursor(get_read_db(shard_router.for_id(series_id)))
+        try:
+            series = load_series(cursor, series_id)
+            if series is None:
+                return jsonify({'error': 'Series not found'}), 404
+            series['events'] = occurrences(cursor, series_id, USE_MYSQL)
+        finally:
+            cursor.close()
+        return jsonify(series)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/series/<int:series_id>', methods=['PATCH'])
+def update_series(series_id):
+    """
+    {name?, type?, capacity?}: one UPDATE over the series' occurrences from
+    ?from= (default today). A larger capacity promotes waitlisted students.
+    """
+    data = request.get_json(silent=True) or {}
+    changes = {k: data[k] for k in EDITABLE_FIELDS if k in data}
+    if not changes:
+        return jsonify({'error': f"Nothing to change ({', '.join(EDITABLE_FIELDS)})"}), 400
+    capacity = changes.get('capacity')
+    if capacity is not None and (not isinstance(capacity, int) or capacity < 0):
+        return jsonify({'error': 'Capacity must be a non-negative integer or null'}), 400
+    if any(not changes[k] for k in ('name', 'type') if k in changes):
+        return jsonify({'error': 'name and type cannot be empty'}), 400
+    try:
+        from_date = series_from_date()
+    except ValueError:
+        return jsonify({'error': 'from must be YYYY-MM-DD'}), 400
+
+    try:
+        with transaction(shard_router.for_id(series_id)) as cursor:
+            if load_series(cursor, series_id) is None:
+                return jsonify({'error': 'Series not found'}), 404
+            updated, waitlisted = update_occurrences(cursor, series_id, changes, from_date, USE_MYSQL)
+            promoted = {}
+            for event_id in waitlisted:
+                promoted_ids = set_capacity(cursor, event_id, capacity, USE_MYSQL)
+                if promoted_ids:
+                    promoted[event_id] = promoted_ids
+        return jsonify({'message': 'Series updated', 'events_updated': updated, 'from': from_date,
+                        'promoted_student_ids': promoted}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/series/<int:series_id>', methods=['DELETE'])
+def cancel_series(series_id):
+    """
+    Cancel the occurrences dated ?from= or later (default: all of them, and
+    the series itself), with their registrations, attendance, feedback and
+    waitlist entries.
+    """
+    from_date = request.args.get('from') or None
+    whole_series = from_date is None
+    if not whole_series:
+        try:
+            datetime.strptime(from_date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'from must be YYYY-MM-DD'}), 400
+
+    try:
+        shard = shard_router.for_id(series_id)
+        with transaction(shard) as cursor:
+            if load_series(cursor, series_id) is None:
+                return jsonify({'error': 'Series not found'}), 404
+            cancelled = cancel_occurrences(cursor, series_id, from_date, USE_MYSQL)
+            if whole_series:
+                cursor.execute(shard_router.sql("DELETE FROM EventSeries WHERE series_id = %s"), (series_id,))
+        delete_children(bounded_db(get_db(shard)), cancelled, USE_MYSQL, DELETE_BATCH_SIZE)
+        return jsonify({'message': 'Series cancelled' if whole_series else 'Occurrences cancelled',
+                        'events_cancelled': len(cancelled)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/series/<int:series_id>/registrations', methods=['POST'])
+def register_series(series_id):
+    """
+    Carry registrations over to every occurrence from ?from= (default
+    today): {student_ids: [...]} or {from_event_id} to copy one
+    occurrence's registrants. Full occurrences are skipped.
+    """
+    data = request.get_json(silent=True) or {}
+    student_ids, source_event = data.get('student_ids'), data.get('from_event_id')
+    if student_ids is None and source_event is None:
+        return jsonify({'error': 'student_ids or from_event_id is required'}), 400
+    if student_ids is not None and (not isinstance(student_ids, list) or
+                                    not all(isinstance(i, int) for i in student_ids)):
+        return jsonify({'error': 'student_ids must be a list of integers'}), 400
+    try:
+        from_date = series_from_date()
+    except ValueError:
+        return jsonify({'error': 'from must be YYYY-MM-DD'}), 400
+
+    try:
+        with transaction(shard_router.for_id(series_id)) as cursor:
+            if load_series(cursor, series_id) is None:
+                return jsonify({'error': 'Series not found'}), 404
+            if source_event is not None:
+                cursor.execute(shard_router.sql(
+                    "SELECT R.student_id FROM Registrations R JOIN Events E ON E.event_id = R.event_id "
+                    "WHERE R.event_id = %s AND E.series_id = %s ORDER BY R.registration_date, R.reg_id"
+                ), (source_event, series_id))
+                student_ids = [row[0] for row in cursor.fetchall()]
+            student_ids = list(dict.fromkeys(student_ids))
+            added = carry_over_registrations(cursor, series_id, student_ids, from_date, USE_MYSQL) \
+                if student_ids else 0
+        return jsonify({'message': 'Registrations carried over', 'students': len(student_ids),
+                        'registrations_added': added, 'from': from_date}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Create Student
 @app.route('/students', methods=['POST'])
 def create_student():
@@ -331,17 +1692,13 @@ def create_student():
         return jsonify({'error': 'Missing data'}), 400
 
     try:
-        if USE_MYSQL:
-            student_id = execute_query(
-                "INSERT INTO Students (college_id, name, email) VALUES (%s, %s, %s)",
-                (college_id, name, email)
-            )
-        else:
-            student_id = execute_query(
-                "INSERT INTO Students (college_id, name, email) VALUES (?, ?, ?)",
-                (college_id, name, email)
-            )
-        return jsonify({'message': 'Student created successfully', 'student_id': student_id}), 201
+        student_id = insert_with_id(
+            shard_router.for_college(college_id), 'Students',
+            ('college_id', 'name', 'email'),
+            (college_id, name, email)
+        )
+        return jsonify({'message': 'Student created successfully', 'student_id': student_id,
+                        'access_token': student_tokens.issue(student_id)}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -356,23 +1713,28 @@ def find_or_create_student():
     if not all([college_id, name, email]):
         return jsonify({'error': 'Missing data'}), 400
 
+    shard = shard_router.for_college(college_id)
     try:
         # First, try to find existing student by email
         if USE_MYSQL:
             existing_students = execute_query(
                 "SELECT student_id, name, email FROM Students WHERE email = %s",
                 (email,),
-                fetch=True
+                fetch=True,
+                shard=shard
             )
         else:
             existing_students = execute_query(
                 "SELECT student_id, name, email FROM Students WHERE email = ?",
                 (email,),
-                fetch=True
+                fetch=True,
+                shard=shard
             )
         
         if existing_students:
-            # Student exists, return their info
+            # Student exists, return their info. Knowing an email proves
+            # nothing, so no access token: the student keeps the one issued
+            # at creation, or staff re-issue it (POST /students/<id>/access-token)
             student = existing_students[0]
             return jsonify({
                 'message': 'Student found',
@@ -383,27 +1745,312 @@ def find_or_create_student():
             }), 200
         
         # Student doesn't exist, create new one
-        if USE_MYSQL:
-            student_id = execute_query(
-                "INSERT INTO Students (college_id, name, email) VALUES (%s, %s, %s)",
-                (college_id, name, email)
-            )
-        else:
-            student_id = execute_query(
-                "INSERT INTO Students (college_id, name, email) VALUES (?, ?, ?)",
-                (college_id, name, email)
-            )
+        student_id = insert_with_id(
+            shard, 'Students',
+            ('college_id', 'name', 'email'),
+            (college_id, name, email)
+        )
         return jsonify({
             'message': 'Student created successfully',
             'student_id': student_id,
             'name': name,
             'email': email,
-            'is_new': True
+            'is_new': True,
+            'access_token': student_tokens.issue(student_id)
         }), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Re-issue a student's access token (staff), e.g. on a new device
+@app.route('/students/<int:student_id>/access-token', methods=['POST'])
+def reissue_access_token(student_id):
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    try:
+        students = execute_query(
+            "SELECT student_id FROM Students WHERE student_id = %s",
+            (student_id,), fetch=True, shard=shard_router.for_id(student_id)
+        )
+        if not students:
+            return jsonify({'error': 'Student not found'}), 404
+        return jsonify({'student_id': student_id, 'access_token': student_tokens.issue(student_id)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Per-student history pages (timeline, feedback): only for the student's
+# own access token or staff. The older per-student reads (/registrations,
+# /reports/student_analysis, /recommendations, GET /sync?student_id=) stay
+# public like every staff route; see "Student Access" in the README. Keyset-paginated, newest first, with an ETag
+# from the student's latest ChangeLog entry and the latest change to the
+# Events rows in their history (renames, date moves), so a client
+# revalidating an unchanged page costs a few index lookups
+STUDENT_PAGE_DEFAULT = 50
+STUDENT_PAGE_MAX = 200
+
+STUDENT_TIMELINE_SQL = """
+    SELECT
+        R.event_id AS event_id, E.name AS event_name, E.type AS event_type, E.date AS event_date,
+        R.registration_date AS registration_date, A.status AS attendance_status, F.rating AS feedback_rating
+    FROM Registrations R
+    JOIN Events E ON R.event_id = E.event_id
+    LEFT JOIN Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
+    LEFT JOIN Feedback F ON R.student_id = F.student_id AND R.event_id = F.event_id
+    WHERE R.student_id = %s {after}
+    UNION ALL
+    SELECT
+        R.event_id AS event_id, E.name AS event_name, E.type AS event_type, E.date AS event_date,
+        R.registration_date AS registration_date, A.status AS attendance_status, F.rating AS feedback_rating
+    FROM RegistrationsArchive R
+    JOIN Events E ON R.event_id = E.event_id
+    LEFT JOIN AttendanceArchive A ON R.student_id = A.student_id AND R.event_id = A.event_id
+    LEFT JOIN FeedbackArchive F ON R.student_id = F.student_id AND R.event_id = F.event_id
+    WHERE R.student_id = %s {after}
+    ORDER BY registration_date DESC, event_id DESC
+    LIMIT %s
+"""
+
+STUDENT_FEEDBACK_SQL = """
+    SELECT
+        F.event_id AS event_id, E.name AS event_name, E.type AS event_type, E.date AS event_date,
+        F.rating AS rating, F.feedback_text AS feedback_text, F.feedback_date AS feedback_date
+    FROM Feedback F
+    JOIN Events E ON F.event_id = E.event_id
+    WHERE F.student_id = %s {after}
+    UNION ALL
+    SELECT
+        F.event_id AS event_id, E.name AS event_name, E.type AS event_type, E.date AS event_date,
+        F.rating AS rating, F.feedback_text AS feedback_text, F.feedback_date AS feedback_date
+    FROM FeedbackArchive F
+    JOIN Events E ON F.event_id = E.event_id
+    WHERE F.student_id = %s {after}
+    ORDER BY feedback_date DESC, event_id DESC
+    LIMIT %s
+"""
+
+STUDENT_HISTORY_VERSION_SQL = """
+    SELECT
+        (SELECT MAX(seq) FROM ChangeLog WHERE student_id = %s) AS seq,
+        (SELECT MAX(C.seq) FROM ChangeLog C
+         WHERE C.table_name = 'Events' AND C.event_id IN (
+             SELECT event_id FROM Registrations WHERE student_id = %s
+             UNION ALL SELECT event_id FROM RegistrationsArchive WHERE student_id = %s
+             UNION ALL SELECT event_id FROM Feedback WHERE student_id = %s
+             UNION ALL SELECT event_id FROM FeedbackArchive WHERE student_id = %s
+         )) AS event_seq
+"""
+
+def student_history_page(student_id, query, date_column, prefix):
+    """
+    Shared body of the per-student history routes: conditional GET on the
+    ChangeLog positions of the student and their events, then one page of
+    `query` newest first.
+    """
+    if not student_authorized(student_id):
+        return jsonify({'error': "Only the student's own access token or staff can read this history"}), 403
+    limit = min(max(request.args.get('limit', STUDENT_PAGE_DEFAULT, type=int), 1), STUDENT_PAGE_MAX)
+    cursor = request.args.get('cursor')
+    try:
+        after_values = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    shard = shard_router.for_id(student_id)
+    try:
+        version = execute_query(STUDENT_HISTORY_VERSION_SQL, (student_id,) * 5, fetch=True, shard=shard)[0]
+        etag = f"{request.path}:{version['seq'] or 0}.{version['event_seq'] or 0}:{zlib.crc32(request.query_string):08x}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            if not execute_query("SELECT 1 AS found FROM Students WHERE student_id = %s",
+                                 (student_id,), fetch=True, shard=shard):
+                return jsonify({'error': 'Student not found'}), 404
+            after, after_params = '', ()
+            if after_values is not None:
+                after = f"AND ({prefix}.{date_column} < %s OR ({prefix}.{date_column} = %s AND {prefix}.event_id < %s))"
+                after_params = (after_values[0], after_values[0], after_values[1])
+            rows = execute_query(
+                query.format(after=after),
+                (student_id, *after_params, student_id, *after_params, limit + 1),
+                fetch=True, shard=shard
+            )
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor([str(rows[-1][date_column]), rows[-1]['event_id']])
+            response = jsonify({'student_id': student_id, 'items': rows, 'next_cursor': next_cursor})
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# A student's registrations (with attendance and rating), newest first
+@app.route('/students/<int:student_id>/timeline', methods=['GET'])
+def get_student_timeline(student_id):
+    return student_history_page(student_id, STUDENT_TIMELINE_SQL, 'registration_date', 'R')
+
+# Feedback a student has given, newest first
+@app.route('/students/<int:student_id>/feedback', methods=['GET'])
+def get_student_feedback_history(student_id):
+    return student_history_page(student_id, STUDENT_FEEDBACK_SQL, 'feedback_date', 'F')
+
+# Event recommendations (see recommend.py). A (student, event) pair counts
+# when there is a registration or a 'present' attendance row, hot or archived.
+ENGAGED_SQL = """
+    SELECT student_id, event_id FROM Registrations {where}
+    UNION SELECT student_id, event_id FROM Attendance WHERE status = 'present' {and_where}
+    UNION SELECT student_id, event_id FROM RegistrationsArchive {where}
+    UNION SELECT student_id, event_id FROM AttendanceArchive WHERE status = 'present' {and_where}
+"""
+RECOMMEND_PAGE_DEFAULT = 10
+RECOMMEND_PAGE_MAX = 50
+# More ChangeLog rows than this since the last update: rebuild from scratch
+RECOMMEND_MAX_CHANGES = 5000
+
+def engaged_sql(condition=None):
+    if condition is None:
+        return ENGAGED_SQL.format(where='', and_where='')
+    return ENGAGED_SQL.format(where=f"WHERE {condition}", and_where=f"AND {condition}")
+
+def recommend_today():
+    return date_key(datetime.now().strftime('%Y-%m-%d'))
+
+def recommend_changes(shard, since):
+    """
+    ChangeLog rows after `since` that can move the index, and the seq to
+    continue from (held back on MySQL, as in sync.changes_since).
+    None if there are too many to apply one by one, or if entries after
+    `since` have been pruned.
+    """
+    horizon = execute_query("SELECT MAX(seq) AS seq FROM ChangeLogHorizon", fetch=True, shard=shard)[0]['seq'] or 0
+    if since < horizon:
+        return None
+    rows = execute_query("""
+        SELECT seq, table_name, event_id, student_id FROM ChangeLog
+        WHERE seq > %s AND table_name IN ('Events', 'Registrations', 'Attendance')
+        ORDER BY seq LIMIT %s
+    """, (since, RECOMMEND_MAX_CHANGES + 1), fetch=True, shard=shard)
+    if len(rows) > RECOMMEND_MAX_CHANGES:
+        return None
+    next_since = rows[-1]['seq'] if rows else since
+    if USE_MYSQL and rows:
+        unsettled = execute_query(f"""
+            SELECT MIN(seq) AS seq FROM ChangeLog
+            WHERE seq > %s AND changed_at > NOW() - INTERVAL {MYSQL_SETTLE_SECONDS} SECOND
+        """, (since,), fetch=True, shard=shard)[0]['seq']
+        if unsettled is not None:
+            next_since = min(next_since, unsettled - 1)
+    return rows, next_since
+
+def update_recommendations(builder):
+    """Apply ChangeLog to `builder` in place. Returns False if it needs a full build."""
+    events, changes, versions = {}, [], []
+    for shard, since in zip(shard_router.shards, builder.data_version):
+        found = recommend_changes(shard, since)
+        if found is None:
+            return False
+        rows, next_since = found
+        versions.append(next_since)
+        event_ids = {row['event_id'] for row in rows if row['table_name'] == 'Events'}
+        if event_ids:
+            placeholders = ', '.join(['%s'] * len(event_ids))
+            dates = {row['event_id']: row['date'] for row in execute_query(
+                f"SELECT event_id, date FROM Events WHERE event_id IN ({placeholders})",
+                tuple(event_ids), fetch=True, shard=shard
+            )}
+            events.update({event_id: dates.get(event_id) for event_id in event_ids})
+        # Re-read each pair: the log says it changed, not how
+        pairs = {(row['student_id'], row['event_id']) for row in rows
+                 if row['table_name'] != 'Events' and row['student_id'] is not None}
+        for student_id, event_id in pairs:
+            condition = "student_id = %s AND event_id = %s"
+            taken = execute_query(engaged_sql(condition), (student_id, event_id) * 4, fetch=True, shard=shard)
+            changes.append((student_id, event_id, bool(taken)))
+    return builder.apply(events, changes, versions) is not None
+
+def refresh_recommendations():
+    """
+    Bring the recommendation index up to date: incrementally from ChangeLog
+    when possible, from scratch on the first run, a new day, or a change
+    too large to apply. Returns the header written, or None if nothing changed.
+    """
+    global recommend_builder
+    today = recommend_today()
+    with app.app_context():
+        builder = recommend_builder
+        if builder is not None and builder.day == today:
+            before = builder.data_version
+            if update_recommendations(builder):
+                if builder.data_version == before:
+                    return None
+                return builder.write(RECOMMEND_DIR)
+        # Positions first: anything logged while reading is applied next time
+        versions = [execute_query("SELECT MAX(seq) AS seq FROM ChangeLog", fetch=True, shard=shard)[0]['seq'] or 0
+                    for shard in shard_router.shards]
+        events, pairs = [], []
+        for shard in shard_router.shards:
+            events += [(row['event_id'], row['date'])
+                       for row in execute_query("SELECT event_id, date FROM Events", fetch=True, shard=shard)]
+            pairs += [(row['student_id'], row['event_id'])
+                      for row in execute_query(engaged_sql(), fetch=True, shard=shard)]
+        builder = RecommendationBuilder(RECOMMEND_TOP_K)
+        builder.build(today, events, pairs, versions)
+        recommend_builder = builder
+        return builder.write(RECOMMEND_DIR)
+
+recommend_builder = None
+recommend_index = None
+recommend_scheduler = None
+if RECOMMEND_SCHEDULER != 'off':
+    os.makedirs(RECOMMEND_DIR, exist_ok=True)
+    recommend_index = RecommendationIndex(RECOMMEND_DIR)
+    if RECOMMEND_SCHEDULER == 'thread':
+        recommend_scheduler = SnapshotScheduler(RECOMMEND_DIR, refresh_recommendations, RECOMMEND_INTERVAL,
+                                                name='recommendation')
+
+@app.before_request
+def start_recommend_scheduler():
+    if recommend_scheduler is not None:
+        recommend_scheduler.ensure_started()
+
+# Upcoming events a student is likely to join, from the precomputed index:
+# one indexed read of their history, then a top-k lookup per event in it
+@app.route('/students/<int:student_id>/recommendations', methods=['GET'])
+def get_student_recommendations(student_id):
+    if recommend_index is None or not recommend_index.ready():
+        return jsonify({'error': 'Recommendations are not available yet'}), 503
+    limit = min(max(request.args.get('limit', RECOMMEND_PAGE_DEFAULT, type=int), 1), RECOMMEND_PAGE_MAX)
+    shard = shard_router.for_id(student_id)
+    try:
+        if not execute_query("SELECT 1 AS found FROM Students WHERE student_id = %s",
+                             (student_id,), fetch=True, shard=shard):
+            return jsonify({'error': 'Student not found'}), 404
+        history = [row['event_id'] for row in execute_query(
+            engaged_sql("student_id = %s"), (student_id,) * 4, fetch=True, shard=shard
+        )]
+        ranked = recommend_index.recommend(history, recommend_today(), limit)
+
+        details = {}
+        by_shard = {}
+        for event_id, _ in ranked:
+            by_shard.setdefault(shard_router.for_id(event_id), []).append(event_id)
+        for event_shard, event_ids in by_shard.items():
+            placeholders = ', '.join(['%s'] * len(event_ids))
+            for row in execute_query(f"""
+                SELECT event_id, college_id, name, type, date, capacity, seats_taken
+                FROM Events WHERE event_id IN ({placeholders})
+            """, tuple(event_ids), fetch=True, shard=event_shard):
+                details[row['event_id']] = row
+        items = [dict(details[event_id], score=score) for event_id, score in ranked if event_id in details]
+        return jsonify({
+            'student_id': student_id,
+            'items': items,
+            'index_built_at': recommend_index.header['built_at'],
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Register Student to an Event
 @app.route('/register', methods=['POST'])
 def register_student():
@@ -415,35 +2062,71 @@ def register_student():
         return jsonify({'error': 'Missing data'}), 400
 
     try:
-        # Check if student is already registered for this event
-        if USE_MYSQL:
-            existing_registrations = execute_query(
-                "SELECT registration_id FROM Registrations WHERE student_id = %s AND event_id = %s",
-                (student_id, event_id),
-                fetch=True
-            )
-        else:
-            existing_registrations = execute_query(
-                "SELECT registration_id FROM Registrations WHERE student_id = ? AND event_id = ?",
-                (student_id, event_id),
-                fetch=True
-            )
-        
-        if existing_registrations:
-            return jsonify({'error': 'Student is already registered for this event'}), 400
-        
-        # Register the student
-        if USE_MYSQL:
-            execute_query(
-                "INSERT INTO Registrations (student_id, event_id) VALUES (%s, %s)",
-                (student_id, event_id)
-            )
-        else:
-            execute_query(
-                "INSERT INTO Registrations (student_id, event_id) VALUES (?, ?)",
-                (student_id, event_id)
-            )
-        return jsonify({'message': 'Student registered successfully'}), 201
+        # One conditional UPDATE claims the seat; full events go to the waitlist
+        with transaction(shard_router.for_id(event_id)) as cursor:
+            outcome, position = claim_seat(cursor, student_id, event_id, USE_MYSQL)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if outcome == EVENT_NOT_FOUND:
+        return jsonify({'error': 'Event not found'}), 404
+    if outcome == ALREADY_REGISTERED:
+        return jsonify({'error': 'Student is already registered for this event'}), 400
+    if outcome == ALREADY_WAITLISTED:
+        return jsonify({
+            'error': 'Student is already on the waitlist for this event',
+            'waitlist_position': position
+        }), 400
+    if outcome == WAITLISTED:
+        return jsonify({
+            'message': 'Event is full, student added to the waitlist',
+            'waitlist_position': position
+        }), 202
+    return jsonify({
+        'message': 'Student registered successfully',
+        'checkin_token': issue_checkin_token(student_id, event_id)
+    }), 201
+
+# Cancel a registration (or waitlist entry); the seat goes to the next waitlisted student
+@app.route('/register', methods=['DELETE'])
+def unregister_student():
+    data = request.get_json()
+    student_id = data.get('student_id')
+    event_id = data.get('event_id')
+
+    if not all([student_id, event_id]):
+        return jsonify({'error': 'Missing data'}), 400
+
+    try:
+        with transaction(shard_router.for_id(event_id)) as cursor:
+            removed, promoted = release_seat(cursor, student_id, event_id, USE_MYSQL)
+        if not removed:
+            return jsonify({'error': 'Registration not found'}), 404
+        return jsonify({
+            'message': 'Registration cancelled',
+            'promoted_student_id': promoted
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Change an event's capacity (null = unlimited)
+@app.route('/events/<int:event_id>/capacity', methods=['PUT'])
+def update_event_capacity(event_id):
+    data = request.get_json()
+    capacity = data.get('capacity')
+    if capacity is not None and (not isinstance(capacity, int) or capacity < 0):
+        return jsonify({'error': 'Capacity must be a non-negative integer or null'}), 400
+
+    try:
+        with transaction(shard_router.for_id(event_id)) as cursor:
+            promoted = set_capacity(cursor, event_id, capacity, USE_MYSQL)
+        if promoted is None:
+            return jsonify({'error': 'Event not found'}), 404
+        return jsonify({
+            'message': 'Capacity updated',
+            'capacity': capacity,
+            'promoted_student_ids': promoted
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -458,9 +2141,9 @@ def mark_attendance_student():
     if not all([student_id, event_id, status]):
         return jsonify({'error': 'Missing data'}), 400
 
-    db = get_db()
+    db = get_db(shard_router.for_id(event_id))
     try:
-        cursor = db.cursor()
+        cursor = bounded_cursor(db)
         cursor.execute(
             "INSERT INTO Attendance (student_id, event_id, status) VALUES (?, ?, ?)",
             (student_id, event_id, status)
@@ -486,16 +2169,19 @@ def collect_feedback():
     if not (1 <= rating <= 5):
         return jsonify({'error': 'Rating must be between 1 and 5'}), 400
 
+    shard = shard_router.for_id(event_id)
     try:
         if USE_MYSQL:
             execute_query(
                 "INSERT INTO Feedback (student_id, event_id, rating, feedback_text) VALUES (%s, %s, %s, %s)",
-                (student_id, event_id, rating, feedback_text)
+                (student_id, event_id, rating, feedback_text),
+                shard=shard
             )
         else:
             execute_query(
                 "INSERT INTO Feedback (student_id, event_id, rating, feedback_text) VALUES (?, ?, ?, ?)",
-                (student_id, event_id, rating, feedback_text)
+                (student_id, event_id, rating, feedback_text),
+                shard=shard
             )
         return jsonify({'message': 'Feedback submitted successfully'}), 201
     except Exception as e:
@@ -503,161 +2189,417 @@ def collect_feedback():
             return jsonify({'error': 'Feedback already submitted for this student and event'}), 400
         return jsonify({'error': str(e)}), 500
 
-# Report Endpoints
+# QR Check-in
+@app.route('/checkin', methods=['POST'])
+def checkin():
+    data = request.get_json(silent=True) or {}
+    token = data.get('token') or request.args.get('token')
+    if not token:
+        return jsonify({'error': 'Missing token'}), 400
 
-# Total registrations per event
-@app.route('/reports/registrations', methods=['GET'])
-def get_registrations_report():
     try:
-        report = execute_query("""
-            SELECT
-                E.name AS event_name,
-                COUNT(R.registration_id) AS total_registrations
-            FROM
-                Events E
-            LEFT JOIN
-                Registrations R ON E.event_id = R.event_id
-            GROUP BY
-                E.event_id, E.name
-            ORDER BY
-                total_registrations DESC;
-        """, fetch=True)
-        return jsonify(report)
+        student_id, event_id = checkin_signer.verify(token)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 401
+
+    key = (student_id, event_id)
+    if checkin_dedup.seen(key):
+        return jsonify({
+            'message': 'Already checked in',
+            'student_id': student_id,
+            'event_id': event_id,
+            'duplicate': True
+        }), 200
+
+    shard = shard_router.for_id(event_id)
+    try:
+        # Conditional on the registration: a token outlives an unregistration or a deleted event
+        with transaction(shard) as cursor:
+            cursor.execute(checkin_upsert_sql(), ('present', student_id, event_id))
+            missing = None
+            if cursor.rowcount == 0:
+                # MySQL also reports 0 rows for an upsert that changed nothing (already present)
+                cursor.execute(shard_router.sql(
+                    "SELECT 1 FROM Registrations WHERE student_id = %s AND event_id = %s"), (student_id, event_id))
+                if cursor.fetchone() is None:
+                    cursor.execute(shard_router.sql("SELECT 1 FROM Events WHERE event_id = %s"), (event_id,))
+                    missing = 'registration' if cursor.fetchone() is not None else 'event'
+        if missing == 'event':
+            return jsonify({'error': 'Event not found'}), 404
+        if missing == 'registration':
+            return jsonify({'error': 'Student is no longer registered for this event'}), 409
+        checkin_dedup.add(key)
+        return jsonify({
+            'message': 'Checked in',
+            'student_id': student_id,
+            'event_id': event_id,
+            'duplicate': False
+        }), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Composite actions (see actions.py): one round trip, one transaction
+def action_student(data):
+    """The student part of an action body, plus the shard it lives on"""
+    if data.get('student_id'):
+        if not isinstance(data['student_id'], int):
+            raise ActionFailed(400, 'student_id must be an integer')
+        return {'student_id': data['student_id']}, shard_router.for_id(data['student_id'])
+    student = {k: data.get(k) for k in ('college_id', 'name', 'email')}
+    return student, shard_router.for_college(student['college_id']) if student['college_id'] else None
+
+def run_action(action, event_id, data, build, on_success):
+    """
+    Run build(cursor, timer, student, new_id) in one transaction on the
+    event's shard; after the commit, on_success(result) adds to the result
+    and returns the status. ActionFailed and other errors roll everything
+    back and report the failed step. Per-step timings are added in debug
+    mode (app.debug, or ?debug=1 with the admin token).
+    """
+    debug = app.debug or (request.args.get('debug') == '1' and admin_authorized())
+    timer = StepTimer()
+    if not isinstance(event_id, int):
+        return jsonify({'error': 'event_id must be an integer', 'action': action}), 400
+
+    try:
+        shard = shard_router.for_id(event_id)
+        student, student_shard = action_student(data)
+        if student_shard is not None and student_shard != shard:
+            raise ActionFailed(400, 'Student and event are on different shards; use the individual endpoints')
+        new_id = (lambda cursor: shard_router.allocate_id(cursor, shard, 'Students')) if shard_router.enabled else None
+        g._wrote = True
+        with transaction(shard) as cursor:
+            result = build(cursor, timer, student, new_id)
+        body = dict(result, action=action)
+        status = on_success(body)
+    except ActionFailed as e:
+        body, status = {'error': e.message, 'action': action, 'failed_step': e.step, 'rolled_back': True}, e.status
+    except Exception as e:
+        body, status = {'error': str(e), 'action': action, 'failed_step': timer.current, 'rolled_back': True}, 500
+    if debug:
+        body['timings_ms'] = [{'step': name, 'ms': ms} for name, ms in timer.steps]
+    response = jsonify(body)
+    response.status_code = status
+    if debug:
+        response.headers['Server-Timing'] = timer.server_timing()
+    return response
+
+@app.route('/actions/submit-feedback', methods=['POST'])
+def submit_feedback_action():
+    """
+    {student_id | college_id+name+email, event_id, rating, feedback_text?}
+    201 on success. 400 bad input, 403 not registered, 404 unknown student or
+    event, 409 feedback already given; any failure leaves no changes.
+    """
+    data = request.get_json(silent=True) or {}
+    event_id, rating = data.get('event_id'), data.get('rating')
+    if not event_id or not isinstance(rating, int):
+        return jsonify({'error': 'event_id and an integer rating are required'}), 400
+    if not (1 <= rating <= 5):
+        return jsonify({'error': 'Rating must be between 1 and 5'}), 400
+
+    return run_action(
+        'submit-feedback', event_id, data,
+        lambda cursor, timer, student, new_id: submit_feedback(
+            cursor, timer, student, event_id, rating, data.get('feedback_text'), USE_MYSQL, new_id),
+        lambda result: 201
+    )
+
+@app.route('/actions/register-and-checkin', methods=['POST'])
+def register_and_checkin_action():
+    """
+    {student_id | college_id+name+email, event_id}: register (an existing
+    registration is fine) and mark present. 201 when something changed, 200
+    if the student was already checked in. 404 unknown student or event,
+    409 event full; any failure leaves no changes.
+    """
+    data = request.get_json(silent=True) or {}
+    event_id = data.get('event_id')
+    if not event_id:
+        return jsonify({'error': 'event_id is required'}), 400
+
+    def checked_in(result):
+        checkin_dedup.add((result['student_id'], event_id))
+        result['checkin_token'] = issue_checkin_token(result['student_id'], event_id)
+        return 200 if result['already_present'] and not result['newly_registered'] else 201
+
+    return run_action(
+        'register-and-checkin', event_id, data,
+        lambda cursor, timer, student, new_id: register_and_checkin(
+            cursor, timer, student, event_id, USE_MYSQL, attendance_upsert_sql(), new_id),
+        checked_in
+    )
+
+# Re-issue a check-in token for an existing registration
+@app.route('/checkin/token', methods=['GET'])
+def get_checkin_token():
+    student_id = request.args.get('student_id', type=int)
+    event_id = request.args.get('event_id', type=int)
+    if not all([student_id, event_id]):
+        return jsonify({'error': 'Missing data'}), 400
+    if not student_authorized(student_id):
+        return jsonify({'error': "A check-in token is only issued to the student's own token or to staff"}), 403
+
+    try:
+        registered = execute_query(
+            "SELECT E.date AS date FROM Registrations R JOIN Events E ON E.event_id = R.event_id "
+            "WHERE R.student_id = %s AND R.event_id = %s",
+            (student_id, event_id),
+            fetch=True,
+            shard=shard_router.for_id(event_id)
+        )
+        if not registered:
+            return jsonify({'error': 'Student is not registered for this event'}), 404
+        return jsonify({'checkin_token': issue_checkin_token(student_id, event_id, registered[0]['date'])})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Offline sync: rows changed since the client's last sync (see sync.py).
+# The sequence is per shard; sharded deployments pass college_id.
+@app.route('/sync', methods=['GET'])
+def get_changes():
+    since = request.args.get('since', 0, type=int)
+    student_id = request.args.get('student_id', type=int)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 1000)
+    tables = [t.strip() for t in request.args.get('tables', ','.join(SYNC_TABLES)).split(',') if t.strip()]
+    unknown = [t for t in tables if t not in SYNC_TABLES]
+    if unknown or not tables:
+        return jsonify({'error': f"tables must be a subset of {', '.join(SYNC_TABLES)}"}), 400
+
+    college_id = request.args.get('college_id')
+    shard = shard_router.for_college(college_id) if college_id else DEFAULT_SHARD
+    try:
+        cursor = bounded_cursor(get_read_db(shard))
+        try:
+            horizon = changelog_horizon(cursor)
+            if 0 < since < horizon:
+                # Delete entries after `since` have been pruned (see sync.prune_changelog)
+                return jsonify({'error': 'since is older than the retained change log; sync again from 0',
+                                'horizon': horizon}), 410
+            return jsonify(changes_since(cursor, since, tables, USE_MYSQL, student_id=student_id, limit=limit))
+        finally:
+            cursor.close()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Offline sync: apply actions queued while the app was offline
+@app.route('/sync', methods=['POST'])
+def apply_offline_actions():
+    data = request.get_json(silent=True) or {}
+    actions = data.get('actions')
+    if not isinstance(actions, list) or not all(isinstance(a, dict) for a in actions):
+        return jsonify({'error': 'actions must be a list of objects'}), 400
+    if len(actions) > MAX_ACTIONS:
+        return jsonify({'error': f'At most {MAX_ACTIONS} actions per request'}), 400
+
+    # One transaction per shard touched (a single one when not sharded)
+    by_shard = {}
+    for index, action in enumerate(actions):
+        shard = shard_router.for_id(action.get('event_id')) if action.get('event_id') else DEFAULT_SHARD
+        by_shard.setdefault(shard, []).append((index, action))
+
+    results = [None] * len(actions)
+    try:
+        for shard, batch in by_shard.items():
+            with transaction(shard) as cursor:
+                applied = apply_actions(cursor, [action for _, action in batch], USE_MYSQL, attendance_upsert_sql())
+            for (index, action), result in zip(batch, applied):
+                result['id'] = action.get('id', index)
+                if result['status'] == 'ok' and action.get('type') == 'register':
+                    result['checkin_token'] = issue_checkin_token(action['student_id'], action['event_id'],
+                                                                  shard=shard)
+                results[index] = result
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    return jsonify({'results': results}), 200
+
+# Report Endpoints
+
+# Per-event totals: aggregates over the hot tables plus the EventSummary row
+# left behind by archive.py, so archived history stays in every report
+EVENT_TOTALS_SQL = """
+    SELECT
+        E.event_id, E.name, E.type, E.date,
+        COALESCE(R.registered, 0) + COALESCE(S.registered, 0) AS registered,
+        COALESCE(R.present, 0) + COALESCE(S.present, 0) AS present,
+        COALESCE(R.absent, 0) + COALESCE(S.absent, 0) AS absent,
+        COALESCE(F.feedback_count, 0) + COALESCE(S.feedback_count, 0) AS feedback_count,
+        COALESCE(F.rating_sum, 0) + COALESCE(S.rating_sum, 0) AS rating_sum,
+        CASE WHEN S.min_rating IS NULL OR F.min_rating < S.min_rating
+             THEN F.min_rating ELSE S.min_rating END AS min_rating,
+        CASE WHEN S.max_rating IS NULL OR F.max_rating > S.max_rating
+             THEN F.max_rating ELSE S.max_rating END AS max_rating
+    FROM
+        Events E
+    LEFT JOIN (
+        SELECT
+            R.event_id,
+            COUNT(*) AS registered,
+            SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS present,
+            SUM(CASE WHEN A.status = 'absent' THEN 1 ELSE 0 END) AS absent
+        FROM Registrations R
+        LEFT JOIN Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
+        GROUP BY R.event_id
+    ) R ON E.event_id = R.event_id
+    LEFT JOIN (
+        SELECT event_id, COUNT(*) AS feedback_count, SUM(rating) AS rating_sum,
+               MIN(rating) AS min_rating, MAX(rating) AS max_rating
+        FROM Feedback
+        GROUP BY event_id
+    ) F ON E.event_id = F.event_id
+    LEFT JOIN
+        EventSummary S ON E.event_id = S.event_id
+"""
+
+# Total registrations per event
+def registrations_report():
+    return query_all_shards(f"""
+        SELECT
+            T.name AS event_name,
+            T.registered AS total_registrations
+        FROM ({EVENT_TOTALS_SQL}) T
+        ORDER BY
+            total_registrations DESC;
+    """, key='total_registrations', reverse=True)
 
 # Attendance percentage per event
-@app.route('/reports/attendance', methods=['GET'])
-def get_attendance_report():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("""
+def attendance_report():
+    return query_all_shards(f"""
         SELECT
-            E.name AS event_name,
-            COUNT(DISTINCT R.student_id) AS total_registered,
-            SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS total_present,
-            CAST(SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) * 100.0 AS REAL) / COUNT(DISTINCT R.student_id) AS attendance_percentage
-        FROM
-            Events E
-        LEFT JOIN
-            Registrations R ON E.event_id = R.event_id
-        LEFT JOIN
-            Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
-        GROUP BY
-            E.event_id, E.name
+            T.name AS event_name,
+            T.registered AS total_registered,
+            T.present AS total_present,
+            CASE
+                WHEN T.registered > 0
+                THEN T.present * 100.0 / T.registered
+            END AS attendance_percentage
+        FROM ({EVENT_TOTALS_SQL}) T
         ORDER BY
             attendance_percentage DESC;
-    """)
-    report = cursor.fetchall()
-    return jsonify([dict(row) for row in report])
+    """, key='attendance_percentage', reverse=True)
 
 # Average feedback score per event
-@app.route('/reports/feedback', methods=['GET'])
-def get_feedback_report():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("""
+def feedback_report():
+    return query_all_shards(f"""
         SELECT
-            E.name AS event_name,
-            AVG(F.rating) AS average_feedback_score
-        FROM
-            Events E
-        LEFT JOIN
-            Feedback F ON E.event_id = F.event_id
-        GROUP BY
-            E.event_id, E.name
+            T.name AS event_name,
+            CASE
+                WHEN T.feedback_count > 0
+                THEN T.rating_sum * 1.0 / T.feedback_count
+            END AS average_feedback_score
+        FROM ({EVENT_TOTALS_SQL}) T
         ORDER BY
             average_feedback_score DESC;
-    """)
-    report = cursor.fetchall()
-    return jsonify([dict(row) for row in report])
+    """, key='average_feedback_score', reverse=True)
 
 # Comprehensive event analysis report
-@app.route('/reports/event_analysis', methods=['GET'])
-def get_event_analysis_report():
-    try:
-        report = execute_query("""
-            SELECT
-                E.event_id,
-                E.name AS event_name,
-                E.type AS event_type,
-                E.date AS event_date,
-                COUNT(DISTINCT R.student_id) AS total_registered,
-                SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS total_present,
-                SUM(CASE WHEN A.status = 'absent' THEN 1 ELSE 0 END) AS total_absent,
-                CASE 
-                    WHEN COUNT(DISTINCT R.student_id) > 0 
-                    THEN CAST(SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) * 100.0 AS REAL) / COUNT(DISTINCT R.student_id)
-                    ELSE 0 
-                END AS attendance_percentage,
-                COUNT(DISTINCT F.feedback_id) AS total_feedback_count,
-                AVG(F.rating) AS average_rating,
-                MIN(F.rating) AS min_rating,
-                MAX(F.rating) AS max_rating
-            FROM
-                Events E
-            LEFT JOIN
-                Registrations R ON E.event_id = R.event_id
-            LEFT JOIN
-                Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
-            LEFT JOIN
-                Feedback F ON E.event_id = F.event_id
-            GROUP BY
-                E.event_id, E.name, E.type, E.date
-            ORDER BY
-                E.date DESC;
-        """, fetch=True)
-        return jsonify(report)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+def event_analysis_report():
+    return query_all_shards(f"""
+        SELECT
+            T.event_id,
+            T.name AS event_name,
+            T.type AS event_type,
+            T.date AS event_date,
+            T.registered AS total_registered,
+            T.present AS total_present,
+            T.absent AS total_absent,
+            CASE
+                WHEN T.registered > 0
+                THEN T.present * 100.0 / T.registered
+                ELSE 0
+            END AS attendance_percentage,
+            T.feedback_count AS total_feedback_count,
+            CASE
+                WHEN T.feedback_count > 0
+                THEN T.rating_sum * 1.0 / T.feedback_count
+            END AS average_rating,
+            T.min_rating,
+            T.max_rating
+        FROM ({EVENT_TOTALS_SQL}) T
+        ORDER BY
+            T.date DESC;
+    """, key='event_date', reverse=True)
 
 # Detailed student attendance and feedback report
 @app.route('/reports/student_analysis/<int:student_id>', methods=['GET'])
 def get_student_analysis_report(student_id):
+    return cached_json(('students', f'student:{student_id}'), lambda: student_analysis_report(student_id))
+
+def student_analysis_report(student_id):
+    shard = shard_router.for_id(student_id)
     try:
         # Get student info
         student_info = execute_query("""
             SELECT student_id, name, email, college_id
             FROM Students 
             WHERE student_id = %s
-        """, (student_id,), fetch=True)
+        """, (student_id,), fetch=True, shard=shard)
         
         if not student_info:
             return jsonify({'error': 'Student not found'}), 404
         
-        # Get attendance summary
+        # Get attendance summary (hot rows + archived StudentSummary)
         attendance_summary = execute_query("""
             SELECT
-                COUNT(*) AS total_events_registered,
-                SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS events_attended,
-                SUM(CASE WHEN A.status = 'absent' THEN 1 ELSE 0 END) AS events_absent,
-                CASE 
-                    WHEN COUNT(*) > 0 
-                    THEN CAST(SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) * 100.0 AS REAL) / COUNT(*)
-                    ELSE 0 
+                T.registered AS total_events_registered,
+                T.present AS events_attended,
+                T.absent AS events_absent,
+                CASE
+                    WHEN T.registered > 0
+                    THEN T.present * 100.0 / T.registered
+                    ELSE 0
                 END AS attendance_percentage
-            FROM
-                Registrations R
-            LEFT JOIN
-                Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
-            WHERE
-                R.student_id = %s
-        """, (student_id,), fetch=True)
+            FROM (
+                SELECT
+                    COALESCE(H.registered, 0) + COALESCE(S.registered, 0) AS registered,
+                    COALESCE(H.present, 0) + COALESCE(S.present, 0) AS present,
+                    COALESCE(H.absent, 0) + COALESCE(S.absent, 0) AS absent
+                FROM (
+                    SELECT
+                        COUNT(*) AS registered,
+                        SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS present,
+                        SUM(CASE WHEN A.status = 'absent' THEN 1 ELSE 0 END) AS absent
+                    FROM
+                        Registrations R
+                    LEFT JOIN
+                        Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
+                    WHERE
+                        R.student_id = %s
+                ) H
+                LEFT JOIN
+                    StudentSummary S ON S.student_id = %s
+            ) T
+        """, (student_id, student_id), fetch=True, shard=shard)
         
-        # Get feedback summary
+        # Get feedback summary (hot rows + archived StudentSummary)
         feedback_summary = execute_query("""
             SELECT
-                COUNT(*) AS total_feedback_given,
-                AVG(rating) AS average_rating,
-                MIN(rating) AS min_rating,
-                MAX(rating) AS max_rating
-            FROM
-                Feedback
-            WHERE
-                student_id = %s
-        """, (student_id,), fetch=True)
+                COALESCE(H.feedback_count, 0) + COALESCE(S.feedback_count, 0) AS total_feedback_given,
+                CASE
+                    WHEN COALESCE(H.feedback_count, 0) + COALESCE(S.feedback_count, 0) > 0
+                    THEN (COALESCE(H.rating_sum, 0) + COALESCE(S.rating_sum, 0)) * 1.0
+                         / (COALESCE(H.feedback_count, 0) + COALESCE(S.feedback_count, 0))
+                END AS average_rating,
+                CASE WHEN S.min_rating IS NULL OR H.min_rating < S.min_rating
+                     THEN H.min_rating ELSE S.min_rating END AS min_rating,
+                CASE WHEN S.max_rating IS NULL OR H.max_rating > S.max_rating
+                     THEN H.max_rating ELSE S.max_rating END AS max_rating
+            FROM (
+                SELECT
+                    COUNT(*) AS feedback_count,
+                    SUM(rating) AS rating_sum,
+                    MIN(rating) AS min_rating,
+                    MAX(rating) AS max_rating
+                FROM
+                    Feedback
+                WHERE
+                    student_id = %s
+            ) H
+            LEFT JOIN
+                StudentSummary S ON S.student_id = %s
+        """, (student_id, student_id), fetch=True, shard=shard)
         
-        # Get detailed event participation
+        # Get detailed event participation (archived events included)
         event_details = execute_query("""
             SELECT
                 E.name AS event_name,
@@ -678,81 +2620,377 @@ def get_student_analysis_report(student_id):
                 Feedback F ON R.student_id = F.student_id AND R.event_id = F.event_id
             WHERE
                 R.student_id = %s
+            UNION ALL
+            SELECT
+                E.name AS event_name,
+                E.type AS event_type,
+                E.date AS event_date,
+                R.registration_date,
+                A.status AS attendance_status,
+                F.rating AS feedback_rating,
+                F.feedback_text,
+                F.feedback_date
+            FROM
+                RegistrationsArchive R
+            JOIN
+                Events E ON R.event_id = E.event_id
+            LEFT JOIN
+                AttendanceArchive A ON R.student_id = A.student_id AND R.event_id = A.event_id
+            LEFT JOIN
+                FeedbackArchive F ON R.student_id = F.student_id AND R.event_id = F.event_id
+            WHERE
+                R.student_id = %s
             ORDER BY
-                E.date DESC
-        """, (student_id,), fetch=True)
+                event_date DESC
+        """, (student_id, student_id), fetch=True, shard=shard)
         
-        return jsonify({
+        return {
             'student_info': student_info[0] if student_info else None,
             'attendance_summary': attendance_summary[0] if attendance_summary else None,
             'feedback_summary': feedback_summary[0] if feedback_summary else None,
             'event_details': event_details
-        })
+        }
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Student Participation Report
-@app.route('/reports/student_participation/<int:student_id>', methods=['GET'])
-def get_student_participation_report(student_id):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("""
+# Batch student analysis: the same report for many students, computed with
+# a few set-based queries per chunk of IDs instead of four per student
+STUDENT_BATCH_MAX = 5000
+STUDENT_BATCH_CHUNK = 500
+
+STUDENT_BATCH_SUMMARY_SQL = """
+    SELECT
+        T.student_id,
+        T.registered AS total_events_registered,
+        T.present AS events_attended,
+        T.absent AS events_absent,
+        CASE
+            WHEN T.registered > 0
+            THEN T.present * 100.0 / T.registered
+            ELSE 0
+        END AS attendance_percentage,
+        T.feedback_count AS total_feedback_given,
+        CASE
+            WHEN T.feedback_count > 0
+            THEN T.rating_sum * 1.0 / T.feedback_count
+        END AS average_rating,
+        T.min_rating,
+        T.max_rating
+    FROM (
         SELECT
-            S.name AS student_name,
-            S.email,
-            GROUP_CONCAT(E.name) AS events_attended
+            S.student_id,
+            COALESCE(H.registered, 0) + COALESCE(SS.registered, 0) AS registered,
+            COALESCE(H.present, 0) + COALESCE(SS.present, 0) AS present,
+            COALESCE(H.absent, 0) + COALESCE(SS.absent, 0) AS absent,
+            COALESCE(F.feedback_count, 0) + COALESCE(SS.feedback_count, 0) AS feedback_count,
+            COALESCE(F.rating_sum, 0) + COALESCE(SS.rating_sum, 0) AS rating_sum,
+            CASE WHEN SS.min_rating IS NULL OR F.min_rating < SS.min_rating
+                 THEN F.min_rating ELSE SS.min_rating END AS min_rating,
+            CASE WHEN SS.max_rating IS NULL OR F.max_rating > SS.max_rating
+                 THEN F.max_rating ELSE SS.max_rating END AS max_rating
         FROM
             Students S
-        JOIN
-            Attendance A ON S.student_id = A.student_id
-        JOIN
-            Events E ON A.event_id = E.event_id
+        LEFT JOIN (
+            SELECT
+                R.student_id,
+                COUNT(*) AS registered,
+                SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS present,
+                SUM(CASE WHEN A.status = 'absent' THEN 1 ELSE 0 END) AS absent
+            FROM Registrations R
+            LEFT JOIN Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
+            WHERE R.student_id IN ({ids})
+            GROUP BY R.student_id
+        ) H ON H.student_id = S.student_id
+        LEFT JOIN (
+            SELECT student_id, COUNT(*) AS feedback_count, SUM(rating) AS rating_sum,
+                   MIN(rating) AS min_rating, MAX(rating) AS max_rating
+            FROM Feedback
+            WHERE student_id IN ({ids})
+            GROUP BY student_id
+        ) F ON F.student_id = S.student_id
+        LEFT JOIN
+            StudentSummary SS ON SS.student_id = S.student_id
         WHERE
-            A.status = 'present' AND S.student_id = ?
-        GROUP BY
-            S.student_id, S.name, S.email
-        ORDER BY
-            S.name;
-    """, (student_id,))
-    report = cursor.fetchone()
-    if report:
-        return jsonify(dict(report))
-    return jsonify({'message': 'No participation found for this student'}), 404
+            S.student_id IN ({ids})
+    ) T
+"""
+
+STUDENT_BATCH_DETAILS_SQL = """
+    SELECT
+        R.student_id,
+        E.name AS event_name,
+        E.type AS event_type,
+        E.date AS event_date,
+        R.registration_date,
+        A.status AS attendance_status,
+        F.rating AS feedback_rating,
+        F.feedback_text,
+        F.feedback_date
+    FROM
+        Registrations R
+    JOIN
+        Events E ON R.event_id = E.event_id
+    LEFT JOIN
+        Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
+    LEFT JOIN
+        Feedback F ON R.student_id = F.student_id AND R.event_id = F.event_id
+    WHERE
+        R.student_id IN ({ids})
+    UNION ALL
+    SELECT
+        R.student_id,
+        E.name AS event_name,
+        E.type AS event_type,
+        E.date AS event_date,
+        R.registration_date,
+        A.status AS attendance_status,
+        F.rating AS feedback_rating,
+        F.feedback_text,
+        F.feedback_date
+    FROM
+        RegistrationsArchive R
+    JOIN
+        Events E ON R.event_id = E.event_id
+    LEFT JOIN
+        AttendanceArchive A ON R.student_id = A.student_id AND R.event_id = A.event_id
+    LEFT JOIN
+        FeedbackArchive F ON R.student_id = F.student_id AND R.event_id = F.event_id
+    WHERE
+        R.student_id IN ({ids})
+    ORDER BY
+        event_date DESC
+"""
+
+def student_analysis_chunk(student_ids, shard):
+    """Yield (student_id, report or None) for one chunk of IDs on one shard"""
+    marks = ', '.join(['%s'] * len(student_ids))
+    ids = tuple(student_ids)
+    students = {row['student_id']: row for row in execute_query(
+        f"SELECT student_id, name, email, college_id FROM Students WHERE student_id IN ({marks})",
+        ids, fetch=True, shard=shard
+    )}
+    summaries = {row.pop('student_id'): row for row in execute_query(
+        STUDENT_BATCH_SUMMARY_SQL.format(ids=marks), ids * 3, fetch=True, shard=shard
+    )}
+    details = {}
+    for row in execute_query(STUDENT_BATCH_DETAILS_SQL.format(ids=marks), ids * 2, fetch=True, shard=shard):
+        details.setdefault(row.pop('student_id'), []).append(row)
+
+    for student_id in student_ids:
+        if student_id not in students:
+            yield student_id, None
+            continue
+        summary = summaries[student_id]
+        yield student_id, {
+            'student_info': students[student_id],
+            'attendance_summary': {k: summary[k] for k in (
+                'total_events_registered', 'events_attended', 'events_absent', 'attendance_percentage')},
+            'feedback_summary': {k: summary[k] for k in (
+                'total_feedback_given', 'average_rating', 'min_rating', 'max_rating')},
+            'event_details': details.get(student_id, []),
+        }
+
+@app.route('/reports/student_analysis/batch', methods=['POST'])
+def get_student_analysis_batch():
+    """
+    Student analysis for up to STUDENT_BATCH_MAX students, streamed as
+    newline-delimited JSON: one {"student_id", "report"} line per student
+    (or {"student_id", "error"} if unknown), grouped by shard.
+    """
+    data = request.get_json(silent=True) or {}
+    student_ids = data.get('student_ids')
+    if not isinstance(student_ids, list) or not all(isinstance(i, int) for i in student_ids):
+        return jsonify({'error': 'student_ids must be a list of integers'}), 400
+    student_ids = list(dict.fromkeys(student_ids))
+    if len(student_ids) > STUDENT_BATCH_MAX:
+        return jsonify({'error': f'At most {STUDENT_BATCH_MAX} student_ids per request'}), 400
+
+    by_shard = {}
+    for student_id in student_ids:
+        by_shard.setdefault(shard_router.for_id(student_id), []).append(student_id)
+
+    def generate():
+        try:
+            for shard, ids in by_shard.items():
+                for start in range(0, len(ids), STUDENT_BATCH_CHUNK):
+                    renew_deadline()
+                    for student_id, report in student_analysis_chunk(ids[start:start + STUDENT_BATCH_CHUNK], shard):
+                        line = {'student_id': student_id, 'report': report} if report is not None \
+                            else {'student_id': student_id, 'error': 'Student not found'}
+                        yield app.json.dumps(line, separators=(',', ':')) + '\n'
+        except Exception as e:
+            yield app.json.dumps({'error': str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Student Participation Report
+@app.route('/reports/student_participation/<int:student_id>', methods=['GET'])
+def get_student_participation_report(student_id):
+    try:
+        # Hot and archived attendance (archive.py), each event once
+        rows = execute_query("""
+            SELECT
+                S.name AS student_name,
+                S.email,
+                GROUP_CONCAT(E.name) AS events_attended
+            FROM (
+                SELECT event_id FROM Attendance WHERE student_id = %s AND status = 'present'
+                UNION
+                SELECT event_id FROM AttendanceArchive WHERE student_id = %s AND status = 'present'
+            ) A
+            JOIN
+                Events E ON A.event_id = E.event_id
+            JOIN
+                Students S ON S.student_id = %s
+            GROUP BY
+                S.student_id, S.name, S.email
+        """, (student_id, student_id, student_id), fetch=True, shard=shard_router.for_id(student_id))
+        if rows:
+            return jsonify(rows[0])
+        return jsonify({'message': 'No participation found for this student'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 # Top 3 most active students
-@app.route('/reports/top_students', methods=['GET'])
-def get_top_students_report():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("""
+def top_students_report():
+    # Each shard returns its own top 3; the global top 3 is among them
+    return query_all_shards("""
         SELECT
             S.name AS student_name,
             S.email,
-            COUNT(A.attendance_id) AS events_attended_count
+            COALESCE(A.attended, 0) + COALESCE(SS.present_total, 0) AS events_attended_count
         FROM
             Students S
-        JOIN
-            Attendance A ON S.student_id = A.student_id
+        LEFT JOIN (
+            SELECT student_id, COUNT(*) AS attended
+            FROM Attendance
+            WHERE status = 'present'
+            GROUP BY student_id
+        ) A ON S.student_id = A.student_id
+        LEFT JOIN
+            StudentSummary SS ON S.student_id = SS.student_id
         WHERE
-            A.status = 'present'
-        GROUP BY
-            S.student_id, S.name, S.email
+            COALESCE(A.attended, 0) + COALESCE(SS.present_total, 0) > 0
         ORDER BY
             events_attended_count DESC
         LIMIT 3;
-    """)
-    report = cursor.fetchall()
-    # Convert tuples to dictionaries with proper column names
-    columns = [desc[0] for desc in cursor.description]
-    result = [dict(zip(columns, row)) for row in report]
-    return jsonify(result)
+    """, key='events_attended_count', reverse=True, limit=3)
+
+# Parameterless reports are served from snapshots (see snapshots.py)
+SNAPSHOT_REPORTS = {
+    'registrations': registrations_report,
+    'attendance': attendance_report,
+    'feedback': feedback_report,
+    'event_analysis': event_analysis_report,
+    'top_students': top_students_report,
+}
+
+def snapshot_data_version():
+    """ChangeLog position of every shard; moves whenever report data changes"""
+    return '.'.join(
+        str(execute_query("SELECT MAX(seq) AS seq FROM ChangeLog", fetch=True, shard=shard)[0]['seq'] or 0)
+        for shard in shard_router.shards
+    )
+
+def build_snapshot(name, data_version):
+    """Compute a report and store it. Returns (header, JSON payload)."""
+    payload = app.json.dumps(SNAPSHOT_REPORTS[name](), separators=(',', ':')).encode()
+    return snapshot_store.write(name, payload, data_version), payload
+
+def refresh_snapshots(force=False):
+    """
+    Rebuild snapshots whose data changed or that are older than
+    SNAPSHOT_MAX_AGE. Returns {name: header} for the ones rebuilt.
+    """
+    rebuilt = {}
+    with app.app_context():
+        data_version = snapshot_data_version()
+        for name in SNAPSHOT_REPORTS:
+            header = snapshot_store.header(name)
+            if (force or header is None or header['data_version'] != data_version
+                    or time.time() - header['generated_at'] > SNAPSHOT_MAX_AGE):
+                rebuilt[name] = build_snapshot(name, data_version)[0]
+    return rebuilt
+
+snapshot_store = None
+snapshot_scheduler = None
+if SNAPSHOT_SCHEDULER != 'off':
+    snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+    if SNAPSHOT_SCHEDULER == 'thread':
+        snapshot_scheduler = SnapshotScheduler(SNAPSHOT_DIR, refresh_snapshots, SNAPSHOT_INTERVAL)
+
+def report_response(name):
+    """
+    Serve a report from its snapshot: the gzip body goes out as-is (sendfile
+    under gunicorn) with a weak ETag. ?fresh=1 recomputes it first; so does
+    a missing snapshot, one the scheduler has stopped refreshing, or one
+    built before the latest ChangeLog entry (a write the scheduler has not
+    caught up with yet), so a report never lags a write that returned.
+    """
+    if snapshot_store is None:
+        return jsonify(SNAPSHOT_REPORTS[name]())
+
+    data_version = snapshot_data_version()
+    opened = None if request.args.get('fresh') == '1' else snapshot_store.open(name)
+    if opened is not None and (opened[0]['data_version'] != data_version or
+                               time.time() - opened[0]['generated_at'] > SNAPSHOT_MAX_AGE + 2 * SNAPSHOT_INTERVAL):
+        opened[1].close()
+        opened = None
+
+    if opened is None:
+        header, payload = build_snapshot(name, data_version)
+        response = Response(payload, mimetype='application/json')
+    else:
+        header, body = opened
+        if request.if_none_match.contains_weak(header['etag']):
+            body.close()
+            response = Response(status=304)
+        elif request.accept_encodings['gzip']:
+            response = Response(wrap_file(request.environ, body), mimetype='application/json',
+                                direct_passthrough=True)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.content_length = header['length']
+        else:
+            with body:
+                payload = gzip.decompress(body.read())
+            response = Response(payload, mimetype='application/json')
+
+    response.set_etag(header['etag'], weak=True)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Snapshot-Generated-At'] = f"{header['generated_at']:.3f}"
+    return response
+
+@app.route('/reports/registrations', methods=['GET'])
+def get_registrations_report():
+    try:
+        return report_response('registrations')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/reports/attendance', methods=['GET'])
+def get_attendance_report():
+    return report_response('attendance')
+
+@app.route('/reports/feedback', methods=['GET'])
+def get_feedback_report():
+    return report_response('feedback')
+
+@app.route('/reports/event_analysis', methods=['GET'])
+def get_event_analysis_report():
+    try:
+        return report_response('event_analysis')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/reports/top_students', methods=['GET'])
+def get_top_students_report():
+    return report_response('top_students')
 
 # Filter events by type
 @app.route('/reports/events_by_type/<string:event_type>', methods=['GET'])
 def get_events_by_type_report(event_type):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("""
+    report = query_all_shards("""
         SELECT
             E.name AS event_name,
             E.type,
@@ -760,12 +2998,11 @@ def get_events_by_type_report(event_type):
         FROM
             Events E
         WHERE
-            E.type = ?
+            E.type = %s
         ORDER BY
             E.date;
-    """, (event_type,))
-    report = cursor.fetchall()
-    return jsonify([dict(row) for row in report])
+    """, (event_type,), key='date')
+    return jsonify(report)
 
 # Staff Endpoints
 
@@ -773,23 +3010,23 @@ def get_events_by_type_report(event_type):
 @app.route('/staff/registrations/<int:event_id>', methods=['GET'])
 def get_event_registrations(event_id):
     try:
-        db = get_db()
+        shard = shard_router.for_id(event_id)
         if USE_MYSQL:
             registrations = execute_query("""
-                SELECT r.registration_id, s.student_id, s.name, s.email, s.college_id, r.registration_date
+                SELECT r.reg_id AS registration_id, s.student_id, s.name, s.email, s.college_id, r.registration_date
                 FROM Registrations r
                 JOIN Students s ON r.student_id = s.student_id
                 WHERE r.event_id = %s
                 ORDER BY r.registration_date
-            """, (event_id,), fetch=True)
+            """, (event_id,), fetch=True, shard=shard)
         else:
             registrations = execute_query("""
-                SELECT r.registration_id, s.student_id, s.name, s.email, s.college_id, r.registration_date
+                SELECT r.reg_id AS registration_id, s.student_id, s.name, s.email, s.college_id, r.registration_date
                 FROM Registrations r
                 JOIN Students s ON r.student_id = s.student_id
                 WHERE r.event_id = ?
                 ORDER BY r.registration_date
-            """, (event_id,), fetch=True)
+            """, (event_id,), fetch=True, shard=shard)
         return jsonify(registrations)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -799,21 +3036,23 @@ def get_event_registrations(event_id):
 def get_events_with_registrations():
     try:
         if USE_MYSQL:
-            events = execute_query("""
-                SELECT e.*, COUNT(r.registration_id) as registration_count
+            events = query_all_shards("""
+                SELECT e.*, COUNT(r.reg_id) + COALESCE(MAX(es.registered), 0) as registration_count
                 FROM Events e
                 LEFT JOIN Registrations r ON e.event_id = r.event_id
+                LEFT JOIN EventSummary es ON e.event_id = es.event_id
                 GROUP BY e.event_id
                 ORDER BY e.date
-            """, fetch=True)
+            """, key='date')
         else:
-            events = execute_query("""
-                SELECT e.*, COUNT(r.registration_id) as registration_count
+            events = query_all_shards("""
+                SELECT e.*, COUNT(r.reg_id) + COALESCE(MAX(es.registered), 0) as registration_count
                 FROM Events e
                 LEFT JOIN Registrations r ON e.event_id = r.event_id
+                LEFT JOIN EventSummary es ON e.event_id = es.event_id
                 GROUP BY e.event_id
                 ORDER BY e.date
-            """, fetch=True)
+            """, key='date')
         return jsonify(events)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -823,12 +3062,12 @@ def get_events_with_registrations():
 def get_student_attendance():
     try:
         # Get all attendance records with event details
-        attendance_records = execute_query("""
+        attendance_records = query_all_shards("""
             SELECT a.*, e.name as event_name, e.type as event_type, e.date as event_date
             FROM Attendance a
             JOIN Events e ON a.event_id = e.event_id
             ORDER BY a.attendance_date DESC
-        """, fetch=True)
+        """, key='attendance_date', reverse=True)
         return jsonify(attendance_records)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -845,47 +3084,7 @@ def mark_attendance_staff():
         return jsonify({'error': 'Missing data'}), 400
 
     try:
-        db = get_db()
-        cursor = db.cursor()
-        # Check if attendance record already exists
-        if USE_MYSQL:
-            existing_attendance = execute_query(
-                "SELECT attendance_id FROM Attendance WHERE student_id = %s AND event_id = %s",
-                (student_id, event_id),
-                fetch=True
-            )
-            
-            if existing_attendance:
-                # Update existing record
-                execute_query(
-                    "UPDATE Attendance SET status = %s WHERE student_id = %s AND event_id = %s",
-                    (status, student_id, event_id)
-                )
-            else:
-                # Insert new record
-                execute_query(
-                    "INSERT INTO Attendance (student_id, event_id, status) VALUES (%s, %s, %s)",
-                    (student_id, event_id, status)
-                )
-        else:
-            existing_attendance = execute_query(
-                "SELECT attendance_id FROM Attendance WHERE student_id = ? AND event_id = ?",
-                (student_id, event_id),
-                fetch=True
-            )
-            
-            if existing_attendance:
-                # Update existing record
-                execute_query(
-                    "UPDATE Attendance SET status = ? WHERE student_id = ? AND event_id = ?",
-                    (status, student_id, event_id)
-                )
-            else:
-                # Insert new record
-                execute_query(
-                    "INSERT INTO Attendance (student_id, event_id, status) VALUES (?, ?, ?)",
-                    (student_id, event_id, status)
-                )
+        upsert_attendance(student_id, event_id, status, shard=shard_router.for_id(event_id))
         return jsonify({'message': 'Attendance marked successfully'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -894,7 +3093,7 @@ def mark_attendance_staff():
 @app.route('/staff/attendance/<int:event_id>', methods=['GET'])
 def get_event_attendance(event_id):
     try:
-        db = get_db()
+        shard = shard_router.for_id(event_id)
         if USE_MYSQL:
             attendance = execute_query("""
                 SELECT a.*, s.name, s.email, s.college_id
@@ -902,7 +3101,7 @@ def get_event_attendance(event_id):
                 JOIN Students s ON a.student_id = s.student_id
                 WHERE a.event_id = %s
                 ORDER BY a.attendance_date
-            """, (event_id,), fetch=True)
+            """, (event_id,), fetch=True, shard=shard)
         else:
             attendance = execute_query("""
                 SELECT a.*, s.name, s.email, s.college_id
@@ -910,30 +3109,120 @@ def get_event_attendance(event_id):
                 JOIN Students s ON a.student_id = s.student_id
                 WHERE a.event_id = ?
                 ORDER BY a.attendance_date
-            """, (event_id,), fetch=True)
+            """, (event_id,), fetch=True, shard=shard)
         return jsonify(attendance)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Event roster: every registrant with attendance status and feedback flag.
+# One LEFT JOIN walks idx_registrations_event_date and probes the
+# (student_id, event_id) unique keys, so a page costs one index range scan.
+ROSTER_PAGE_DEFAULT = 200
+ROSTER_PAGE_MAX = 1000
+
+ROSTER_SQL = """
+    SELECT
+        R.reg_id AS reg_id, R.student_id AS student_id, S.name AS name, S.email AS email,
+        S.college_id AS college_id, R.registration_date AS registration_date,
+        A.status AS attendance_status, A.attendance_date AS attendance_date,
+        CASE WHEN F.feedback_id IS NULL THEN 0 ELSE 1 END AS has_feedback
+    FROM Registrations R
+    JOIN Students S ON R.student_id = S.student_id
+    LEFT JOIN Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
+    LEFT JOIN Feedback F ON R.student_id = F.student_id AND R.event_id = F.event_id
+    WHERE R.event_id = %s {after}
+    ORDER BY R.registration_date, R.reg_id
+    LIMIT %s
+"""
+
+def roster_page(event_id, after_values, limit, shard):
+    """Up to `limit` registrants after the keyset (registration_date, reg_id)"""
+    after, after_params = '', ()
+    if after_values is not None:
+        after = "AND (R.registration_date > %s OR (R.registration_date = %s AND R.reg_id > %s))"
+        after_params = (after_values[0], after_values[0], after_values[1])
+    rows = execute_query(ROSTER_SQL.format(after=after), (event_id, *after_params, limit),
+                         fetch=True, shard=shard)
+    for row in rows:
+        row['has_feedback'] = bool(row['has_feedback'])
+    return rows
+
+@app.route('/events/<int:event_id>/roster', methods=['GET'])
+def get_event_roster(event_id):
+    """
+    Event header plus registrants, keyset-paginated (limit, cursor). With
+    ?stream=1 (or Accept: application/x-ndjson) the whole roster is sent as
+    newline-delimited JSON instead: the event line, then one line per
+    registrant. The ETag follows the event's latest ChangeLog entry.
+    """
+    stream = request.args.get('stream') == '1' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+    limit = min(max(request.args.get('limit', ROSTER_PAGE_DEFAULT, type=int), 1), ROSTER_PAGE_MAX)
+    cursor = request.args.get('cursor')
+    try:
+        after_values = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    shard = shard_router.for_id(event_id)
+    try:
+        version = execute_query(
+            "SELECT MAX(seq) AS seq FROM ChangeLog WHERE event_id = %s", (event_id,), fetch=True, shard=shard
+        )[0]['seq'] or 0
+        etag = f"{request.path}:{version}:{'s' if stream else ''}{zlib.crc32(request.query_string):08x}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        events = execute_query(
+            "SELECT event_id, college_id, name, type, date, capacity, seats_taken FROM Events WHERE event_id = %s",
+            (event_id,), fetch=True, shard=shard
+        )
+        if not events:
+            return jsonify({'error': 'Event not found'}), 404
+
+        if stream:
+            def generate():
+                yield app.json.dumps({'event': events[0]}, separators=(',', ':')) + '\n'
+                after = after_values
+                try:
+                    while True:
+                        renew_deadline()
+                        rows = roster_page(event_id, after, ROSTER_PAGE_MAX, shard)
+                        for row in rows:
+                            yield app.json.dumps(row, separators=(',', ':')) + '\n'
+                        if len(rows) < ROSTER_PAGE_MAX:
+                            return
+                        after = [str(rows[-1]['registration_date']), rows[-1]['reg_id']]
+                except Exception as e:
+                    yield app.json.dumps({'error': str(e)}) + '\n'
+            response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        else:
+            rows = roster_page(event_id, after_values, limit + 1, shard)
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor([str(rows[-1]['registration_date']), rows[-1]['reg_id']])
+            response = jsonify({'event': events[0], 'registrants': rows, 'next_cursor': next_cursor})
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Delete Event
 @app.route('/events/<int:event_id>', methods=['DELETE'])
 def delete_event(event_id):
+    shard = shard_router.for_id(event_id)
     try:
-        # Check if event exists
-        if USE_MYSQL:
-            events = execute_query("SELECT * FROM Events WHERE event_id = %s", (event_id,), fetch=True)
-        else:
-            events = execute_query("SELECT * FROM Events WHERE event_id = ?", (event_id,), fetch=True)
-        
-        if not events:
+        # The event row goes first, then its registrations, attendance,
+        # feedback, waitlist and archived rows in batches (see deletion.py)
+        deleted, counts = delete_events(bounded_db(get_db(shard)), [event_id], USE_MYSQL, DELETE_BATCH_SIZE)
+        if not deleted:
             return jsonify({'error': 'Event not found'}), 404
-        
-        # Delete the event (cascade will handle related records)
-        if USE_MYSQL:
-            execute_query("DELETE FROM Events WHERE event_id = %s", (event_id,))
-        else:
-            execute_query("DELETE FROM Events WHERE event_id = ?", (event_id,))
-        return jsonify({'message': 'Event deleted successfully'}), 200
+        return jsonify({'message': 'Event deleted successfully', 'deleted': counts}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -941,13 +3230,13 @@ def delete_event(event_id):
 @app.route('/registrations', methods=['GET'])
 def get_registrations():
     try:
-        registrations = execute_query("""
+        registrations = query_all_shards("""
             SELECT r.*, e.name, e.type, e.date, e.college_id, s.name as student_name, s.email
             FROM Registrations r
             JOIN Events e ON r.event_id = e.event_id
             JOIN Students s ON r.student_id = s.student_id
             ORDER BY r.registration_date DESC
-        """, fetch=True)
+        """, key='registration_date', reverse=True)
         return jsonify(registrations)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1005,14 +3294,14 @@ def get_student_feedback():
 @app.route('/staff/feedback', methods=['GET'])
 def get_staff_feedback():
     try:
-        feedback = execute_query("""
+        feedback = query_all_shards("""
             SELECT f.*, e.name as event_name, e.type as event_type, e.date as event_date,
                    s.name as student_name, s.email as student_email
             FROM Feedback f
             JOIN Events e ON f.event_id = e.event_id
             JOIN Students s ON f.student_id = s.student_id
             ORDER BY f.feedback_date DESC
-        """, fetch=True)
+        """, key='feedback_date', reverse=True)
         return jsonify(feedback)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
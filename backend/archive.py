@@ -0,0 +1,330 @@
+"""
+Hot/cold partitioning of Registrations, Attendance and Feedback.
+
+The archive job moves every row belonging to events dated before a cutoff
+into *Archive tables and folds them into two summary tables:
+
+    EventSummary    one row per archived event
+    StudentSummary  one row per student with archived activity
+
+Report endpoints add the summaries to aggregates over the (now small) hot
+tables, so totals stay exact while current-term queries only touch hot rows.
+Summaries are additive: rows that arrive for an already-archived event are
+picked up by the next run. Attendance recorded after its registration was
+archived is folded as that registration's present/absent, and a hot
+Attendance or Feedback row for a student and event that already have an
+archived one replaces it (the archived row is taken back out of the
+summaries and dropped), so re-marked attendance is not counted twice.
+
+Usage (runs against every shard):
+
+    python archive.py --before 2025-06-01
+    python archive.py --older-than-days 180 --batch-size 50
+"""
+import argparse
+from datetime import date, timedelta
+
+ARCHIVED_TABLES = ('Registrations', 'Attendance', 'Feedback')
+
+EVENT_SUMMARY_COLUMNS = ('registered', 'present', 'absent', 'feedback_count', 'rating_sum')
+STUDENT_SUMMARY_COLUMNS = ('registered', 'present', 'absent', 'present_total', 'feedback_count', 'rating_sum')
+
+
+def create_archive_schema(cursor):
+    """Archive copies of the activity tables plus the summary tables"""
+    for table in ARCHIVED_TABLES:
+        # Same columns as the hot table, no constraints
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}Archive AS SELECT * FROM {table} WHERE 1 = 0")
+
+    # registered/present/absent count registrations (and their attendance);
+    # present_total counts every 'present' row, which top_students uses
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS EventSummary (
+            event_id INTEGER PRIMARY KEY,
+            registered INTEGER NOT NULL DEFAULT 0,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            feedback_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            min_rating INTEGER,
+            max_rating INTEGER
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS StudentSummary (
+            student_id INTEGER PRIMARY KEY,
+            registered INTEGER NOT NULL DEFAULT 0,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            present_total INTEGER NOT NULL DEFAULT 0,
+            feedback_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            min_rating INTEGER,
+            max_rating INTEGER
+        )
+    """)
+
+
+def _sql(query, use_mysql):
+    return query if use_mysql else query.replace('%s', '?')
+
+
+def _merge(totals, key, values):
+    """Add one aggregate row into totals[key]"""
+    entry = totals.setdefault(key, {'min_rating': None, 'max_rating': None})
+    for column, value in values.items():
+        if column == 'min_rating':
+            if value is not None and (entry['min_rating'] is None or value < entry['min_rating']):
+                entry['min_rating'] = value
+        elif column == 'max_rating':
+            if value is not None and (entry['max_rating'] is None or value > entry['max_rating']):
+                entry['max_rating'] = value
+        else:
+            entry[column] = entry.get(column, 0) + int(value or 0)
+
+
+def _upsert_summary(cursor, table, key_column, key, entry, columns, use_mysql):
+    """Add entry onto an existing summary row, or insert it"""
+    increments = ', '.join(f"{c} = {c} + %s" for c in columns)
+    cursor.execute(_sql(f"""
+        UPDATE {table} SET {increments},
+            min_rating = CASE WHEN min_rating IS NULL OR %s < min_rating THEN COALESCE(%s, min_rating) ELSE min_rating END,
+            max_rating = CASE WHEN max_rating IS NULL OR %s > max_rating THEN COALESCE(%s, max_rating) ELSE max_rating END
+        WHERE {key_column} = %s
+    """, use_mysql), tuple(entry.get(c, 0) for c in columns) + (
+        entry['min_rating'], entry['min_rating'], entry['max_rating'], entry['max_rating'], key))
+    if cursor.rowcount == 0:
+        all_columns = (key_column,) + tuple(columns) + ('min_rating', 'max_rating')
+        cursor.execute(_sql(
+            f"INSERT INTO {table} ({', '.join(all_columns)}) VALUES ({', '.join(['%s'] * len(all_columns))})",
+            use_mysql
+        ), (key,) + tuple(entry.get(c, 0) for c in columns) + (entry['min_rating'], entry['max_rating']))
+
+
+def archive_batch(cursor, event_ids, use_mysql):
+    """Summarize, copy and delete the hot rows of a batch of events (one transaction)"""
+    marks = ', '.join(['%s'] * len(event_ids))
+    ids = tuple(event_ids)
+    event_totals = {}
+    student_totals = {}
+
+    def fetch(query):
+        cursor.execute(_sql(query, use_mysql), ids)
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    registration_query = f"""
+        SELECT R.{{key}} AS k,
+            COUNT(*) AS registered,
+            SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS present,
+            SUM(CASE WHEN A.status = 'absent' THEN 1 ELSE 0 END) AS absent
+        FROM Registrations R
+        LEFT JOIN Attendance A ON R.student_id = A.student_id AND R.event_id = A.event_id
+        WHERE R.event_id IN ({marks})
+        GROUP BY R.{{key}}
+    """
+    feedback_query = f"""
+        SELECT {{key}} AS k, COUNT(*) AS feedback_count, SUM(rating) AS rating_sum,
+            MIN(rating) AS min_rating, MAX(rating) AS max_rating
+        FROM Feedback
+        WHERE event_id IN ({marks})
+        GROUP BY {{key}}
+    """
+
+    # Attendance whose registration an earlier run archived
+    orphan_attendance_query = f"""
+        SELECT A.{{key}} AS k,
+            SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS present,
+            SUM(CASE WHEN A.status = 'absent' THEN 1 ELSE 0 END) AS absent
+        FROM Attendance A
+        WHERE A.event_id IN ({marks})
+            AND EXISTS (SELECT 1 FROM RegistrationsArchive R
+                        WHERE R.student_id = A.student_id AND R.event_id = A.event_id)
+            AND NOT EXISTS (SELECT 1 FROM Registrations R
+                            WHERE R.student_id = A.student_id AND R.event_id = A.event_id)
+        GROUP BY A.{{key}}
+    """
+    # Archived rows superseded by a hot row for the same student and event,
+    # taken back out with negative counts (min/max ratings stay as they were)
+    superseded_attendance_query = f"""
+        SELECT X.{{key}} AS k,
+            -SUM(CASE WHEN X.status = 'present' AND EXISTS (
+                SELECT 1 FROM RegistrationsArchive R WHERE R.student_id = X.student_id AND R.event_id = X.event_id
+            ) THEN 1 ELSE 0 END) AS present,
+            -SUM(CASE WHEN X.status = 'absent' AND EXISTS (
+                SELECT 1 FROM RegistrationsArchive R WHERE R.student_id = X.student_id AND R.event_id = X.event_id
+            ) THEN 1 ELSE 0 END) AS absent,
+            -SUM(CASE WHEN X.status = 'present' THEN 1 ELSE 0 END) AS present_total
+        FROM AttendanceArchive X
+        JOIN Attendance A ON A.student_id = X.student_id AND A.event_id = X.event_id
+        WHERE X.event_id IN ({marks})
+        GROUP BY X.{{key}}
+    """
+    superseded_feedback_query = f"""
+        SELECT X.{{key}} AS k, -COUNT(*) AS feedback_count, -SUM(X.rating) AS rating_sum
+        FROM FeedbackArchive X
+        JOIN Feedback F ON F.student_id = X.student_id AND F.event_id = X.event_id
+        WHERE X.event_id IN ({marks})
+        GROUP BY X.{{key}}
+    """
+
+    for key, totals in (('event_id', event_totals), ('student_id', student_totals)):
+        for query in (registration_query, orphan_attendance_query,
+                      superseded_attendance_query, superseded_feedback_query):
+            for row in fetch(query.format(key=key)):
+                _merge(totals, row.pop('k'), row)
+    for row in fetch(feedback_query.format(key='event_id')):
+        _merge(event_totals, row.pop('k'), row)
+
+    for row in fetch(f"""
+        SELECT student_id AS k, COUNT(*) AS present_total
+        FROM Attendance
+        WHERE status = 'present' AND event_id IN ({marks})
+        GROUP BY student_id
+    """):
+        _merge(student_totals, row.pop('k'), row)
+    for row in fetch(feedback_query.format(key='student_id')):
+        _merge(student_totals, row.pop('k'), row)
+
+    for event_id, entry in event_totals.items():
+        _upsert_summary(cursor, 'EventSummary', 'event_id', event_id, entry, EVENT_SUMMARY_COLUMNS, use_mysql)
+    for student_id, entry in student_totals.items():
+        _upsert_summary(cursor, 'StudentSummary', 'student_id', student_id, entry, STUDENT_SUMMARY_COLUMNS, use_mysql)
+
+    for table, hot in (('AttendanceArchive', 'Attendance'), ('FeedbackArchive', 'Feedback')):
+        cursor.execute(_sql(f"""
+            DELETE FROM {table} WHERE event_id IN ({marks}) AND EXISTS (
+                SELECT 1 FROM {hot} H WHERE H.student_id = {table}.student_id AND H.event_id = {table}.event_id
+            )
+        """, use_mysql), ids)
+
+    moved = {}
+    for table in ARCHIVED_TABLES:
+        cursor.execute(_sql(f"INSERT INTO {table}Archive SELECT * FROM {table} WHERE event_id IN ({marks})", use_mysql), ids)
+        cursor.execute(_sql(f"DELETE FROM {table} WHERE event_id IN ({marks})", use_mysql), ids)
+        moved[table] = cursor.rowcount
+    return moved
+
+
+def purge_archived(cursor, event_ids, use_mysql, limit):
+    """
+    Delete the archived rows of up to `limit` students for deleted events,
+    taking them back out of StudentSummary in the same transaction, so the
+    totals stay exact however often a purge is interrupted. min_rating /
+    max_rating are left as they were. Returns the rows deleted (0: done).
+    """
+    marks = ', '.join(['%s'] * len(event_ids))
+    ids = tuple(event_ids)
+    cursor.execute(_sql(f"""
+        SELECT student_id FROM RegistrationsArchive WHERE event_id IN ({marks})
+        UNION SELECT student_id FROM AttendanceArchive WHERE event_id IN ({marks})
+        UNION SELECT student_id FROM FeedbackArchive WHERE event_id IN ({marks})
+        LIMIT %s
+    """, use_mysql), ids * 3 + (limit,))
+    students = tuple(row[0] for row in cursor.fetchall())
+    if not students:
+        return 0
+
+    condition = f"{{p}}event_id IN ({marks}) AND {{p}}student_id IN ({', '.join(['%s'] * len(students))})"
+    params = ids + students
+    totals = {}
+
+    def fetch(query):
+        cursor.execute(_sql(query, use_mysql), params)
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    for row in fetch(f"""
+        SELECT R.student_id AS k,
+            COUNT(*) AS registered,
+            SUM(CASE WHEN A.status = 'present' THEN 1 ELSE 0 END) AS present,
+            SUM(CASE WHEN A.status = 'absent' THEN 1 ELSE 0 END) AS absent
+        FROM RegistrationsArchive R
+        LEFT JOIN AttendanceArchive A ON R.student_id = A.student_id AND R.event_id = A.event_id
+        WHERE {condition.format(p='R.')}
+        GROUP BY R.student_id
+    """):
+        _merge(totals, row.pop('k'), row)
+    for row in fetch(f"""
+        SELECT student_id AS k, COUNT(*) AS present_total FROM AttendanceArchive
+        WHERE status = 'present' AND {condition.format(p='')}
+        GROUP BY student_id
+    """):
+        _merge(totals, row.pop('k'), row)
+    for row in fetch(f"""
+        SELECT student_id AS k, COUNT(*) AS feedback_count, SUM(rating) AS rating_sum FROM FeedbackArchive
+        WHERE {condition.format(p='')}
+        GROUP BY student_id
+    """):
+        _merge(totals, row.pop('k'), row)
+
+    decrements = ', '.join(f"{c} = {c} - %s" for c in STUDENT_SUMMARY_COLUMNS)
+    cursor.executemany(_sql(f"UPDATE StudentSummary SET {decrements} WHERE student_id = %s", use_mysql), [
+        tuple(entry.get(c, 0) for c in STUDENT_SUMMARY_COLUMNS) + (student_id,)
+        for student_id, entry in totals.items()
+    ])
+
+    deleted = 0
+    for table in ARCHIVED_TABLES:
+        cursor.execute(_sql(f"DELETE FROM {table}Archive WHERE {condition.format(p='')}", use_mysql), params)
+        deleted += cursor.rowcount
+    return deleted
+
+
+def archive_events(db, cutoff, use_mysql, batch_size=100):
+    """
+    Archive activity for every event dated before `cutoff` (YYYY-MM-DD).
+    Commits once per batch so locks stay short. Returns moved row counts.
+    """
+    cursor = db.cursor()
+    try:
+        cursor.execute(_sql("""
+            SELECT E.event_id FROM Events E
+            WHERE E.date < %s AND (
+                EXISTS (SELECT 1 FROM Registrations R WHERE R.event_id = E.event_id)
+                OR EXISTS (SELECT 1 FROM Attendance A WHERE A.event_id = E.event_id)
+                OR EXISTS (SELECT 1 FROM Feedback F WHERE F.event_id = E.event_id)
+            )
+            ORDER BY E.event_id
+        """, use_mysql), (cutoff,))
+        event_ids = [row[0] for row in cursor.fetchall()]
+
+        totals = {table: 0 for table in ARCHIVED_TABLES}
+        totals['events'] = 0
+        for start in range(0, len(event_ids), batch_size):
+            batch = event_ids[start:start + batch_size]
+            try:
+                moved = archive_batch(cursor, batch, use_mysql)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            for table, count in moved.items():
+                totals[table] += count
+            totals['events'] += len(batch)
+        return totals
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive activity for past events")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--before', help="Archive events dated before this day (YYYY-MM-DD)")
+    group.add_argument('--older-than-days', type=int, help="Archive events older than N days")
+    parser.add_argument('--batch-size', type=int, default=100, help="Events per transaction")
+    args = parser.parse_args()
+
+    cutoff = args.before or (date.today() - timedelta(days=args.older_than_days)).isoformat()
+
+    from app import app, get_db, shard_router, USE_MYSQL
+    with app.app_context():
+        for shard in shard_router.shards:
+            totals = archive_events(get_db(shard), cutoff, USE_MYSQL, args.batch_size)
+            print(f"{shard}: archived {totals['events']} events before {cutoff} "
+                  f"({totals['Registrations']} registrations, {totals['Attendance']} attendance, "
+                  f"{totals['Feedback']} feedback rows)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Student access tokens.
+
+Student-scoped routes (a student's timeline, feedback history and check-in
+tokens) answer only the student themselves or staff. A student token is
+``<student_id>.<expires>.<signature>``, a truncated HMAC-SHA256 under the
+same secret as check-in tokens (see checkin.py) but over a distinct
+"student:" message, so neither kind of token passes for the other. It is
+issued only when the account is created (POST /students, or POST
+/students/find-or-create when it creates one), since an email alone proves
+nothing; staff re-issue lost tokens with POST /students/<id>/access-token.
+Clients send it as ``Authorization: Bearer <token>``; staff send
+X-Admin-Token instead.
+
+Verification is pure CPU, like check-in tokens: no database read.
+"""
+import base64
+import hashlib
+import hmac
+import time
+
+SIGNATURE_BYTES = 16
+
+
+class StudentTokens:
+    def __init__(self, secret, ttl):
+        self.secret = secret
+        self.ttl = ttl
+
+    def _sign(self, message):
+        digest = hmac.new(self.secret, f"student:{message}".encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+        return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+    def issue(self, student_id, now=None):
+        message = f"{int(student_id)}.{int((now or time.time()) + self.ttl)}"
+        return f"{message}.{self._sign(message)}"
+
+    def verify(self, token, now=None):
+        """The token's student_id, or None if it is malformed, forged or expired"""
+        try:
+            student_id, expires, signature = token.split('.')
+            student_id, expires = int(student_id), int(expires)
+        except (AttributeError, ValueError):
+            return None
+        if not hmac.compare_digest(self._sign(f"{student_id}.{expires}"), signature):
+            return None
+        if expires < (now or time.time()):
+            return None
+        return student_id
@@ -0,0 +1,143 @@
+"""
+Concurrency benchmark for seat allocation (POST /register).
+
+Runs the app on a local threaded server, creates one event with --capacity
+seats and --students students, then has them all register at once from
+--threads client threads. It checks that the event was not oversold and
+prints throughput and latency.
+
+    python bench_registration.py
+    python bench_registration.py --students 1000 --capacity 250 --threads 200
+    python bench_registration.py --mysql      # use MYSQL_CONFIG instead of a scratch SQLite file
+
+Admission control is turned off so every request reaches the database.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib import request as urlrequest
+from urllib.error import HTTPError
+
+
+def post(base_url, path, payload):
+    req = urlrequest.Request(
+        base_url + path,
+        data=json.dumps(payload).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    try:
+        with urlrequest.urlopen(req, timeout=60) as response:
+            return response.status, json.loads(response.read() or b'{}')
+    except HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registration concurrency benchmark")
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--capacity', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=100)
+    parser.add_argument('--mysql', action='store_true', help="Benchmark against MYSQL_CONFIG")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, backend_dir)
+    os.environ['ADMISSION_CONTROL'] = 'false'
+    os.environ['USE_MYSQL'] = 'true' if args.mysql else 'false'
+    if not args.mysql:
+        # Scratch database: app.py opens events.db in the working directory
+        os.chdir(tempfile.mkdtemp(prefix='bench-registration-'))
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    import app as backend
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    run = uuid.uuid4().hex[:8]
+    status, body = post(base_url, '/events', {
+        'college_id': 'BENCH', 'name': f'Bench {run}', 'type': 'benchmark',
+        'date': '2099-01-01', 'capacity': args.capacity,
+    })
+    assert status == 201, body
+    event_id = body['event_id']
+
+    student_ids = []
+    for i in range(args.students):
+        status, body = post(base_url, '/students', {
+            'college_id': 'BENCH', 'name': f'Student {i}', 'email': f'bench-{run}-{i}@example.com',
+        })
+        assert status == 201, body
+        student_ids.append(body['student_id'])
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    start_gate = threading.Event()
+
+    def register(student_id):
+        start_gate.wait()
+        started = time.perf_counter()
+        status, _ = post(base_url, '/register', {'student_id': student_id, 'event_id': event_id})
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = [pool.submit(register, sid) for sid in student_ids]
+        time.sleep(0.2)
+        started = time.perf_counter()
+        start_gate.set()
+        for future in futures:
+            future.result()
+        wall = time.perf_counter() - started
+
+    with backend.app.app_context():
+        shard = backend.shard_router.for_id(event_id)
+        registered = backend.execute_query(
+            "SELECT COUNT(*) AS n FROM Registrations WHERE event_id = %s", (event_id,), fetch=True, shard=shard
+        )[0]['n']
+        waitlisted = backend.execute_query(
+            "SELECT COUNT(*) AS n FROM Waitlist WHERE event_id = %s", (event_id,), fetch=True, shard=shard
+        )[0]['n']
+        seats_taken = backend.execute_query(
+            "SELECT seats_taken FROM Events WHERE event_id = %s", (event_id,), fetch=True, shard=shard
+        )[0]['seats_taken']
+    server.shutdown()
+
+    expected = min(args.capacity, args.students)
+    print(f"database:        {backend.DB_TYPE}")
+    print(f"registrants:     {args.students} from {args.threads} threads, capacity {args.capacity}")
+    print(f"status codes:    {dict(sorted(statuses.items()))}")
+    print(f"registered:      {registered} (seats_taken {seats_taken}), waitlisted {waitlisted}")
+    print(f"throughput:      {len(latencies) / wall:.0f} registrations/s ({wall:.2f}s wall)")
+    print(f"latency:         p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+
+    oversold = registered > args.capacity or seats_taken != registered
+    lost = registered + waitlisted != args.students or registered != expected
+    if oversold or lost:
+        print("FAIL: seat accounting is inconsistent")
+        sys.exit(1)
+    print("OK: no overselling")
+
+
+if __name__ == '__main__':
+    main()
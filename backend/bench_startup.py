@@ -0,0 +1,74 @@
+"""
+Startup-time benchmark.
+
+Imports app.py in fresh interpreters against a scratch SQLite database, as
+each gunicorn worker (or the master, with --preload) would. The first
+import runs the schema migration; later imports find SCHEMA_VERSION
+already recorded and skip it. Prints import times and checks that PyMySQL
+was not loaded.
+
+    python bench_startup.py
+    python bench_startup.py --runs 20
+    python bench_startup.py --mysql      # use MYSQL_CONFIG instead of a scratch SQLite file
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {backend_dir!r})
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({{'import_ms': elapsed * 1000, 'pymysql': 'pymysql' in sys.modules,
+                   'modules': len(sys.modules)}}))
+"""
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_once(backend_dir, workdir, env):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(backend_dir=backend_dir)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    # app.py prints its own startup messages; the measurement is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--mysql', action='store_true', help="Benchmark against MYSQL_CONFIG")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    workdir = os.getcwd() if args.mysql else tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ, USE_MYSQL='true' if args.mysql else 'false',
+               IDEMPOTENCY_DB=os.path.join(workdir, 'idempotency.db'))
+
+    first = run_once(backend_dir, workdir, env)
+    warm = [run_once(backend_dir, workdir, env) for _ in range(args.runs)]
+    times = [r['import_ms'] for r in warm]
+
+    print(f"database:        {'mysql' if args.mysql else 'sqlite'}")
+    print(f"first start:     {first['import_ms']:.1f} ms (schema check / migration)")
+    print(f"later starts:    p50 {percentile(times, 50):.1f} ms, p90 {percentile(times, 90):.1f} ms "
+          f"over {args.runs} runs")
+    print(f"modules loaded:  {warm[-1]['modules']}, pymysql loaded: {warm[-1]['pymysql']}")
+
+    if not args.mysql and any(r['pymysql'] for r in [first] + warm):
+        print("FAIL: PyMySQL was imported for a SQLite deployment")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Circuit breaker for the primary MySQL connection.
+
+    closed     connections are attempted normally
+    open       after `failure_threshold` consecutive connect failures;
+               requests skip MySQL entirely (fail fast, or use the
+               configured fallback) instead of each waiting for a timeout
+    half_open  a background thread is probing MySQL; requests still skip it
+
+While open, one daemon thread per process retries `probe()` every
+`probe_interval` seconds and closes the breaker on the first success.
+Requests never act as the probe, so no request pays for a dead server.
+"""
+import os
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, probe, failure_threshold=3, probe_interval=5):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.stats = {'opened': 0, 'closed': 0, 'probes': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+        self._prober = None
+        self._prober_pid = None
+
+    def allow(self):
+        """True if a real connection attempt should be made"""
+        if self.state == CLOSED:
+            return True
+        self.stats['rejected'] += 1
+        self._ensure_prober()
+        return False
+
+    def record_success(self):
+        if self.failures:
+            with self._lock:
+                self.failures = 0
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == CLOSED and self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.time()
+                self.stats['opened'] += 1
+                print(f"Circuit breaker opened after {self.failures} failures: {error}")
+        if self.state != CLOSED:
+            self._ensure_prober()
+
+    def _ensure_prober(self):
+        # Threads do not survive fork(), so check the owner pid as well
+        with self._lock:
+            if self._prober is not None and self._prober.is_alive() and self._prober_pid == os.getpid():
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name='db-breaker-probe', daemon=True)
+            self._prober_pid = os.getpid()
+            self._prober.start()
+
+    def _probe_loop(self):
+        while self.state != CLOSED:
+            time.sleep(self.probe_interval)
+            self.state = HALF_OPEN
+            self.stats['probes'] += 1
+            try:
+                self.probe()
+            except Exception as e:
+                with self._lock:
+                    self.state = OPEN
+                    self.last_error = str(e)
+                continue
+            with self._lock:
+                self.state = CLOSED
+                self.failures = 0
+                self.opened_at = None
+                self.stats['closed'] += 1
+            print("Circuit breaker closed: MySQL is reachable again")
+
+    def status(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'opened_at': self.opened_at,
+            'last_error': self.last_error,
+            **self.stats,
+        }
@@ -0,0 +1,240 @@
+"""
+Response cache for hot read routes.
+
+Backends (CACHE_BACKEND):
+
+    memory   per-worker LRU, bounded by entry count
+    sqlite   one SQLite file shared by every worker on the host, bounded by
+             total value size (oldest entries evicted first)
+    tiered   memory in front of sqlite
+    off      no caching
+
+Every entry has a TTL. Invalidation is by namespace ('events',
+'student:42', ...): each namespace has a generation counter in a small
+mmap'd file (CACHE_GENERATIONS_FILE) shared by all workers. Cache keys
+include the current generations, so when a write route bumps a namespace
+every worker stops seeing the old entries at once, and they age out on
+their own. Reading a generation is a memory read; bumping one takes a
+short flock().
+
+A reader takes the generations *before* computing a value, so a value
+computed from data a concurrent write has already replaced is stored
+under the old generation and never served.
+"""
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: bumps are serialized per process only
+    fcntl = None
+
+
+class Generations:
+    """Per-namespace counters in a shared file; namespaces hash onto SLOTS slots"""
+    SLOTS = 1024
+
+    def __init__(self, path):
+        self.path = path
+        size = self.SLOTS * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_pid = None
+
+    def _offset(self, namespace):
+        # A collision only costs an extra invalidation
+        return (zlib.crc32(namespace.encode()) % self.SLOTS) * 8
+
+    def get(self, namespace):
+        return struct.unpack_from('<Q', self._map, self._offset(namespace))[0]
+
+    def bump(self, namespace):
+        offset = self._offset(namespace)
+        with self._lock:
+            # flock() is per open file, so each process needs its own fd
+            if fcntl is not None and self._lock_pid != os.getpid():
+                self._lock_fd = os.open(self.path, os.O_RDWR)
+                self._lock_pid = os.getpid()
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                value = struct.unpack_from('<Q', self._map, offset)[0]
+                struct.pack_into('<Q', self._map, offset, value + 1)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+
+class MemoryCache:
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, sweep_every=100):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sweep_every = sweep_every
+        self._local = threading.local()
+        self._sets = 0
+        db = self._connect()
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS CacheEntries (
+                cache_key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_cache_created ON CacheEntries (created_at)")
+        db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=OFF")    # a lost cache entry is harmless
+        return db
+
+    def _db(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.db = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def get(self, key):
+        row = self._db().execute(
+            "SELECT value FROM CacheEntries WHERE cache_key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self._db().execute(
+            "INSERT OR REPLACE INTO CacheEntries (cache_key, value, size, expires_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), now + ttl, now)
+        )
+        self._sets += 1
+        if self._sets % self.sweep_every == 0:
+            self._sweep(now)
+
+    def _sweep(self, now):
+        db = self._db()
+        db.execute("DELETE FROM CacheEntries WHERE expires_at <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM CacheEntries").fetchone()[0]
+        while total > self.max_bytes:
+            # Oldest first, a batch at a time
+            freed = db.execute("""
+                SELECT COALESCE(SUM(size), 0) FROM (
+                    SELECT size FROM CacheEntries ORDER BY created_at LIMIT 100
+                )
+            """).fetchone()[0]
+            db.execute("""
+                DELETE FROM CacheEntries WHERE cache_key IN (
+                    SELECT cache_key FROM CacheEntries ORDER BY created_at LIMIT 100
+                )
+            """)
+            if not freed:
+                break
+            total -= freed
+
+    def size(self):
+        return self._db().execute("SELECT COUNT(*) FROM CacheEntries").fetchone()[0]
+
+
+class TieredCache:
+    """Per-worker LRU in front of the shared SQLite file"""
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                # Short local TTL: the shared entry's expiry is not known
+                # here (invalidation never depends on TTLs anyway)
+                self.local.set(key, value, 5)
+        return value
+
+    def set(self, key, value, ttl):
+        self.local.set(key, value, ttl)
+        self.shared.set(key, value, ttl)
+
+    def size(self):
+        return self.local.size()
+
+
+class Cache:
+    """Namespaced cache with generation-based invalidation and hit-rate stats"""
+
+    def __init__(self, backend, generations, ttl=30):
+        self.backend = backend
+        self.generations = generations
+        self.ttl = ttl
+        self.stats = {}             # route -> {'hits': n, 'misses': n}
+        self._lock = threading.Lock()
+
+    def key(self, namespaces, key):
+        """Key for `key` under the current generations of `namespaces`"""
+        versions = '.'.join(str(self.generations.get(ns)) for ns in namespaces)
+        return f"{key}@{versions}"
+
+    def get(self, route, full_key):
+        value = self.backend.get(full_key)
+        with self._lock:
+            counts = self.stats.setdefault(route, {'hits': 0, 'misses': 0})
+            counts['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def set(self, full_key, value, ttl=None):
+        self.backend.set(full_key, value, ttl or self.ttl)
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            self.generations.bump(namespace)
+
+    def status(self):
+        with self._lock:
+            routes = {route: dict(counts, hit_rate=round(counts['hits'] / max(1, counts['hits'] + counts['misses']), 3))
+                      for route, counts in self.stats.items()}
+        return {'backend': type(self.backend).__name__, 'entries': self.backend.size(), 'routes': routes}
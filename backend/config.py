@@ -1,8 +1,11 @@
 # config.py
 import os
+import tempfile
 
-# Enable MySQL in production by setting USE_MYSQL=true on Railway
-USE_MYSQL = os.getenv("USE_MYSQL", "true").lower() in ("1","true","yes")
+# Enable MySQL in production by setting USE_MYSQL=true on Railway. The
+# default is the local SQLite file (events.db): with MySQL on and no
+# MYSQL_FALLBACK_SQLITE, an unreachable MySQL means 503 on every route.
+USE_MYSQL = os.getenv("USE_MYSQL", "false").lower() in ("1","true","yes")
 
 MYSQLHOST = os.getenv("MYSQLHOST") or os.getenv("MYSQL_HOST") or os.getenv("MYSQLHOST")
 MYSQLUSER = os.getenv("MYSQLUSER") or os.getenv("MYSQL_USER") or "root"
@@ -20,3 +23,123 @@ MYSQL_CONFIG = {
     "port": MYSQLPORT,
     "charset": "utf8mb4"
 }
+
+# Per-college sharding: "college_id=shard_no:target,..." where target is a
+# SQLite file (or a MySQL database name when USE_MYSQL). Empty = one database.
+SHARDS = os.getenv("SHARDS", "")
+# Sharded IDs are FLOOR + seq * STRIDE + shard_no; IDs below FLOOR are legacy
+# rows on the default database.
+SHARD_ID_STRIDE = int(os.getenv("SHARD_ID_STRIDE") or 100)
+SHARD_ID_FLOOR = int(os.getenv("SHARD_ID_FLOOR") or 0)
+
+# Read replicas for GET / report queries: "host[:port],..." for MySQL (same
+# credentials as MYSQL_CONFIG) or SQLite file paths. Empty = primary only.
+READ_REPLICAS = os.getenv("READ_REPLICAS", "")
+# Skip replicas more than this many seconds behind the primary
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG") or 5)
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL") or 2)
+# After a write, the client reads from the primary for this many seconds
+READ_AFTER_WRITE_PIN = float(os.getenv("READ_AFTER_WRITE_PIN") or 10)
+
+# QR check-in tokens. Set CHECKIN_SECRET in production; otherwise a secret is
+# generated once into CHECKIN_SECRET_FILE and shared by all workers.
+CHECKIN_SECRET = os.getenv("CHECKIN_SECRET", "")
+CHECKIN_SECRET_FILE = os.getenv("CHECKIN_SECRET_FILE", ".checkin_secret")
+# Tokens stay valid this many seconds after the end of the event's day (UTC)
+CHECKIN_TOKEN_GRACE = int(os.getenv("CHECKIN_TOKEN_GRACE") or 12 * 3600)
+# Repeat scans of the same token within this window skip the database
+CHECKIN_DEDUP_SECONDS = float(os.getenv("CHECKIN_DEDUP_SECONDS") or 60)
+# Student access tokens (see auth.py), signed with the check-in secret
+STUDENT_TOKEN_TTL = int(os.getenv("STUDENT_TOKEN_TTL") or 30 * 24 * 3600)
+
+# Admission control (see admission.py), off unless ADMISSION_CONTROL=true.
+# Slots are lock files in ADMISSION_DIR shared by all workers on this host;
+# RESERVED slots are kept for GET and /staff/* requests.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "false").lower() in ("1", "true", "yes")
+ADMISSION_DIR = os.getenv("ADMISSION_DIR") or os.path.join(tempfile.gettempdir(), "campus-events-admission")
+ADMISSION_SLOTS = int(os.getenv("ADMISSION_SLOTS") or 8)
+ADMISSION_RESERVED_SLOTS = int(os.getenv("ADMISSION_RESERVED_SLOTS") or 2)
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE") or 16)
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT") or 2)
+# Per client, per worker: sustained writes/second and burst size
+ADMISSION_CLIENT_RATE = float(os.getenv("ADMISSION_CLIENT_RATE") or 5)
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST") or 20)
+# Shed requests that already waited this long upstream (X-Request-Start)
+ADMISSION_MAX_QUEUE_AGE = float(os.getenv("ADMISSION_MAX_QUEUE_AGE") or 10)
+# Reverse proxies in front of gunicorn (Railway's edge is one). Client IPs
+# are read from the X-Forwarded-For entries these proxies appended; set 0
+# when clients connect directly, or they could spoof their address.
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT") or 1)
+
+# Idempotency-Key replay store (local SQLite file shared by all workers)
+IDEMPOTENCY_DB = os.getenv("IDEMPOTENCY_DB", "idempotency.db")
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL") or 86400)
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS") or 100000)
+
+# Circuit breaker around the primary MySQL connection (see breaker.py).
+# While MySQL is unreachable requests fail fast with 503. Setting
+# MYSQL_FALLBACK_SQLITE to a SQLite file opts in to serving (and writing)
+# from that file instead, which then diverges from MySQL until reconciled.
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD") or 3)
+DB_BREAKER_PROBE_INTERVAL = float(os.getenv("DB_BREAKER_PROBE_INTERVAL") or 5)
+MYSQL_CONNECT_TIMEOUT = int(os.getenv("MYSQL_CONNECT_TIMEOUT") or 5)
+MYSQL_FALLBACK_SQLITE = os.getenv("MYSQL_FALLBACK_SQLITE", "")
+
+# Report snapshots (see snapshots.py). 'off' (default): reports are computed
+# on every request; 'thread': an elected worker refreshes them (a thread,
+# plus snapshot files and a scheduler.lock flock file in SNAPSHOT_DIR);
+# 'external': run `python snapshots.py` as its own process.
+SNAPSHOT_SCHEDULER = (os.getenv("SNAPSHOT_SCHEDULER") or "off").lower()
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR") or "report_snapshots"
+# How often data changes are checked for, and the longest a snapshot is kept
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL") or 5)
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE") or 300)
+
+# Response cache for hot read routes (see cache.py): off (default) | memory |
+# sqlite | tiered. Any backend but 'off' creates CACHE_GENERATIONS_FILE;
+# 'sqlite' and 'tiered' also create CACHE_DB.
+CACHE_BACKEND = (os.getenv("CACHE_BACKEND") or "off").lower()
+CACHE_TTL = float(os.getenv("CACHE_TTL") or 30)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES") or 2048)
+CACHE_DB = os.getenv("CACHE_DB", "cache.db")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES") or 64 * 1024 * 1024)
+# Invalidation counters shared by every worker on this host
+CACHE_GENERATIONS_FILE = os.getenv("CACHE_GENERATIONS_FILE", "cache.generations")
+
+# Per-request tracing (see tracing.py). A fraction of requests (and any whose
+# traceparent header is sampled) are exported as OpenTelemetry JSON lines.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE") or 0.01)
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME") or "campus-events"
+
+# Admin endpoints and on-demand profiling (see profiling.py) are disabled
+# unless ADMIN_TOKEN is set; clients send it as X-Admin-Token.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR") or "profiles"
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL") or 0.005)
+# Longest whole-worker profile a single call can start
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS") or 60)
+
+# POST /batch: most GET sub-requests per batch, and threads for "parallel"
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS") or 20)
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL") or 4)
+
+# Event recommendations (see recommend.py): the index is not maintained by
+# default ('off', the route answers 503), or is maintained by an elected worker
+# ('thread') or by `python recommend.py` ('external'). 'thread' and 'external'
+# create index.bin in RECOMMEND_DIR; 'thread' also creates a scheduler.lock there.
+RECOMMEND_SCHEDULER = (os.getenv("RECOMMEND_SCHEDULER") or "off").lower()
+RECOMMEND_DIR = os.getenv("RECOMMEND_DIR") or "recommendations"
+RECOMMEND_INTERVAL = float(os.getenv("RECOMMEND_INTERVAL") or 30)
+# Most similar upcoming events kept per event
+RECOMMEND_TOP_K = int(os.getenv("RECOMMEND_TOP_K") or 20)
+
+# Deleting an event removes its child rows this many at a time, one
+# transaction each (see deletion.py)
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE") or 1000)
+
+# Statement deadlines (see deadlines.py): seconds of database time per
+# request before its statement is cancelled with a 503. Report routes get
+# the longer budget; 0 disables a deadline.
+DB_DEADLINE = float(os.getenv("DB_DEADLINE") or 5)
+DB_REPORT_DEADLINE = float(os.getenv("DB_REPORT_DEADLINE") or 30)
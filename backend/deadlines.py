@@ -0,0 +1,262 @@
+"""
+Statement deadlines.
+
+Each request gets a time budget for its database work (DB_DEADLINE, or the
+longer DB_REPORT_DEADLINE for report routes; see ROUTE_DEADLINES in app.py).
+execute_query() runs every statement under what is left of it, and a
+statement still running at the deadline is cancelled on the server rather
+than abandoned with the worker:
+
+    SQLite   a progress handler, called every PROGRESS_STEPS VM
+             instructions, interrupts the statement ("interrupted")
+    MySQL    SELECTs carry a /*+ MAX_EXECUTION_TIME(ms) */ hint, so the
+             server stops them itself (error 3024) even if the worker is
+             killed first; every statement is also registered with the
+             process's Watchdog, one thread over a heap of deadlines,
+             which sends KILL QUERY <thread id> on a side connection
+             (error 1317) for a statement still running at its deadline
+
+Either way the caller gets QueryCancelled, and the connection stays usable
+once its transaction is rolled back. A statement started after the deadline
+has passed is not sent at all.
+
+    with bounded(db, deadline, query) as query:
+        cursor.execute(query, params)
+
+Code that keeps a cursor across statements (transactions, multi-query
+reports) wraps it in BoundedCursor instead, which does the same for every
+execute() and executemany(); BoundedConnection hands out such cursors to
+helpers that open their own.
+"""
+import heapq
+import itertools
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_STEPS = 1000
+# The KILL QUERY of a hinted SELECT is due this much later, so the server's
+# own MAX_EXECUTION_TIME normally wins
+KILL_GRACE = 0.5
+KILL_CONNECT_TIMEOUT = 2
+MYSQL_CANCELLED = (3024, 1317)      # max execution time exceeded, query interrupted
+LEADING_SELECT = re.compile(r"^(\s*SELECT)\b", re.IGNORECASE)
+
+
+class QueryCancelled(Exception):
+    """A statement ran past its request's deadline and was cancelled"""
+
+
+def remaining(deadline):
+    """Seconds left before `deadline` (time.monotonic()), or None for no deadline"""
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def is_cancellation(error):
+    if isinstance(error, sqlite3.OperationalError):
+        return str(error) == 'interrupted'
+    args = getattr(error, 'args', ())
+    return bool(args) and args[0] in MYSQL_CANCELLED
+
+
+def with_time_limit(query, seconds):
+    """A top-level SELECT with a MAX_EXECUTION_TIME hint; other statements unchanged"""
+    if 'MAX_EXECUTION_TIME' in query:
+        return query
+    return LEADING_SELECT.sub(rf"\1 /*+ MAX_EXECUTION_TIME({max(1, int(seconds * 1000))}) */", query, count=1)
+
+
+class Watchdog:
+    """
+    Sends KILL QUERY for MySQL statements still running at their deadline.
+    One daemon thread per process sleeps until the earliest deadline in a
+    heap of (deadline, order, guard) entries; registering and releasing a
+    statement only takes a lock, so no thread is started per statement.
+    Released entries are dropped when they reach the top of the heap (or in
+    a compaction once they are the majority). A due statement is killed
+    from a short-lived thread, so a slow side connection delays no other
+    kill. stats counts kills and failed kills for /metrics.
+    """
+    COMPACT_MIN = 64
+
+    def __init__(self):
+        self._heap = []
+        self._order = itertools.count()
+        self._released = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {'kills': 0, 'kill_failures': 0}
+
+    def watch(self, db, due):
+        """Register the statement about to run on pymysql connection `db`; returns its guard"""
+        guard = {'lock': threading.Lock(), 'running': True, 'db': db, 'thread_id': db.thread_id()}
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='query-watchdog', daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (due, next(self._order), guard))
+            if self._heap[0][2] is guard:
+                self._cond.notify()
+        return guard
+
+    def release(self, guard):
+        """
+        The statement finished. A KILL already connecting finds it released
+        and is not sent; one being sent is waited for (a single round trip
+        on an open connection), so it cannot reach the next statement.
+        """
+        with guard['lock']:
+            guard['running'] = False
+        with self._cond:
+            self._released += 1
+            if self._released > self.COMPACT_MIN and self._released * 2 > len(self._heap):
+                self._heap = [entry for entry in self._heap if entry[2]['running']]
+                heapq.heapify(self._heap)
+                self._released = 0
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, guard = heapq.heappop(self._heap)
+                if not guard['running']:
+                    self._released = max(0, self._released - 1)
+                    continue
+            threading.Thread(target=self._kill, args=(guard,), name='query-kill', daemon=True).start()
+
+    def _kill(self, guard):
+        import pymysql
+        db = guard['db']
+        try:
+            # Connect before taking the lock: release() must not wait for it
+            killer = pymysql.connect(host=db.host, port=db.port, user=db.user, password=db.password,
+                                     connect_timeout=KILL_CONNECT_TIMEOUT)
+        except Exception as e:
+            self.stats['kill_failures'] += 1
+            logger.warning("KILL QUERY %s: side connection failed: %s", guard['thread_id'], e)
+            return
+        try:
+            with guard['lock']:
+                if guard['running']:
+                    with killer.cursor() as cursor:
+                        cursor.execute(f"KILL QUERY {int(guard['thread_id'])}")
+                    self.stats['kills'] += 1
+        except Exception as e:
+            self.stats['kill_failures'] += 1
+            logger.warning("KILL QUERY %s failed: %s", guard['thread_id'], e)
+        finally:
+            killer.close()
+
+
+watchdog = Watchdog()
+
+
+@contextmanager
+def bounded(db, deadline, query):
+    """
+    Run the statement(s) of the `with` block under `deadline`; yields the
+    query to execute (hinted on MySQL). Raises QueryCancelled when the
+    deadline has already passed or the statement is cancelled.
+    """
+    left = remaining(deadline)
+    if left is None:
+        yield query
+        return
+    if left <= 0:
+        raise QueryCancelled("Deadline passed before the statement started")
+
+    if hasattr(db, 'set_progress_handler'):
+        db.set_progress_handler(lambda: time.monotonic() >= deadline, PROGRESS_STEPS)
+        try:
+            yield query
+        except sqlite3.OperationalError as e:
+            if is_cancellation(e):
+                raise QueryCancelled(f"Statement cancelled after {left:.1f}s") from e
+            raise
+        finally:
+            db.set_progress_handler(None, PROGRESS_STEPS)
+        return
+
+    hinted = with_time_limit(query, left)
+    guard = watchdog.watch(db, deadline + (KILL_GRACE if hinted != query else 0))
+    try:
+        yield hinted
+    except Exception as e:
+        if is_cancellation(e):
+            raise QueryCancelled(f"Statement cancelled after {left:.1f}s") from e
+        raise
+    finally:
+        watchdog.release(guard)
+
+
+class BoundedCursor:
+    """
+    Cursor proxy running each statement under bounded(). `deadline` is
+    called per statement, so a renewed deadline applies to the next one;
+    on_cancel(error, query) runs before QueryCancelled propagates. SQLite
+    does a SELECT's work as rows are fetched, so fetches are bounded too
+    (PyMySQL has buffered them during execute()).
+    """
+    def __init__(self, cursor, db, deadline, on_cancel=None):
+        self._cursor = cursor
+        self._db = db
+        self._deadline = deadline
+        self._on_cancel = on_cancel
+        self._query = None
+
+    def _run(self, call, query):
+        try:
+            with bounded(self._db, self._deadline(), query) as statement:
+                return call(statement)
+        except QueryCancelled as e:
+            if self._on_cancel is not None:
+                self._on_cancel(e, self._query)
+            raise
+
+    def execute(self, query, *args):
+        self._query = query
+        return self._run(lambda statement: self._cursor.execute(statement, *args), query)
+
+    def executemany(self, query, *args):
+        self._query = query
+        return self._run(lambda statement: self._cursor.executemany(statement, *args), query)
+
+    def _fetch(self, method, *args):
+        if not hasattr(self._db, 'set_progress_handler'):
+            return method(*args)
+        return self._run(lambda statement: method(*args), self._query)
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class BoundedConnection:
+    """Connection proxy whose cursors are BoundedCursors (same deadline and on_cancel)"""
+    def __init__(self, db, deadline, on_cancel=None):
+        self._db = db
+        self._deadline = deadline
+        self._on_cancel = on_cancel
+
+    def cursor(self, *args):
+        return BoundedCursor(self._db.cursor(*args), self._db, self._deadline, self._on_cancel)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
@@ -0,0 +1,238 @@
+"""
+Deleting events together with everything that belongs to them.
+
+Neither schema declares foreign keys, so nothing cascades by itself: SQLite
+would also need PRAGMA foreign_keys on every connection, and ON DELETE
+CASCADE removes all child rows inside the parent's statement, which is one
+long lock for a popular event. The cascade is spelled out here instead and
+runs the same way on both dialects:
+
+    1. the Events rows (and their EventSummary rows) are deleted in one
+       short transaction, so nothing new can attach to them: claim_seat()
+       and the other writers find no event;
+    2. child rows are deleted BATCH_SIZE at a time, one commit per batch:
+       Registrations, Attendance, Feedback, Waitlist, then the archived rows
+       (see archive.purge_archived, which also corrects StudentSummary).
+
+An interrupted delete leaves orphans, never a half-deleted event. Orphans
+(also left by older versions, which only deleted the Events row) are found
+and removed by the maintenance command, which then reclaims space:
+
+    python deletion.py --scan                    # count orphans per table
+    python deletion.py --purge-orphans           # delete them, then VACUUM / ANALYZE
+    python deletion.py --purge-orphans --batch-size 500 --vacuum-pages 2000
+
+On SQLite, freed pages are returned with PRAGMA incremental_vacuum, which
+needs auto_vacuum=INCREMENTAL: new databases get it from ensure_schema();
+an existing one is converted once with --full-vacuum (rewrites the file).
+MySQL reuses freed InnoDB pages itself, so it only gets ANALYZE TABLE.
+"""
+import argparse
+
+from archive import ARCHIVED_TABLES, purge_archived
+
+CHILD_TABLES = ('Registrations', 'Attendance', 'Feedback', 'Waitlist')
+ARCHIVE_TABLES = tuple(f"{table}Archive" for table in ARCHIVED_TABLES)
+BATCH_SIZE = 1000
+# Event ids per IN (...) list
+ID_CHUNK = 500
+VACUUM_PAGES = 1000
+
+
+def _sql(query, use_mysql):
+    return query if use_mysql else query.replace('%s', '?')
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_CHUNK):
+        yield tuple(ids[start:start + ID_CHUNK])
+
+
+def delete_event_rows(cursor, event_ids, use_mysql):
+    """Step 1, in the caller's transaction. Returns the events deleted."""
+    deleted = 0
+    for chunk in _chunks(event_ids):
+        marks = ', '.join(['%s'] * len(chunk))
+        cursor.execute(_sql(f"DELETE FROM EventSummary WHERE event_id IN ({marks})", use_mysql), chunk)
+        cursor.execute(_sql(f"DELETE FROM Events WHERE event_id IN ({marks})", use_mysql), chunk)
+        deleted += cursor.rowcount
+    return deleted
+
+
+def _delete_batch(cursor, table, marks, chunk, use_mysql, batch_size):
+    if use_mysql:
+        cursor.execute(f"DELETE FROM {table} WHERE event_id IN ({marks}) LIMIT %s", chunk + (batch_size,))
+    else:
+        cursor.execute(_sql(f"""
+            DELETE FROM {table} WHERE rowid IN (
+                SELECT rowid FROM {table} WHERE event_id IN ({marks}) LIMIT %s
+            )
+        """, False), chunk + (batch_size,))
+    return cursor.rowcount
+
+
+def delete_children(db, event_ids, use_mysql, batch_size=BATCH_SIZE):
+    """
+    Step 2: delete the child rows of already-deleted events in batches of
+    `batch_size`, committing after each. Returns {table: rows deleted},
+    archived rows of all three tables counted together as 'archived'.
+    """
+    counts = {table: 0 for table in CHILD_TABLES}
+    counts['archived'] = 0
+    cursor = db.cursor()
+    try:
+        for chunk in _chunks(event_ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            for table in CHILD_TABLES:
+                while True:
+                    try:
+                        deleted = _delete_batch(cursor, table, marks, chunk, use_mysql, batch_size)
+                        db.commit()
+                    except Exception:
+                        db.rollback()
+                        raise
+                    counts[table] += deleted
+                    if deleted < batch_size:
+                        break
+            # Archived rows: batch_size students' rows of each table at a time
+            while True:
+                try:
+                    deleted = purge_archived(cursor, chunk, use_mysql, batch_size)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                counts['archived'] += deleted
+                if not deleted:
+                    break
+        return counts
+    finally:
+        cursor.close()
+
+
+def delete_events(db, event_ids, use_mysql, batch_size=BATCH_SIZE):
+    """
+    Delete events and everything attached to them. Returns (events deleted,
+    {table: child rows deleted}).
+    """
+    cursor = db.cursor()
+    try:
+        deleted = delete_event_rows(cursor, event_ids, use_mysql)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    return deleted, delete_children(db, event_ids, use_mysql, batch_size)
+
+
+def find_orphans(db, use_mysql):
+    """{table: event_ids} of child / archive / summary rows whose event no longer exists"""
+    orphans = {}
+    cursor = db.cursor()
+    try:
+        for table in CHILD_TABLES + ARCHIVE_TABLES + ('EventSummary',):
+            cursor.execute(_sql(f"""
+                SELECT DISTINCT C.event_id FROM {table} C
+                WHERE NOT EXISTS (SELECT 1 FROM Events E WHERE E.event_id = C.event_id)
+            """, use_mysql))
+            event_ids = [row[0] for row in cursor.fetchall()]
+            if event_ids:
+                orphans[table] = event_ids
+        return orphans
+    finally:
+        cursor.close()
+
+
+def purge_orphans(db, use_mysql, batch_size=BATCH_SIZE):
+    """Delete every orphaned row found by find_orphans(). Returns {table: rows deleted}."""
+    orphans = find_orphans(db, use_mysql)
+    event_ids = sorted({event_id for ids in orphans.values() for event_id in ids})
+    if not event_ids:
+        return {}
+    cursor = db.cursor()
+    try:
+        summaries = 0
+        for chunk in _chunks(orphans.get('EventSummary', ())):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(_sql(f"DELETE FROM EventSummary WHERE event_id IN ({marks})", use_mysql), chunk)
+            summaries += cursor.rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    counts = delete_children(db, event_ids, use_mysql, batch_size)
+    counts['EventSummary'] = summaries
+    return counts
+
+
+def reclaim_space(db, use_mysql, pages=VACUUM_PAGES, full=False):
+    """
+    Return freed pages to the file system (SQLite) and refresh planner
+    statistics on the tables deletes touch. Returns a short description.
+    """
+    cursor = db.cursor()
+    tables = ('Events',) + CHILD_TABLES + ARCHIVE_TABLES + ('EventSummary', 'StudentSummary')
+    try:
+        if use_mysql:
+            cursor.execute(f"ANALYZE TABLE {', '.join(tables)}")
+            cursor.fetchall()
+            return f"analyzed {len(tables)} tables"
+
+        cursor.execute("PRAGMA auto_vacuum")
+        mode = cursor.fetchone()[0]
+        if full:
+            # Also switches an existing database to incremental mode
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            db.commit()
+            cursor.execute("VACUUM")
+            done = "full vacuum"
+        elif mode == 2:
+            cursor.execute("PRAGMA freelist_count")
+            free = cursor.fetchone()[0]
+            cursor.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+            cursor.fetchall()
+            done = f"incremental vacuum ({min(free, int(pages))} of {free} free pages)"
+        else:
+            done = "no vacuum: auto_vacuum is not INCREMENTAL (run once with --full-vacuum)"
+        for table in tables:
+            cursor.execute(f"ANALYZE {table}")
+        db.commit()
+        return f"{done}, analyzed {len(tables)} tables"
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and delete rows left behind by deleted events")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--scan', action='store_true', help="Count orphaned rows and exit")
+    group.add_argument('--purge-orphans', action='store_true', help="Delete orphaned rows, then reclaim space")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument('--vacuum-pages', type=int, default=VACUUM_PAGES,
+                        help="Most free pages one incremental vacuum returns (SQLite)")
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help="Rewrite the SQLite file with VACUUM and switch it to incremental auto_vacuum")
+    args = parser.parse_args()
+
+    from app import app, get_db, shard_router, USE_MYSQL
+    with app.app_context():
+        for shard in shard_router.shards:
+            db = get_db(shard)
+            if args.scan:
+                orphans = find_orphans(db, USE_MYSQL)
+                summary = ', '.join(f"{table}: {len(ids)} events" for table, ids in orphans.items())
+                print(f"{shard}: {summary or 'no orphans'}")
+                continue
+            counts = purge_orphans(db, USE_MYSQL, args.batch_size)
+            summary = ', '.join(f"{table}: {count}" for table, count in counts.items() if count)
+            print(f"{shard}: deleted {summary or 'nothing'}; "
+                  f"{reclaim_space(db, USE_MYSQL, args.vacuum_pages, args.full_vacuum)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Idempotency-Key support for POST routes.
+
+Responses are remembered in a small local SQLite file shared by every
+gunicorn worker on the host (IDEMPOTENCY_DB). A retried POST carrying the
+same Idempotency-Key gets the original status and body back without the
+route running again.
+
+Each key moves from 'pending' (the first request is still running) to
+'done' (response stored). A key reused with a different method, path or
+body is rejected. Pending keys older than pending_timeout are treated as
+abandoned (the worker died) and can be claimed again. Entries expire after
+ttl seconds, and the table is trimmed to max_keys.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+NEW = 'new'
+REPLAY = 'replay'
+MISMATCH = 'mismatch'
+IN_PROGRESS = 'in_progress'
+
+
+def fingerprint(method, path, body):
+    digest = hashlib.sha256()
+    digest.update(method.encode())
+    digest.update(b'\0')
+    digest.update(path.encode())
+    digest.update(b'\0')
+    digest.update(body or b'')
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, path, ttl=86400, max_keys=100000, pending_timeout=30, sweep_every=200):
+        self.path = path
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.pending_timeout = pending_timeout
+        self.sweep_every = sweep_every
+        self._local = threading.local()
+        self._inserts = 0
+        db = self._connect()
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS IdempotencyKeys (
+                idempotency_key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                state TEXT NOT NULL,
+                status INTEGER,
+                body BLOB,
+                content_type TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_created ON IdempotencyKeys (created_at)")
+        # Not kept: this usually runs in the gunicorn master before forking
+        db.close()
+
+    def _connect(self):
+        # Autocommit: every statement is its own short transaction
+        db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _db(self):
+        # One connection per thread, opened lazily; a connection inherited
+        # across fork() is never reused
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.db = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def begin(self, key, print_):
+        """
+        Claim `key` for a new request, or describe why not.
+        Returns (NEW|REPLAY|MISMATCH|IN_PROGRESS, stored row or None).
+        """
+        db = self._db()
+        now = time.time()
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO IdempotencyKeys (idempotency_key, fingerprint, state, created_at) "
+            "VALUES (?, ?, 'pending', ?)",
+            (key, print_, now)
+        )
+        if cursor.rowcount == 1:
+            self._maybe_sweep(now)
+            return NEW, None
+
+        row = db.execute(
+            "SELECT fingerprint, state, status, body, content_type, created_at "
+            "FROM IdempotencyKeys WHERE idempotency_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            # Expired and swept between the two statements
+            return self.begin(key, print_)
+        stored_print, state, status, body, content_type, created_at = row
+        if stored_print != print_:
+            return MISMATCH, None
+        if now - created_at > self.ttl:
+            db.execute("DELETE FROM IdempotencyKeys WHERE idempotency_key = ? AND created_at = ?", (key, created_at))
+            return self.begin(key, print_)
+        if state == 'done':
+            return REPLAY, {'status': status, 'body': body, 'content_type': content_type}
+        if now - created_at > self.pending_timeout:
+            # Abandoned by a crashed worker: take it over
+            taken = db.execute(
+                "UPDATE IdempotencyKeys SET created_at = ? WHERE idempotency_key = ? AND state = 'pending' "
+                "AND created_at = ?", (now, key, created_at)
+            ).rowcount
+            if taken:
+                return NEW, None
+        return IN_PROGRESS, None
+
+    def complete(self, key, status, body, content_type):
+        self._db().execute(
+            "UPDATE IdempotencyKeys SET state = 'done', status = ?, body = ?, content_type = ? "
+            "WHERE idempotency_key = ?",
+            (status, body, content_type, key)
+        )
+
+    def abandon(self, key):
+        """Forget a key whose request did not produce a replayable response"""
+        self._db().execute("DELETE FROM IdempotencyKeys WHERE idempotency_key = ? AND state = 'pending'", (key,))
+
+    def _maybe_sweep(self, now):
+        self._inserts += 1
+        if self._inserts % self.sweep_every:
+            return
+        db = self._db()
+        db.execute("DELETE FROM IdempotencyKeys WHERE created_at < ?", (now - self.ttl,))
+        db.execute("""
+            DELETE FROM IdempotencyKeys WHERE idempotency_key IN (
+                SELECT idempotency_key FROM IdempotencyKeys
+                ORDER BY created_at DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (self.max_keys,))
@@ -0,0 +1,73 @@
+"""
+Minimal in-process metrics, exposed at GET /metrics in the Prometheus text
+format. Values are per worker process; Prometheus sums them across the
+targets it scrapes (or use one worker per target).
+
+    REQUESTS = counter('campus_requests_total', 'Requests handled')
+    REQUESTS.inc()
+    STATE = gauge('campus_breaker_state', 'Breaker state', fn=lambda: 1)
+"""
+import threading
+
+_registry = {}
+_lock = threading.Lock()
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}           # label tuple -> value
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, fn):
+        self.name = name
+        self.help = help_text
+        self.fn = fn                # called at scrape time: value, or {labels: value}
+
+    def samples(self):
+        value = self.fn()
+        if isinstance(value, dict):
+            return [(tuple(sorted(labels)), v) for labels, v in value.items()]
+        return [((), value)]
+
+
+def _register(metric):
+    with _lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name, help_text):
+    return _register(Counter(name, help_text))
+
+
+def gauge(name, help_text, fn):
+    return _register(Gauge(name, help_text, fn))
+
+
+def render():
+    lines = []
+    with _lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in metric.samples():
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{metric.name}{{{label_text}}} {value}" if label_text else f"{metric.name} {value}")
+    return '\n'.join(lines) + '\n'
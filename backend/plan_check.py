@@ -0,0 +1,260 @@
+"""
+Query-plan regression check (SQLite).
+
+Loads generated data into a scratch database, drives the hot routes
+through the Flask test client, records every statement they issue (the
+sqlite3 trace callback, with parameters bound) and runs EXPLAIN QUERY PLAN
+on each. Plans are compared with the golden file plan_golden.json:
+
+    lost index       an index the golden plan used is no longer used
+    full scan        a new SCAN of a table without an index
+    temp B-tree      a new USE TEMP B-TREE (a sort, GROUP BY or DISTINCT)
+
+Any of these fails the check, as does a statement with no golden plan
+(new or edited SQL: review its plan, then record it). Routes marked strict
+(per-event staff pages, the roster and the write paths) may never scan or
+sort, whatever the golden file says.
+
+    python plan_check.py              # exit status 1 on a regression
+    python plan_check.py --update     # rewrite plan_golden.json from this run
+    python plan_check.py --show       # print every statement with its plan
+
+Plans are taken without ANALYZE statistics, as on a fresh deployment, so
+they do not depend on the generated data's exact shape.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plan_golden.json')
+
+EVENTS = 400
+STUDENTS = 3000
+REGISTRATIONS_PER_STUDENT = 6
+PAST_DAYS = 200
+ARCHIVE_BEFORE_DAYS = 90
+
+# (label, method, path, JSON body, strict). Paths are formatted with the
+# ids picked in load_data(); write paths use fresh ones so they succeed.
+ROUTES = [
+    ('staff registrations', 'GET', '/staff/registrations/{event_id}', None, True),
+    ('staff attendance', 'GET', '/staff/attendance/{event_id}', None, True),
+    ('event roster', 'GET', '/events/{event_id}/roster', None, True),
+    ('register', 'POST', '/register', {'student_id': '{new_student_id}', 'event_id': '{event_id}'}, True),
+    ('register again', 'POST', '/register', {'student_id': '{new_student_id}', 'event_id': '{event_id}'}, True),
+    ('register full event', 'POST', '/register', {'student_id': '{new_student_id}', 'event_id': '{full_event_id}'},
+     True),
+    ('mark attendance', 'POST', '/staff/attendance',
+     {'student_id': '{new_student_id}', 'event_id': '{event_id}', 'status': 'present'}, True),
+    ('cancel registration', 'DELETE', '/register', {'student_id': '{new_student_id}', 'event_id': '{event_id}'}, True),
+    ('staff events', 'GET', '/staff/events', None, False),
+    ('staff feedback', 'GET', '/staff/feedback', None, False),
+    ('event search', 'GET', '/events/search?when=upcoming&type=Workshop', None, False),
+    ('student timeline', 'GET', '/students/{student_id}/timeline', None, False),
+    ('student feedback', 'GET', '/students/{student_id}/feedback', None, False),
+    ('report registrations', 'GET', '/reports/registrations', None, False),
+    ('report attendance', 'GET', '/reports/attendance', None, False),
+    ('report feedback', 'GET', '/reports/feedback', None, False),
+    ('report event analysis', 'GET', '/reports/event_analysis', None, False),
+    ('report top students', 'GET', '/reports/top_students', None, False),
+    ('report events by type', 'GET', '/reports/events_by_type/Workshop', None, False),
+    ('report student analysis', 'GET', '/reports/student_analysis/{student_id}', None, False),
+    ('report student participation', 'GET', '/reports/student_participation/{student_id}', None, False),
+]
+
+EXPLAINED = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+INDEX_USED = re.compile(r"USING (?:COVERING )?INDEX (\w+)|USING (INTEGER PRIMARY KEY|PRIMARY KEY)")
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+def normalize(sql):
+    """Statement text with literals replaced, so the same SQL matches across runs"""
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = ' '.join(sql.split())
+    return PLACEHOLDER_LIST.sub('?, ...', sql)
+
+
+def load_data(db_path):
+    """Deterministic events, students, registrations, attendance and feedback; some of it archived"""
+    rng = random.Random(49)
+    today = date.today()
+    db = sqlite3.connect(db_path)
+    cursor = db.cursor()
+    cursor.executemany(
+        "INSERT INTO Events (event_id, college_id, name, type, date, capacity) VALUES (?, ?, ?, ?, ?, ?)",
+        [(i, f"C{i % 4}", f"Event {i}", rng.choice(('Workshop', 'Talk', 'Fest', 'Seminar')),
+          (today + timedelta(days=rng.randint(-PAST_DAYS, 60))).isoformat(), None)
+         for i in range(1, EVENTS + 1)]
+    )
+    cursor.executemany(
+        "INSERT INTO Students (student_id, college_id, name, email) VALUES (?, ?, ?, ?)",
+        [(i, f"C{i % 4}", f"Student {i}", f"student{i}@example.edu") for i in range(1, STUDENTS + 1)]
+    )
+    registrations = {(s, e) for s in range(1, STUDENTS + 1)
+                     for e in rng.sample(range(1, EVENTS + 1), REGISTRATIONS_PER_STUDENT)}
+    cursor.executemany("INSERT INTO Registrations (student_id, event_id) VALUES (?, ?)", sorted(registrations))
+    cursor.executemany("INSERT INTO Attendance (student_id, event_id, status) VALUES (?, ?, ?)",
+                       [(s, e, rng.choice(('present', 'present', 'absent')))
+                        for s, e in sorted(registrations) if rng.random() < 0.7])
+    cursor.executemany("INSERT INTO Feedback (student_id, event_id, rating, feedback_text) VALUES (?, ?, ?, ?)",
+                       [(s, e, rng.randint(1, 5), 'ok') for s, e in sorted(registrations) if rng.random() < 0.3])
+    cursor.execute("UPDATE Events SET seats_taken = (SELECT COUNT(*) FROM Registrations R "
+                   "WHERE R.event_id = Events.event_id)")
+    db.commit()
+
+    from archive import archive_events
+    archive_events(db, (today - timedelta(days=ARCHIVE_BEFORE_DAYS)).isoformat(), False)
+    cursor.execute("SELECT event_id FROM Registrations GROUP BY event_id ORDER BY COUNT(*) DESC LIMIT 2")
+    event_id, full_event_id = (row[0] for row in cursor.fetchall())
+    # A full event, so registering for it goes down the waitlist path
+    cursor.execute("UPDATE Events SET capacity = seats_taken WHERE event_id = ?", (full_event_id,))
+    db.commit()
+    db.close()
+    return {'event_id': event_id, 'full_event_id': full_event_id, 'student_id': 1, 'new_student_id': STUDENTS + 1}
+
+
+def fill(template, ids):
+    if isinstance(template, str):
+        value = template.format(**ids)
+        return int(value) if value.isdigit() and template.startswith('{') else value
+    if isinstance(template, dict):
+        return {key: fill(value, ids) for key, value in template.items()}
+    return template
+
+
+def collect(app, get_db, ids, headers):
+    """Run ROUTES; returns {label: [sql, ...]} in issue order, duplicates dropped"""
+    issued = []
+
+    @app.before_request
+    def record_statements():
+        get_db().set_trace_callback(issued.append)
+
+    # The write paths need a student of their own
+    db = sqlite3.connect('events.db')
+    db.execute("INSERT INTO Students (student_id, college_id, name, email) VALUES (?, 'C0', 'New', 'new@example.edu')",
+               (ids['new_student_id'],))
+    db.commit()
+    db.close()
+
+    client = app.test_client()
+    statements = {}
+    for label, method, path, body, _ in ROUTES:
+        issued.clear()
+        response = client.open(fill(path, ids), method=method, json=fill(body, ids), headers=headers)
+        if response.status_code >= 500:
+            raise SystemExit(f"{label}: {method} {path} returned {response.status_code}: "
+                             f"{response.get_data(as_text=True)[:300]}")
+        seen = statements.setdefault(label, [])
+        for sql in issued:
+            if sql.lstrip().upper().startswith(EXPLAINED) and sql not in seen:
+                seen.append(sql)
+    return statements
+
+
+def explain(db, sql):
+    return [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+def plan_facts(plan):
+    indexes, scans, temps = set(), set(), set()
+    for line in plan:
+        for match in INDEX_USED.finditer(line):
+            indexes.add(match.group(1) or match.group(2))
+        scan = FULL_SCAN.match(line)
+        if scan:
+            scans.add(scan.group(1))
+        if 'USE TEMP B-TREE' in line:
+            temps.add(line)
+    return indexes, scans, temps
+
+
+def check(current, golden, strict):
+    """Problems with one statement's plan, as strings"""
+    indexes, scans, temps = plan_facts(current)
+    problems = []
+    if golden is None:
+        problems.append("no golden plan (new or edited statement): review it and run --update")
+        golden_indexes, golden_scans, golden_temps = indexes, scans, temps
+    else:
+        golden_indexes, golden_scans, golden_temps = plan_facts(golden)
+    for name in sorted(golden_indexes - indexes):
+        problems.append(f"lost index {name}")
+    for table in sorted(scans if strict else scans - golden_scans):
+        problems.append(f"full scan of {table}")
+    for line in sorted(temps if strict else temps - golden_temps):
+        problems.append(line.lower().replace('use temp b-tree', 'temp B-tree'))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the query plans of the hot routes against plan_golden.json")
+    parser.add_argument('--update', action='store_true', help="Record this run's plans as the golden file")
+    parser.add_argument('--show', action='store_true', help="Print every statement and its plan")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, backend_dir)
+    # Scratch database: app.py opens events.db in the working directory
+    os.chdir(tempfile.mkdtemp(prefix='plan-check-'))
+    os.environ.update({
+        'USE_MYSQL': 'false', 'SHARDS': '', 'READ_REPLICAS': '', 'ADMISSION_CONTROL': 'false',
+        'SNAPSHOT_SCHEDULER': 'off', 'RECOMMEND_SCHEDULER': 'off', 'CACHE_BACKEND': 'off',
+        'TRACE_SAMPLE_RATE': '0',
+    })
+    from app import app, get_db, student_tokens
+
+    ids = load_data('events.db')
+    # Student-scoped routes answer only the student's own access token
+    headers = {'Authorization': f"Bearer {student_tokens.issue(ids['student_id'])}"}
+    statements = collect(app, get_db, ids, headers)
+
+    golden = {}
+    if os.path.exists(GOLDEN_FILE):
+        with open(GOLDEN_FILE) as f:
+            golden = json.load(f)
+
+    db = sqlite3.connect('events.db')
+    recorded, failures = {}, 0
+    for label, method, path, _, strict in ROUTES:
+        recorded[label] = {}
+        for sql in statements.get(label, []):
+            key = normalize(sql)
+            plan = explain(db, sql)
+            recorded[label][key] = plan
+            problems = [] if args.update else check(plan, golden.get(label, {}).get(key), strict)
+            if args.show or problems:
+                print(f"{'FAIL' if problems else 'ok  '} {label}: {key[:160]}")
+                for line in plan:
+                    print(f"       {line}")
+                for problem in problems:
+                    print(f"     ! {problem}")
+            failures += bool(problems)
+    db.close()
+
+    if args.update:
+        with open(GOLDEN_FILE, 'w') as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Recorded {sum(len(plans) for plans in recorded.values())} plans in {GOLDEN_FILE}")
+        return 0
+
+    stale = sum(1 for label, plans in golden.items() for key in plans if key not in recorded.get(label, {}))
+    total = sum(len(plans) for plans in recorded.values())
+    print(f"{total} statements checked, {failures} with plan regressions"
+          + (f", {stale} golden plans no longer issued (run --update)" if stale else ""))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
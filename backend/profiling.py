@@ -0,0 +1,208 @@
+"""
+On-demand profiling of live workers (standard library only).
+
+Everything is gated by ADMIN_TOKEN (sent as X-Admin-Token) and disabled
+while it is unset. Results are written to PROFILE_DIR on the worker's host.
+
+Single request: send `X-Profile: <mode>` with the request.
+
+    cpu      cProfile of the request         -> .pstats (snakeviz, pstats)
+    sample   stack sampler on its thread     -> .collapsed
+    memory   tracemalloc diff across it      -> .txt, top allocations by line
+
+Whole worker: POST /admin/profile {"mode": "sample" | "memory", "seconds": N}
+samples every thread of the worker that receives it (or diffs tracemalloc
+over the window) for N seconds, in the background.
+
+.collapsed files are in Brendan Gregg's folded format, one "frame;frame;...
+count" line per distinct stack, ready for flamegraph.pl or speedscope.
+Memory reports are named after the route, so runs of the same route sit
+next to each other.
+
+cProfile and tracemalloc are process-wide, so a worker runs one profile at a
+time; a request that asks while another is running is served unprofiled
+(X-Profile: busy).
+"""
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+REQUEST_MODES = ('cpu', 'sample', 'memory')
+WORKER_MODES = ('sample', 'memory')
+TOP_ALLOCATIONS = 25
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame, root=None):
+    """Folded stack for `frame`, outermost call first"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    if root:
+        labels.append(root)
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of one thread (or all but itself and `exclude`) every `interval` seconds"""
+
+    def __init__(self, interval, thread_id=None, exclude=()):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.exclude = set(exclude)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        self.exclude.add(threading.get_ident())
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self.exclude or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                root = names.get(thread_id, str(thread_id)) if self.thread_id is None else None
+                self.stacks[collapse(frame, root)] += 1
+            self.samples += 1
+
+
+class Profiler:
+    def __init__(self, directory, sample_interval=0.005, max_seconds=60):
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.max_seconds = max_seconds
+        self._busy = threading.Lock()
+
+    def _path(self, label, suffix):
+        os.makedirs(self.directory, exist_ok=True)
+        safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{safe}{suffix}"
+        return os.path.join(self.directory, name)
+
+    def _write_collapsed(self, path, stacks):
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def _write_memory_diff(self, path, title, before, after):
+        stats = after.compare_to(before, 'lineno')
+        with open(path, 'w') as f:
+            f.write(f"{title}\n")
+            f.write(f"Top {TOP_ALLOCATIONS} allocation changes by line:\n\n")
+            for stat in stats[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+
+    def _snapshot(self):
+        # Leave the profiler's own bookkeeping out of the diffs
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+
+    # Single request
+
+    def start_request(self, mode, route):
+        """Returns a handle for finish_request(), or None if another profile is running"""
+        if not self._busy.acquire(blocking=False):
+            return None
+        handle = {'mode': mode, 'route': route, 'started': time.perf_counter()}
+        try:
+            if mode == 'cpu':
+                handle['profile'] = cProfile.Profile()
+                handle['profile'].enable()
+            elif mode == 'sample':
+                handle['sampler'] = StackSampler(self.sample_interval, threading.get_ident()).start()
+            else:
+                handle['tracing'] = tracemalloc.is_tracing()
+                if not handle['tracing']:
+                    tracemalloc.start()
+                handle['before'] = self._snapshot()
+        except Exception:
+            self._busy.release()
+            raise
+        return handle
+
+    def finish_request(self, handle):
+        """Stop the profile and write it out; returns the file name"""
+        try:
+            mode, label = handle['mode'], f"{handle['route']}-{handle['mode']}"
+            elapsed = time.perf_counter() - handle['started']
+            if mode == 'cpu':
+                handle['profile'].disable()
+                path = self._path(label, '.pstats')
+                handle['profile'].dump_stats(path)
+            elif mode == 'sample':
+                path = self._path(label, '.collapsed')
+                self._write_collapsed(path, handle['sampler'].stop())
+            else:
+                after = self._snapshot()
+                if not handle['tracing']:
+                    tracemalloc.stop()
+                path = self._path(label, '.txt')
+                self._write_memory_diff(path, f"{handle['route']}: {elapsed * 1000:.1f} ms",
+                                        handle['before'], after)
+            return os.path.basename(path)
+        finally:
+            self._busy.release()
+
+    # Whole worker
+
+    def start_worker(self, mode, seconds):
+        """Profile the whole worker for `seconds` in the background; returns the file name, or None if busy"""
+        seconds = min(float(seconds), self.max_seconds)
+        if not self._busy.acquire(blocking=False):
+            return None
+        path = self._path(f"worker-{mode}", '.collapsed' if mode == 'sample' else '.txt')
+        threading.Thread(target=self._run_worker, args=(mode, seconds, path),
+                         name='profile-worker', daemon=True).start()
+        return os.path.basename(path)
+
+    def _run_worker(self, mode, seconds, path):
+        try:
+            if mode == 'sample':
+                sampler = StackSampler(self.sample_interval, exclude=(threading.get_ident(),)).start()
+                time.sleep(seconds)
+                self._write_collapsed(path, sampler.stop())
+                return
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start()
+            before = self._snapshot()
+            time.sleep(seconds)
+            after = self._snapshot()
+            if not was_tracing:
+                tracemalloc.stop()
+            self._write_memory_diff(path, f"worker {os.getpid()}: {seconds:g} s", before, after)
+        except Exception as e:
+            print(f"Worker profile failed: {e}")
+        finally:
+            self._busy.release()
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append({'name': name, 'size': stat.st_size, 'modified': stat.st_mtime})
+        return entries
@@ -0,0 +1,327 @@
+"""
+Event recommendations from co-attendance.
+
+Two events are related when the same students took part in both (a
+registration or a 'present' attendance row, hot or archived). For every
+event the index keeps its RECOMMEND_TOP_K most similar upcoming events by
+cosine similarity over those student sets:
+
+    sim(a, b) = students(a and b) / sqrt(students(a) * students(b))
+
+A student's recommendations are the upcoming events with the highest summed
+similarity to the events they took part in, minus those they already have;
+students with no history get the most popular upcoming events.
+
+RecommendationBuilder holds the sparse co-occurrence counts in memory. It is
+built once from every shard, then kept current from ChangeLog (see sync.py):
+each changed (student, event) pair is re-read and only the events whose
+top-k it can move are recomputed. New and deleted events are applied in
+place; an event moved between past and upcoming, or the date rolling over
+(upcoming events move into the past), triggers a full rebuild.
+
+The result is written as one file of packed arrays, sorted by event_id:
+
+    256-byte header   b"CEREC" + JSON {format, built_at, day, data_version,
+                      events, neighbors, popular}, space padded, ending "\\n"
+    event_ids  q[events]      dates  i[events] (YYYYMMDD)
+    offsets    I[events + 1]  into neighbors / scores
+    neighbors  q[neighbors]   scores f[neighbors], best first per event
+    popular    q[popular]
+
+Files are written to a temporary name and renamed into place. Workers map
+the file into arrays when its mtime changes; a lookup is a binary search on
+event_ids and a slice of at most top-k neighbors, with no SQL.
+
+One process maintains the index, as for report snapshots: the gunicorn
+worker holding RECOMMEND_DIR/scheduler.lock (RECOMMEND_SCHEDULER=thread), or
+this module run on its own (RECOMMEND_SCHEDULER=external):
+
+    python recommend.py            # update every RECOMMEND_INTERVAL seconds
+    python recommend.py --once     # build the index and exit
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+MAGIC = b'CEREC'
+FORMAT_VERSION = 1
+HEADER_SIZE = 256
+INDEX_FILE = 'index.bin'
+POPULAR_SIZE = 50
+
+
+def date_key(value):
+    """'YYYY-MM-DD' (or a date) -> YYYYMMDD as an int; 0 if missing"""
+    if value is None:
+        return 0
+    return int(str(value)[:10].replace('-', ''))
+
+
+class RecommendationBuilder:
+    def __init__(self, top_k):
+        self.top_k = top_k
+        self.day = None
+        self.data_version = None
+        self.dates = {}                     # event_id -> YYYYMMDD
+        self.students = defaultdict(set)    # student_id -> event_ids
+        self.counts = Counter()             # event_id -> students
+        self.co = defaultdict(Counter)      # event_id -> {event_id: shared students}, symmetric
+        self.neighbors = {}                 # event_id -> [(score, event_id)], best first
+
+    def _upcoming(self, event_id):
+        return self.dates.get(event_id, 0) >= self.day
+
+    # Full build
+
+    def build(self, day, events, pairs, data_version):
+        """events: (event_id, date) rows; pairs: (student_id, event_id) rows"""
+        self.__init__(self.top_k)
+        self.day, self.data_version = day, data_version
+        self.dates = {event_id: date_key(value) for event_id, value in events}
+        for student_id, event_id in pairs:
+            if event_id in self.dates:
+                self.students[student_id].add(event_id)
+        for taken in self.students.values():
+            upcoming = [e for e in taken if self._upcoming(e)]
+            for event_id in taken:
+                self.counts[event_id] += 1
+            # Only pairs with an upcoming side can ever be recommended
+            for a in upcoming:
+                for b in taken:
+                    if a != b:
+                        self.co[a][b] += 1
+                        if not self._upcoming(b):
+                            self.co[b][a] += 1
+        for event_id in self.dates:
+            self._rank(event_id)
+
+    # Incremental updates
+
+    def apply(self, events, changes, data_version):
+        """
+        events: {event_id: date, or None if deleted} for changed Events rows;
+        changes: (student_id, event_id, taken) for re-read pairs. Returns the
+        number of events whose neighbors were recomputed, or None when an
+        event moved between past and upcoming and a full build is needed.
+        """
+        deleted = []
+        for event_id, value in events.items():
+            if value is None:
+                deleted.append(event_id)
+            elif event_id not in self.dates:
+                self.dates[event_id] = date_key(value)
+            elif (date_key(value) >= self.day) != self._upcoming(event_id):
+                return None
+            else:
+                self.dates[event_id] = date_key(value)
+
+        dirty = set()
+        for student_id, event_id, taken in changes:
+            if event_id not in self.dates:
+                continue
+            history = self.students.get(student_id, set())
+            if taken == (event_id in history):
+                continue
+            step = 1 if taken else -1
+            history.discard(event_id)
+            for other in history:
+                if self._upcoming(event_id) or self._upcoming(other):
+                    self._add(event_id, other, step)
+                    self._add(other, event_id, step)
+            if taken:
+                history.add(event_id)
+                self.students[student_id] = history
+            elif not history:
+                del self.students[student_id]
+            self.counts[event_id] += step
+            # Its own list, the other events of this student, and every event
+            # whose similarity to it is normalised by its (new) count
+            dirty.add(event_id)
+            dirty.update(history)
+            dirty.update(self.co.get(event_id, ()))
+        for event_id in deleted:
+            # Whatever still points at it stops counting it as upcoming
+            self.dates.pop(event_id, None)
+            self.neighbors.pop(event_id, None)
+            dirty.update(self.co.get(event_id, ()))
+            dirty.discard(event_id)
+        for event_id in dirty:
+            self._rank(event_id)
+        self.data_version = data_version
+        return len(dirty)
+
+    def _add(self, a, b, step):
+        row = self.co[a]
+        row[b] += step
+        if row[b] <= 0:
+            del row[b]
+            if not row:
+                del self.co[a]
+
+    def _rank(self, event_id):
+        n = self.counts.get(event_id, 0)
+        row = self.co.get(event_id)
+        if not n or not row:
+            self.neighbors.pop(event_id, None)
+            return
+        scored = ((shared / math.sqrt(n * self.counts[other]), other)
+                  for other, shared in row.items() if self._upcoming(other))
+        best = heapq.nlargest(self.top_k, scored)
+        if best:
+            self.neighbors[event_id] = best
+        else:
+            self.neighbors.pop(event_id, None)
+
+    def popular(self):
+        upcoming = ((count, event_id) for event_id, count in self.counts.items()
+                    if count > 0 and self._upcoming(event_id))
+        return [event_id for _, event_id in heapq.nlargest(POPULAR_SIZE, upcoming)]
+
+    # Output
+
+    def write(self, directory):
+        """Write the packed index atomically. Returns the header."""
+        event_ids = array('q', sorted(self.dates))
+        dates = array('i', (self.dates[e] for e in event_ids))
+        offsets, neighbors, scores = array('I', [0]), array('q'), array('f')
+        for event_id in event_ids:
+            for score, other in self.neighbors.get(event_id, ()):
+                neighbors.append(other)
+                scores.append(score)
+            offsets.append(len(neighbors))
+        popular = array('q', self.popular())
+
+        header = {
+            'format': FORMAT_VERSION,
+            'built_at': time.time(),
+            'day': self.day,
+            'data_version': self.data_version,
+            'events': len(event_ids),
+            'neighbors': len(neighbors),
+            'popular': len(popular),
+        }
+        encoded = MAGIC + json.dumps(header).encode()
+        if len(encoded) >= HEADER_SIZE:
+            raise ValueError("Recommendation index header is too long")
+        encoded = encoded.ljust(HEADER_SIZE - 1) + b'\n'
+
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.index.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encoded)
+                for packed in (event_ids, dates, offsets, neighbors, scores, popular):
+                    packed.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(directory, INDEX_FILE))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return header
+
+
+class RecommendationIndex:
+    """Read side: the packed arrays of the current index file, reloaded when it changes"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, INDEX_FILE)
+        self.header = None
+        self._mtime = None
+        self._arrays = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime == self._mtime:
+            return self._arrays
+        with self._lock:
+            if mtime == self._mtime:
+                return self._arrays
+            with open(self.path, 'rb') as f:
+                raw = f.read(HEADER_SIZE)
+                if len(raw) != HEADER_SIZE or not raw.startswith(MAGIC):
+                    return self._arrays
+                header = json.loads(raw[len(MAGIC):])
+                if header.get('format') != FORMAT_VERSION:
+                    return self._arrays
+                arrays = []
+                for typecode, length in (('q', header['events']), ('i', header['events']),
+                                         ('I', header['events'] + 1), ('q', header['neighbors']),
+                                         ('f', header['neighbors']), ('q', header['popular'])):
+                    packed = array(typecode)
+                    packed.fromfile(f, length)
+                    arrays.append(packed)
+            self.header, self._arrays, self._mtime = header, tuple(arrays), mtime
+            return self._arrays
+
+    def ready(self):
+        return self._load() is not None
+
+    def recommend(self, history, today, limit):
+        """
+        Upcoming event_ids (dated today or later) ranked by summed similarity
+        to `history`, as [(event_id, score)]. None if there is no index yet.
+        """
+        arrays = self._load()
+        if arrays is None:
+            return None
+        event_ids, dates, offsets, neighbors, scores, popular = arrays
+        taken = set(history)
+        ranked = defaultdict(float)
+        for event_id in taken:
+            i = bisect_left(event_ids, event_id)
+            if i == len(event_ids) or event_ids[i] != event_id:
+                continue
+            for j in range(offsets[i], offsets[i + 1]):
+                if neighbors[j] not in taken:
+                    ranked[neighbors[j]] += scores[j]
+
+        def upcoming(event_id):
+            i = bisect_left(event_ids, event_id)
+            return i < len(event_ids) and event_ids[i] == event_id and dates[i] >= today
+
+        best = heapq.nlargest(limit * 2, ranked.items(), key=lambda item: item[1])
+        picked = [(event_id, round(score, 4)) for event_id, score in best if upcoming(event_id)][:limit]
+        if len(picked) < limit:
+            seen = taken | {event_id for event_id, _ in picked}
+            for event_id in popular:
+                if event_id not in seen and upcoming(event_id):
+                    picked.append((event_id, 0.0))
+                    if len(picked) == limit:
+                        break
+        return picked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the event recommendation index")
+    parser.add_argument('--once', action='store_true', help="Build the index and exit")
+    args = parser.parse_args()
+
+    from app import refresh_recommendations, RECOMMEND_INTERVAL
+    while True:
+        header = refresh_recommendations()
+        if header is not None:
+            print(f"{header['events']} events, {header['neighbors']} neighbors, "
+                  f"data_version {header['data_version']}")
+        if args.once:
+            return
+        time.sleep(RECOMMEND_INTERVAL)
+
+
+if __name__ == '__main__':
+    main()
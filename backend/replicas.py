@@ -0,0 +1,128 @@
+"""
+Read-replica selection for GET traffic.
+
+READ_REPLICAS is a comma separated list. With MySQL each entry is
+``host[:port]`` and reuses the MYSQL_CONFIG credentials and database; with
+SQLite each entry is a file path (handy for testing with a copied
+events.db).
+
+Lag is measured per replica and cached for REPLICA_LAG_CHECK_INTERVAL
+seconds: ``Seconds_Behind_Source`` on MySQL, and for SQLite how far the
+replica file's mtime trails the primary's. Replicas that are further behind
+than REPLICA_MAX_LAG, report no lag at all (replication stopped) or fail
+to connect are skipped until the next check, and reads go to the primary.
+"""
+import os
+import random
+import sqlite3
+import time
+
+
+class ReplicaSet:
+    def __init__(self, spec='', use_mysql=False, mysql_config=None, primary_path='events.db',
+                 max_lag=5.0, check_interval=2.0):
+        self.use_mysql = use_mysql
+        self.mysql_config = mysql_config or {}
+        self.primary_path = primary_path
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas = [part.strip() for part in (spec or '').split(',') if part.strip()]
+        # index -> (checked_at, lag seconds or None when unusable)
+        self._lag = {}
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def connect(self, index):
+        entry = self.replicas[index]
+        if self.use_mysql:
+            import pymysql
+            host, _, port = entry.partition(':')
+            params = dict(self.mysql_config, host=host)
+            if port:
+                params['port'] = int(port)
+            return pymysql.connect(**params, connect_timeout=2)
+        if not os.path.exists(entry):
+            raise FileNotFoundError(entry)
+        # Read-only: a replica must never take writes
+        return sqlite3.connect(f"file:{entry}?mode=ro", uri=True)
+
+    def measure_lag(self, index, db):
+        """Replication lag in seconds, or None if the replica is not replicating"""
+        if self.use_mysql:
+            cursor = db.cursor()
+            try:
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                except Exception:
+                    cursor.execute("SHOW SLAVE STATUS")
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                status = dict(zip([d[0] for d in cursor.description], row))
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+                return None if lag is None else float(lag)
+            finally:
+                cursor.close()
+        try:
+            primary_mtime = os.path.getmtime(self.primary_path)
+        except OSError:
+            return 0.0
+        return max(0.0, primary_mtime - os.path.getmtime(self.replicas[index]))
+
+    def usable(self, index):
+        """True unless the last lag check (still fresh) ruled the replica out"""
+        checked = self._lag.get(index)
+        if checked is None or time.monotonic() - checked[0] > self.check_interval:
+            return True
+        lag = checked[1]
+        return lag is not None and lag <= self.max_lag
+
+    def needs_check(self, index):
+        checked = self._lag.get(index)
+        return checked is None or time.monotonic() - checked[0] > self.check_interval
+
+    def record(self, index, lag):
+        self._lag[index] = (time.monotonic(), lag)
+
+    def mark_failed(self, index):
+        self.record(index, None)
+
+    def open(self):
+        """
+        Connect to a usable replica, checking lag when the cached value is
+        stale. Returns (index, connection) or (None, None) to use the primary.
+        """
+        candidates = [i for i in range(len(self.replicas)) if self.usable(i)]
+        random.shuffle(candidates)
+        for index in candidates:
+            try:
+                db = self.connect(index)
+            except Exception as e:
+                print(f"Replica {self.replicas[index]} unavailable: {e}")
+                self.mark_failed(index)
+                continue
+            if self.needs_check(index):
+                try:
+                    lag = self.measure_lag(index, db)
+                except Exception as e:
+                    print(f"Replica {self.replicas[index]} lag check failed: {e}")
+                    lag = None
+                self.record(index, lag)
+                if lag is None or lag > self.max_lag:
+                    db.close()
+                    continue
+            return index, db
+        return None, None
+
+    def status(self):
+        result = []
+        for index, entry in enumerate(self.replicas):
+            checked = self._lag.get(index)
+            result.append({
+                'replica': entry,
+                'lag_seconds': checked[1] if checked else None,
+                'usable': self.usable(index),
+            })
+        return result
@@ -0,0 +1,179 @@
+"""
+Seat allocation for events with a capacity.
+
+A seat is claimed with one conditional UPDATE on the event row, in the same
+transaction as the Registrations INSERT:
+
+    UPDATE Events SET seats_taken = seats_taken + 1
+    WHERE event_id = ? AND (capacity IS NULL OR seats_taken < capacity)
+
+The row lock (MySQL) / write lock (SQLite) taken by that UPDATE is the only
+synchronisation needed: there is no SELECT-then-INSERT window, so
+concurrent registrations can never oversell. When the UPDATE matches no row
+the event is full (or missing) and the student joins the Waitlist instead.
+Removing a registration hands the seat straight to the head of the waitlist.
+
+Every function here runs on a caller-supplied cursor and leaves commit /
+rollback to the caller.
+"""
+import sqlite3
+import sys
+
+
+def integrity_errors():
+    """
+    Duplicate-key exception types for `except integrity_errors():`. The
+    expression is evaluated when an exception is raised, so PyMySQL is only
+    listed (and never imported here) once something has loaded it.
+    """
+    pymysql = sys.modules.get('pymysql')
+    if pymysql is None:
+        return (sqlite3.IntegrityError,)
+    return (sqlite3.IntegrityError, pymysql.err.IntegrityError)
+
+REGISTERED = 'registered'
+WAITLISTED = 'waitlisted'
+ALREADY_REGISTERED = 'already_registered'
+ALREADY_WAITLISTED = 'already_waitlisted'
+EVENT_NOT_FOUND = 'event_not_found'
+
+
+def _sql(query, use_mysql):
+    return query if use_mysql else query.replace('%s', '?')
+
+
+def _exists(cursor, query, params, use_mysql):
+    cursor.execute(_sql(query, use_mysql), params)
+    return cursor.fetchone() is not None
+
+
+def waitlist_position(cursor, student_id, event_id, use_mysql):
+    cursor.execute(_sql("""
+        SELECT COUNT(*) FROM Waitlist
+        WHERE event_id = %s AND waitlist_id <= (
+            SELECT waitlist_id FROM Waitlist WHERE event_id = %s AND student_id = %s
+        )
+    """, use_mysql), (event_id, event_id, student_id))
+    return cursor.fetchone()[0]
+
+
+def claim_seat(cursor, student_id, event_id, use_mysql):
+    """
+    Register a student, or waitlist them if the event is full.
+    Returns (outcome, waitlist_position or None).
+    """
+    cursor.execute(_sql("""
+        UPDATE Events SET seats_taken = seats_taken + 1
+        WHERE event_id = %s AND (capacity IS NULL OR seats_taken < capacity)
+    """, use_mysql), (event_id,))
+
+    if cursor.rowcount == 1:
+        try:
+            cursor.execute(_sql(
+                "INSERT INTO Registrations (student_id, event_id) VALUES (%s, %s)", use_mysql
+            ), (student_id, event_id))
+        except integrity_errors():
+            # Give the seat back so the caller can still commit safely
+            cursor.execute(_sql(
+                "UPDATE Events SET seats_taken = seats_taken - 1 WHERE event_id = %s", use_mysql
+            ), (event_id,))
+            return ALREADY_REGISTERED, None
+        return REGISTERED, None
+
+    # Slow path: only reached when the event is full or missing
+    if not _exists(cursor, "SELECT 1 FROM Events WHERE event_id = %s", (event_id,), use_mysql):
+        return EVENT_NOT_FOUND, None
+    if _exists(cursor, "SELECT 1 FROM Registrations WHERE student_id = %s AND event_id = %s",
+               (student_id, event_id), use_mysql):
+        return ALREADY_REGISTERED, None
+    try:
+        cursor.execute(_sql(
+            "INSERT INTO Waitlist (student_id, event_id) VALUES (%s, %s)", use_mysql
+        ), (student_id, event_id))
+        outcome = WAITLISTED
+    except integrity_errors():
+        outcome = ALREADY_WAITLISTED
+    return outcome, waitlist_position(cursor, student_id, event_id, use_mysql)
+
+
+def promote_waitlisted(cursor, event_id, use_mysql):
+    """
+    Give one free seat to the head of the waitlist. The seat is already
+    counted in seats_taken, so nothing is incremented here. Returns the
+    promoted student_id, or None if the waitlist is empty.
+    """
+    while True:
+        cursor.execute(_sql("""
+            SELECT waitlist_id, student_id FROM Waitlist
+            WHERE event_id = %s
+            ORDER BY waitlist_id
+            LIMIT 1
+        """, use_mysql), (event_id,))
+        head = cursor.fetchone()
+        if head is None:
+            return None
+        waitlist_id, student_id = head[0], head[1]
+        cursor.execute(_sql("DELETE FROM Waitlist WHERE waitlist_id = %s", use_mysql), (waitlist_id,))
+        if cursor.rowcount == 0:
+            # Another request promoted this entry first; try the next one
+            continue
+        try:
+            cursor.execute(_sql(
+                "INSERT INTO Registrations (student_id, event_id) VALUES (%s, %s)", use_mysql
+            ), (student_id, event_id))
+        except integrity_errors():
+            # Registered some other way in the meantime; skip them
+            continue
+        return student_id
+
+
+def release_seat(cursor, student_id, event_id, use_mysql):
+    """
+    Remove a registration (or waitlist entry). A freed seat goes to the head
+    of the waitlist. Returns (removed, promoted_student_id).
+    """
+    cursor.execute(_sql(
+        "DELETE FROM Registrations WHERE student_id = %s AND event_id = %s", use_mysql
+    ), (student_id, event_id))
+    if cursor.rowcount == 0:
+        cursor.execute(_sql(
+            "DELETE FROM Waitlist WHERE student_id = %s AND event_id = %s", use_mysql
+        ), (student_id, event_id))
+        return cursor.rowcount > 0, None
+
+    promoted = promote_waitlisted(cursor, event_id, use_mysql)
+    if promoted is None:
+        cursor.execute(_sql(
+            "UPDATE Events SET seats_taken = seats_taken - 1 WHERE event_id = %s AND seats_taken > 0",
+            use_mysql
+        ), (event_id,))
+    return True, promoted
+
+
+def set_capacity(cursor, event_id, capacity, use_mysql):
+    """
+    Change an event's capacity (None = unlimited) and promote waitlisted
+    students into any seats that opened up. Returns promoted student_ids,
+    or None if the event does not exist.
+    """
+    cursor.execute(_sql("UPDATE Events SET capacity = %s WHERE event_id = %s", use_mysql), (capacity, event_id))
+    if cursor.rowcount == 0 and not _exists(cursor, "SELECT 1 FROM Events WHERE event_id = %s",
+                                            (event_id,), use_mysql):
+        return None
+
+    promoted = []
+    while True:
+        cursor.execute(_sql("""
+            UPDATE Events SET seats_taken = seats_taken + 1
+            WHERE event_id = %s AND (capacity IS NULL OR seats_taken < capacity)
+              AND EXISTS (SELECT 1 FROM Waitlist W WHERE W.event_id = %s)
+        """, use_mysql), (event_id, event_id))
+        if cursor.rowcount == 0:
+            return promoted
+        student_id = promote_waitlisted(cursor, event_id, use_mysql)
+        if student_id is None:
+            cursor.execute(_sql(
+                "UPDATE Events SET seats_taken = seats_taken - 1 WHERE event_id = %s", use_mysql
+            ), (event_id,))
+            return promoted
+        promoted.append(student_id)
@@ -0,0 +1,252 @@
+"""
+Recurring event series.
+
+A series is a definition (name, type, college, capacity, recurrence rule,
+start date) in EventSeries; its occurrences are ordinary Events rows
+carrying series_id, so every existing route works on them unchanged.
+
+Recurrence rules are a subset of RFC 5545 RRULE:
+
+    FREQ=DAILY|WEEKLY|MONTHLY      required
+    INTERVAL=n                     every n days / weeks / months (default 1)
+    BYDAY=MO,WE,...                WEEKLY only (default: the start weekday)
+    COUNT=n | UNTIL=YYYY-MM-DD     one of them is required
+
+    FREQ=WEEKLY;BYDAY=TU,TH;UNTIL=2026-12-18
+
+Everything that touches a whole series is set-based and runs in the
+caller's transaction: occurrences are inserted with one executemany(),
+registrations are carried over with one INSERT ... SELECT per student
+(skipping occurrences with a waitlist), and edits are single UPDATE
+statements over `series_id = ? AND date >= ?` (idx_events_series). Cancellations delete the matching Events rows in the
+transaction and their child rows afterwards, in batches (see deletion.py).
+"""
+from datetime import date, datetime, timedelta
+
+from deletion import delete_event_rows
+
+MAX_OCCURRENCES = 260
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+EDITABLE_FIELDS = ('name', 'type', 'capacity')
+
+
+def create_series_schema(cursor):
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS EventSeries (
+                series_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                college_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL,
+                rule TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                capacity INTEGER NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+    except Exception:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS EventSeries (
+                series_id INT AUTO_INCREMENT PRIMARY KEY,
+                college_id VARCHAR(100) NOT NULL,
+                name VARCHAR(255) NOT NULL,
+                type VARCHAR(100) NOT NULL,
+                rule VARCHAR(255) NOT NULL,
+                start_date DATE NOT NULL,
+                capacity INT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+
+def _sql(query, use_mysql):
+    return query if use_mysql else query.replace('%s', '?')
+
+
+def _parse_date(value):
+    value = value.replace('-', '')[:8]
+    return datetime.strptime(value, '%Y%m%d').date()
+
+
+def parse_rule(rule):
+    """RRULE text -> dict, or raise ValueError"""
+    if not isinstance(rule, str) or not rule.strip():
+        raise ValueError('rule is required')
+    text = rule.strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+    parts = {}
+    for part in text.split(';'):
+        if not part:
+            continue
+        key, sep, value = part.partition('=')
+        if not sep:
+            raise ValueError(f"Invalid rule part '{part}'")
+        parts[key.strip().upper()] = value.strip()
+
+    freq = parts.pop('FREQ', '').upper()
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    parsed = {'freq': freq, 'interval': 1, 'byday': None, 'count': None, 'until': None}
+    try:
+        if 'INTERVAL' in parts:
+            parsed['interval'] = int(parts.pop('INTERVAL'))
+        if 'COUNT' in parts:
+            parsed['count'] = int(parts.pop('COUNT'))
+        if 'UNTIL' in parts:
+            parsed['until'] = _parse_date(parts.pop('UNTIL'))
+    except ValueError:
+        raise ValueError('INTERVAL and COUNT must be integers, UNTIL a date')
+    if 'BYDAY' in parts:
+        if freq != 'WEEKLY':
+            raise ValueError('BYDAY is only supported with FREQ=WEEKLY')
+        days = [d.strip().upper() for d in parts.pop('BYDAY').split(',')]
+        if not days or any(d not in WEEKDAYS for d in days):
+            raise ValueError(f"BYDAY takes {','.join(WEEKDAYS)}")
+        parsed['byday'] = sorted({WEEKDAYS.index(d) for d in days})
+    if parts:
+        raise ValueError(f"Unsupported rule parts: {', '.join(sorted(parts))}")
+    if parsed['interval'] < 1:
+        raise ValueError('INTERVAL must be at least 1')
+    if (parsed['count'] is None) == (parsed['until'] is None):
+        raise ValueError('Exactly one of COUNT or UNTIL is required')
+    if parsed['count'] is not None and not 1 <= parsed['count'] <= MAX_OCCURRENCES:
+        raise ValueError(f'COUNT must be between 1 and {MAX_OCCURRENCES}')
+    return parsed
+
+
+def _candidates(rule, start):
+    """Dates matching the rule from `start` on, ascending (unbounded)"""
+    step = 0
+    while True:
+        if rule['freq'] == 'DAILY':
+            yield start + timedelta(days=step * rule['interval'])
+        elif rule['freq'] == 'WEEKLY':
+            week = start - timedelta(days=start.weekday()) + timedelta(weeks=step * rule['interval'])
+            for weekday in rule['byday'] or [start.weekday()]:
+                day = week + timedelta(days=weekday)
+                if day >= start:
+                    yield day
+        else:
+            months = start.month - 1 + step * rule['interval']
+            try:
+                # Months without this day (the 31st, Feb 29) are skipped, as in RFC 5545
+                yield date(start.year + months // 12, months % 12 + 1, start.day)
+            except ValueError:
+                pass
+        step += 1
+
+
+def expand(rule, start_date):
+    """Occurrence dates ('YYYY-MM-DD') of a parsed rule, or raise ValueError"""
+    start = _parse_date(start_date)
+    dates = []
+    for day in _candidates(rule, start):
+        if rule['until'] is not None and day > rule['until']:
+            break
+        dates.append(day.isoformat())
+        if len(dates) == rule['count']:
+            break
+        if len(dates) > MAX_OCCURRENCES:
+            raise ValueError(f'The rule expands to more than {MAX_OCCURRENCES} occurrences')
+    if not dates:
+        raise ValueError('The rule has no occurrences')
+    return dates
+
+
+def create_occurrences(cursor, series_id, series, dates, use_mysql, event_ids=None):
+    """Insert one Events row per date with a single executemany()"""
+    columns = ('college_id', 'name', 'type', 'date', 'capacity', 'series_id')
+    rows = [(series['college_id'], series['name'], series['type'], day, series['capacity'], series_id)
+            for day in dates]
+    if event_ids is not None:
+        columns = ('event_id',) + columns
+        rows = [(event_id,) + row for event_id, row in zip(event_ids, rows)]
+    placeholders = ', '.join(['%s'] * len(columns))
+    cursor.executemany(_sql(f"INSERT INTO Events ({', '.join(columns)}) VALUES ({placeholders})", use_mysql), rows)
+
+
+def occurrences(cursor, series_id, use_mysql):
+    cursor.execute(_sql("""
+        SELECT event_id, date, name, type, capacity, seats_taken
+        FROM Events WHERE series_id = %s ORDER BY date, event_id
+    """, use_mysql), (series_id,))
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def update_occurrences(cursor, series_id, changes, from_date, use_mysql):
+    """
+    Apply {name, type, capacity} to the series and every occurrence dated
+    from_date or later. Returns (events updated, event_ids among them with
+    a waitlist): the caller promotes into seats a larger capacity opened.
+    """
+    assignments = ', '.join(f"{field} = %s" for field in changes)
+    values = tuple(changes.values())
+    cursor.execute(_sql(f"UPDATE EventSeries SET {assignments} WHERE series_id = %s", use_mysql),
+                   values + (series_id,))
+    cursor.execute(_sql(f"UPDATE Events SET {assignments} WHERE series_id = %s AND date >= %s", use_mysql),
+                   values + (series_id, from_date))
+    updated = cursor.rowcount
+    waitlisted = []
+    if 'capacity' in changes:
+        cursor.execute(_sql("""
+            SELECT DISTINCT E.event_id FROM Events E
+            JOIN Waitlist W ON W.event_id = E.event_id
+            WHERE E.series_id = %s AND E.date >= %s
+        """, use_mysql), (series_id, from_date))
+        waitlisted = [row[0] for row in cursor.fetchall()]
+    return updated, waitlisted
+
+
+def cancel_occurrences(cursor, series_id, from_date, use_mysql):
+    """
+    Delete occurrences dated from_date or later (None: all of them). Returns
+    their event_ids; once this commits, the caller deletes their child rows
+    in batches (deletion.delete_children).
+    """
+    where, params = "series_id = %s", (series_id,)
+    if from_date is not None:
+        where, params = "series_id = %s AND date >= %s", (series_id, from_date)
+    cursor.execute(_sql(f"SELECT event_id FROM Events WHERE {where}", use_mysql), params)
+    event_ids = [row[0] for row in cursor.fetchall()]
+    delete_event_rows(cursor, event_ids, use_mysql)
+    return event_ids
+
+
+def carry_over_registrations(cursor, series_id, student_ids, from_date, use_mysql):
+    """
+    Register each student for every occurrence dated from_date or later that
+    has a free seat, no waitlist and no registration of theirs yet: one
+    INSERT ... SELECT per student, run as a single executemany(). Seats of
+    an occurrence with a waitlist belong to the students queued for it (see
+    seats.py), so it is skipped. Waitlist entries the students still hold
+    for occurrences they are registered for are dropped first. seats_taken
+    is then recounted for the affected occurrences. Returns the rows inserted.
+    """
+    cursor.executemany(_sql("""
+        DELETE FROM Waitlist
+        WHERE student_id = %s AND event_id IN (
+            SELECT R.event_id FROM Registrations R
+            JOIN Events E ON E.event_id = R.event_id
+            WHERE R.student_id = %s AND E.series_id = %s AND E.date >= %s
+        )
+    """, use_mysql), [(student_id, student_id, series_id, from_date) for student_id in student_ids])
+    cursor.executemany(_sql("""
+        INSERT INTO Registrations (student_id, event_id)
+        SELECT %s, E.event_id FROM Events E
+        WHERE E.series_id = %s AND E.date >= %s
+          AND NOT EXISTS (SELECT 1 FROM Registrations R WHERE R.event_id = E.event_id AND R.student_id = %s)
+          AND NOT EXISTS (SELECT 1 FROM Waitlist W WHERE W.event_id = E.event_id)
+          AND (E.capacity IS NULL OR
+               (SELECT COUNT(*) FROM Registrations R WHERE R.event_id = E.event_id) < E.capacity)
+    """, use_mysql), [(student_id, series_id, from_date, student_id) for student_id in student_ids])
+    added = cursor.rowcount
+    cursor.execute(_sql("""
+        UPDATE Events SET seats_taken = (
+            SELECT COUNT(*) FROM Registrations R WHERE R.event_id = Events.event_id
+        )
+        WHERE series_id = %s AND date >= %s
+    """, use_mysql), (series_id, from_date))
+    return added
@@ -0,0 +1,187 @@
+"""
+Per-college shard routing.
+
+Colleges listed in SHARDS get their own SQLite file (or their own MySQL
+database on the MYSQL_CONFIG server); every other college stays on the
+default database. Spec format, comma separated:
+
+    <college_id>=<shard_no>:<target>
+
+e.g. ``SHARDS="MIT=1:shards/mit.db,IITB=2:shards/iitb.db"`` (SQLite) or
+``SHARDS="MIT=1:campus_events_mit"`` (MySQL). Several colleges may share a
+shard number as long as they also share the target. Shard numbers must stay
+stable once data has been written, because they are encoded into IDs.
+
+IDs: event_id and student_id are allocated as
+``SHARD_ID_FLOOR + seq * SHARD_ID_STRIDE + shard_no`` from a per-shard
+ShardSequence row, so they never collide across shards and any ID can be
+routed back to its shard without a lookup. IDs below SHARD_ID_FLOOR are
+legacy rows and always live on the default shard. A floor at or below an
+existing legacy ID would route that row to the wrong shard and let new IDs
+collide with it, so the app refuses to start (see legacy_ids_above_floor).
+"""
+import os
+import sqlite3
+
+DEFAULT_SHARD = 'default'
+
+# Tables whose IDs are routed on and therefore allocated by the router
+SEQUENCED_TABLES = ('Events', 'Students', 'EventSeries')
+ID_COLUMNS = {'Events': 'event_id', 'Students': 'student_id', 'EventSeries': 'series_id'}
+
+
+class ShardRouter:
+    def __init__(self, spec='', use_mysql=False, mysql_config=None, id_stride=100, id_floor=0):
+        self.use_mysql = use_mysql
+        self.mysql_config = mysql_config or {}
+        self.id_stride = id_stride
+        self.id_floor = id_floor
+        self.colleges = {}                      # college_id -> shard name
+        self.numbers = {DEFAULT_SHARD: 0}       # shard name -> shard number
+        self.targets = {DEFAULT_SHARD: None}    # shard name -> file / database
+        self._by_number = {0: DEFAULT_SHARD}
+
+        for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+            try:
+                college_id, rest = entry.split('=', 1)
+                number, target = rest.split(':', 1)
+                number = int(number)
+            except ValueError:
+                raise ValueError(f"Invalid SHARDS entry '{entry}' (expected college=no:target)")
+            if not 0 < number < id_stride:
+                raise ValueError(f"Shard number for '{college_id}' must be between 1 and {id_stride - 1}")
+            name = f"shard{number}"
+            if self.targets.get(name, target) != target:
+                raise ValueError(f"Shard {number} is mapped to two different targets")
+            self.colleges[college_id.strip()] = name
+            self.numbers[name] = number
+            self.targets[name] = target.strip()
+            self._by_number[number] = name
+
+    @property
+    def enabled(self):
+        return len(self.numbers) > 1
+
+    @property
+    def shards(self):
+        """All shard names, default first"""
+        return [self._by_number[n] for n in sorted(self._by_number)]
+
+    def for_college(self, college_id):
+        return self.colleges.get(college_id, DEFAULT_SHARD)
+
+    def for_id(self, entity_id):
+        """Shard holding an event_id / student_id allocated by this router"""
+        if not self.enabled:
+            return DEFAULT_SHARD
+        entity_id = int(entity_id)
+        if entity_id < self.id_floor:
+            return DEFAULT_SHARD
+        return self._by_number.get((entity_id - self.id_floor) % self.id_stride, DEFAULT_SHARD)
+
+    def connect(self, shard):
+        """Open a new connection to a non-default shard"""
+        target = self.targets[shard]
+        if self.use_mysql:
+            import pymysql
+            params = dict(self.mysql_config, db=target, database=target)
+            return pymysql.connect(**params)
+        directory = os.path.dirname(target)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return sqlite3.connect(target)
+
+    def connect_for_init(self, shard):
+        """Like connect(), but creates the MySQL database first if allowed"""
+        if not self.use_mysql:
+            return self.connect(shard)
+        import pymysql
+        target = self.targets[shard]
+        params = {k: v for k, v in self.mysql_config.items() if k not in ('db', 'database')}
+        db = pymysql.connect(**params, connect_timeout=5)
+        cursor = db.cursor()
+        try:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{target}`")
+        except Exception:
+            pass
+        cursor.execute(f"USE `{target}`")
+        return db
+
+    def sql(self, query):
+        return query if self.use_mysql else query.replace('%s', '?')
+
+    def create_sequences(self, cursor):
+        """Create and seed the ShardSequence table on one shard"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ShardSequence (
+                name VARCHAR(64) PRIMARY KEY,
+                next_value INTEGER NOT NULL
+            )
+        """)
+        for table in SEQUENCED_TABLES:
+            try:
+                cursor.execute(self.sql("INSERT INTO ShardSequence (name, next_value) VALUES (%s, 0)"), (table,))
+            except Exception:
+                # Already seeded
+                pass
+
+    def allocate_id(self, cursor, shard, table):
+        """
+        Reserve the next ID for `table` on `shard`. Must run inside the same
+        transaction as the INSERT that uses it: the UPDATE holds the
+        sequence row lock (MySQL) / write lock (SQLite) until commit.
+        """
+        return self.allocate_ids(cursor, shard, table, 1)[0]
+
+    def allocate_ids(self, cursor, shard, table, count):
+        """Reserve `count` consecutive sequence values at once (same rules as allocate_id)"""
+        cursor.execute(self.sql("UPDATE ShardSequence SET next_value = next_value + %s WHERE name = %s"),
+                       (count, table))
+        cursor.execute(self.sql("SELECT next_value FROM ShardSequence WHERE name = %s"), (table,))
+        row = cursor.fetchone()
+        if row is None:
+            raise RuntimeError(f"ShardSequence is not seeded for {table} on {shard}")
+        first = row[0] - count + 1
+        return [self.id_floor + (first + i) * self.id_stride + self.numbers[shard] for i in range(count)]
+
+    def legacy_ids_above_floor(self, cursor):
+        """
+        {table: rows} of rows on the default database with an ID at or above
+        id_floor that this router did not allocate there (IDs it allocates
+        are id_floor + seq * id_stride, seq up to ShardSequence.next_value).
+        Empty when the floor is safe.
+        """
+        found = {}
+        for table in SEQUENCED_TABLES:
+            column = ID_COLUMNS[table]
+            try:
+                cursor.execute(self.sql("SELECT next_value FROM ShardSequence WHERE name = %s"), (table,))
+                row = cursor.fetchone()
+                allocated = row[0] if row else 0
+            except Exception:
+                # Sharding was never enabled on this database
+                allocated = 0
+            remainder = f"MOD({column} - %s, %s)" if self.use_mysql else f"({column} - %s) % %s"
+            cursor.execute(self.sql(
+                f"SELECT COUNT(*) FROM {table} WHERE {column} >= %s AND ({remainder} <> 0 OR {column} > %s)"
+            ), (self.id_floor, self.id_floor, self.id_stride, self.id_floor + allocated * self.id_stride))
+            count = cursor.fetchone()[0]
+            if count:
+                found[table] = count
+        return found
+
+
+def merge_rows(row_sets, key=None, reverse=False, limit=None):
+    """
+    Merge per-shard result lists. Rows for one event/student only ever come
+    from one shard, so per-shard GROUP BY results can simply be concatenated
+    and re-sorted. NULLs sort first ascending / last descending like SQL.
+    """
+    if len(row_sets) == 1:
+        rows = row_sets[0]
+    else:
+        rows = [row for rows in row_sets for row in rows]
+        if key is not None:
+            keys = key if isinstance(key, (list, tuple)) else (key,)
+            rows.sort(key=lambda r: tuple((r[k] is not None, r[k]) for k in keys), reverse=reverse)
+    return rows[:limit] if limit is not None else rows
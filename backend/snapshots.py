@@ -0,0 +1,181 @@
+"""
+Precomputed report snapshots.
+
+Each parameterless report (/reports/registrations, /attendance, /feedback,
+/event_analysis, /top_students) is kept as a file in SNAPSHOT_DIR:
+
+    256-byte header   b"CESNAP" + JSON {format, report, data_version,
+                      generated_at, etag, length}, space padded, ending "\\n"
+    body              the JSON response, gzip-compressed
+
+Files are written to a temporary name and renamed into place, so readers
+always see a complete snapshot. Routes send the gzip body straight from
+the file (sendfile under gunicorn) with Content-Encoding: gzip and an ETag.
+
+data_version is the ChangeLog seq of every shard (see sync.py), so a
+snapshot is rebuilt as soon as the data it was built from changes, and at
+least every SNAPSHOT_MAX_AGE seconds for changes the log does not cover.
+Routes compare it with the current seq before serving, and recompute a
+report whose snapshot is behind instead of waiting for the scheduler.
+
+One process refreshes the snapshots: the gunicorn worker that wins a
+flock() on SNAPSHOT_DIR/scheduler.lock (SNAPSHOT_SCHEDULER=thread), or a
+separate process running this module (SNAPSHOT_SCHEDULER=external):
+
+    python snapshots.py            # refresh every SNAPSHOT_INTERVAL seconds
+    python snapshots.py --once     # refresh what is out of date and exit
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker refreshes (writes are still atomic)
+    fcntl = None
+
+MAGIC = b'CESNAP'
+FORMAT_VERSION = 1
+HEADER_SIZE = 256
+
+
+class SnapshotStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.json.gz.snap")
+
+    def write(self, name, payload, data_version):
+        """Store `payload` (JSON bytes) atomically. Returns the header."""
+        body = gzip.compress(payload, compresslevel=6, mtime=0)
+        header = {
+            'format': FORMAT_VERSION,
+            'report': name,
+            'data_version': data_version,
+            'generated_at': time.time(),
+            'etag': hashlib.sha1(payload).hexdigest()[:20],
+            'length': len(body),
+        }
+        encoded = MAGIC + json.dumps(header).encode()
+        if len(encoded) >= HEADER_SIZE:
+            raise ValueError(f"Snapshot header for {name} is too long")
+        encoded = encoded.ljust(HEADER_SIZE - 1) + b'\n'
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encoded)
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path(name))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return header
+
+    @staticmethod
+    def _parse_header(raw):
+        if len(raw) != HEADER_SIZE or not raw.startswith(MAGIC):
+            return None
+        try:
+            header = json.loads(raw[len(MAGIC):])
+        except ValueError:
+            return None
+        return header if header.get('format') == FORMAT_VERSION else None
+
+    def open(self, name):
+        """(header, file positioned at the gzip body), or None if missing / unreadable"""
+        try:
+            f = open(self.path(name), 'rb')
+        except FileNotFoundError:
+            return None
+        header = self._parse_header(f.read(HEADER_SIZE))
+        if header is None:
+            f.close()
+            return None
+        return header, f
+
+    def header(self, name):
+        opened = self.open(name)
+        if opened is None:
+            return None
+        opened[1].close()
+        return opened[0]
+
+
+class SnapshotScheduler:
+    """Background refresher; only the worker holding the lock file does any work"""
+
+    def __init__(self, directory, refresh, interval, name='snapshot'):
+        self.name = name
+        self.lock_path = os.path.join(directory, 'scheduler.lock')
+        self.refresh = refresh
+        self.interval = interval
+        self.leader = False
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        # Threads do not survive fork(): start one per worker on first use
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.leader = False
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-scheduler', daemon=True)
+            self._thread.start()
+
+    def _try_lead(self, fd):
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _run(self):
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        while True:
+            if not self.leader:
+                self.leader = self._try_lead(fd)
+            if self.leader:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"{self.name.capitalize()} refresh failed: {e}")
+            time.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh report snapshots")
+    parser.add_argument('--once', action='store_true', help="Refresh out-of-date snapshots and exit")
+    parser.add_argument('--force', action='store_true', help="Rebuild every snapshot")
+    args = parser.parse_args()
+
+    from app import refresh_snapshots, SNAPSHOT_INTERVAL
+    while True:
+        for name, header in refresh_snapshots(force=args.force).items():
+            print(f"{name}: data_version {header['data_version']}, {header['length']} bytes")
+        if args.once:
+            return
+        args.force = False
+        time.sleep(SNAPSHOT_INTERVAL)
+
+
+if __name__ == '__main__':
+    main()
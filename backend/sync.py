@@ -0,0 +1,343 @@
+"""
+Offline sync for the mobile app.
+
+ChangeLog is an append-only list of (seq, table, event_id, student_id, op)
+rows written by triggers on every synced table, so each mutation (from any
+route, the archive job or a console) is logged in its own transaction with
+a monotonic seq.
+
+GET /sync?since=<seq> returns the current state of every row changed after
+seq (or its key, if it was deleted), and the seq to ask for next time.
+POST /sync applies a batch of queued offline actions in one transaction,
+each under its own savepoint so one bad action doesn't undo the others.
+
+The triggers are required: without them nothing is ever logged and every
+reader of ChangeLog (sync deltas, ETags, snapshot and recommendation
+versions) silently serves stale data, so a trigger that cannot be created
+(typically MySQL with binary logging and no SUPER or
+log_bin_trust_function_creators) fails schema setup, and the app refuses to
+start while missing_triggers() reports any.
+
+Retention: prune_changelog() drops entries older than a cutoff that a later
+entry for the same row supersedes, plus old delete entries. since=0 still
+returns every live row, but a client whose `since` is below the newest
+dropped delete entry (ChangeLogHorizon) could miss that delete and must sync
+again from 0 (GET /sync answers 410). Run it on every shard, e.g. daily:
+
+    python sync.py --prune-older-than-days 30
+"""
+import argparse
+import sqlite3
+
+from seats import claim_seat, release_seat, integrity_errors, REGISTERED, WAITLISTED, \
+    ALREADY_REGISTERED, ALREADY_WAITLISTED, EVENT_NOT_FOUND
+
+# Client-facing name -> (table, key columns)
+SYNC_TABLES = {
+    'events': ('Events', ('event_id',)),
+    'registrations': ('Registrations', ('student_id', 'event_id')),
+    'attendance': ('Attendance', ('student_id', 'event_id')),
+    'feedback': ('Feedback', ('student_id', 'event_id')),
+    'waitlist': ('Waitlist', ('student_id', 'event_id')),
+}
+
+MAX_ACTIONS = 200
+
+# MySQL hands out AUTO_INCREMENT values before commit, so a lower seq can
+# become visible after a higher one. Never advance a client past changes
+# younger than this; they are sent again next time instead of being missed.
+MYSQL_SETTLE_SECONDS = 2
+
+PRUNE_BATCH_SIZE = 1000
+
+
+def _sql(query, use_mysql):
+    return query if use_mysql else query.replace('%s', '?')
+
+
+def create_changelog(cursor):
+    """ChangeLog table plus insert/update/delete triggers on the synced tables"""
+    is_sqlite = isinstance(cursor, sqlite3.Cursor)
+    if is_sqlite:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ChangeLog (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                event_id INTEGER,
+                student_id INTEGER,
+                op TEXT NOT NULL,
+                changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ChangeLog (
+                seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+                table_name VARCHAR(32) NOT NULL,
+                event_id INT,
+                student_id INT,
+                op VARCHAR(8) NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    # Newest delete entry prune_changelog() has dropped (one row, 0 = none)
+    cursor.execute("CREATE TABLE IF NOT EXISTS ChangeLogHorizon (seq BIGINT NOT NULL)")
+    cursor.execute("SELECT COUNT(*) FROM ChangeLogHorizon")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("INSERT INTO ChangeLogHorizon (seq) VALUES (0)")
+
+    failed = []
+    for name, timing, table, insert in _triggers():
+        try:
+            if is_sqlite:
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {timing} ON {table} "
+                               f"BEGIN {insert}; END")
+            else:
+                cursor.execute(f"CREATE TRIGGER {name} AFTER {timing} ON {table} FOR EACH ROW {insert}")
+        except Exception as e:
+            if 'already exists' not in str(e):
+                failed.append(f"{name}: {e}")
+    if failed:
+        raise RuntimeError("Could not create ChangeLog triggers (" + '; '.join(failed) + ")")
+
+
+def _triggers():
+    """(name, timing, table, INSERT INTO ChangeLog statement) of every ChangeLog trigger"""
+    for table, keys in SYNC_TABLES.values():
+        for timing, op, row in (('INSERT', 'upsert', 'NEW'), ('UPDATE', 'upsert', 'NEW'), ('DELETE', 'delete', 'OLD')):
+            event_id = f"{row}.event_id"
+            student_id = f"{row}.student_id" if 'student_id' in keys else 'NULL'
+            insert = (f"INSERT INTO ChangeLog (table_name, event_id, student_id, op) "
+                      f"VALUES ('{table}', {event_id}, {student_id}, '{op}')")
+            yield f"trg_changelog_{table.lower()}_{timing.lower()}", timing, table, insert
+
+
+def missing_triggers(cursor, use_mysql):
+    """Names of ChangeLog triggers the database does not have"""
+    if use_mysql:
+        cursor.execute("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()")
+    else:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    present = {row[0].lower() for row in cursor.fetchall()}
+    return [name for name, _, _, _ in _triggers() if name not in present]
+
+
+def changelog_horizon(cursor):
+    """Lowest `since` that GET /sync still answers exactly (see prune_changelog)"""
+    cursor.execute("SELECT MAX(seq) FROM ChangeLogHorizon")
+    return cursor.fetchone()[0] or 0
+
+
+def prune_changelog(db, older_than_days, use_mysql, batch_size=PRUNE_BATCH_SIZE):
+    """
+    Delete ChangeLog entries older than `older_than_days` that are either
+    superseded by a later entry for the same row or record a delete,
+    `batch_size` per transaction. The newest dropped delete entry becomes
+    the horizon. Returns the rows deleted.
+    """
+    cursor = db.cursor()
+    try:
+        if use_mysql:
+            cursor.execute("SELECT MAX(seq) FROM ChangeLog WHERE changed_at < NOW() - INTERVAL %s DAY",
+                           (older_than_days,))
+        else:
+            cursor.execute("SELECT MAX(seq) FROM ChangeLog WHERE changed_at < datetime('now', ?)",
+                           (f"-{int(older_than_days)} days",))
+        cutoff = cursor.fetchone()[0]
+        deleted = 0
+        if cutoff is None:
+            return deleted
+        while True:
+            cursor.execute(_sql("""
+                SELECT C.seq, C.op FROM ChangeLog C
+                WHERE C.seq <= %s AND (C.op = 'delete' OR EXISTS (
+                    SELECT 1 FROM ChangeLog L
+                    WHERE L.table_name = C.table_name AND L.event_id = C.event_id AND L.seq > C.seq
+                      AND (L.student_id = C.student_id OR (L.student_id IS NULL AND C.student_id IS NULL))
+                ))
+                ORDER BY C.seq
+                LIMIT %s
+            """, use_mysql), (cutoff, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return deleted
+            seqs = tuple(row[0] for row in rows)
+            deletes = [row[0] for row in rows if row[1] == 'delete']
+            try:
+                cursor.execute(_sql(f"DELETE FROM ChangeLog WHERE seq IN ({', '.join(['%s'] * len(seqs))})",
+                                    use_mysql), seqs)
+                if deletes:
+                    cursor.execute(_sql("UPDATE ChangeLogHorizon SET seq = %s WHERE seq < %s", use_mysql),
+                                   (max(deletes), max(deletes)))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            deleted += len(seqs)
+    finally:
+        cursor.close()
+
+
+def current_seq(cursor):
+    cursor.execute("SELECT MAX(seq) FROM ChangeLog")
+    return cursor.fetchone()[0] or 0
+
+
+def changes_since(cursor, since, tables, use_mysql, student_id=None, limit=500):
+    """
+    Rows changed after `since` for the requested client table names.
+    With student_id, per-student tables are limited to that student
+    (events are always included). Returns the response payload.
+    """
+    names = [SYNC_TABLES[t][0] for t in tables]
+    conditions = ["seq > %s", f"table_name IN ({', '.join(['%s'] * len(names))})"]
+    params = [since, *names]
+    if student_id is not None:
+        conditions.append("(student_id = %s OR table_name = 'Events')")
+        params.append(student_id)
+
+    # Latest change per row, oldest first
+    cursor.execute(_sql(f"""
+        SELECT table_name, event_id, student_id, MAX(seq) AS seq
+        FROM ChangeLog
+        WHERE {' AND '.join(conditions)}
+        GROUP BY table_name, event_id, student_id
+        ORDER BY seq
+        LIMIT {int(limit) + 1}
+    """, use_mysql), tuple(params))
+    changed = cursor.fetchall()
+    has_more = len(changed) > limit
+    changed = changed[:limit]
+
+    next_since = changed[-1][3] if changed else since
+    if use_mysql and changed:
+        cursor.execute(_sql(f"""
+            SELECT MIN(seq) FROM ChangeLog
+            WHERE seq > %s AND changed_at > NOW() - INTERVAL {MYSQL_SETTLE_SECONDS} SECOND
+        """, use_mysql), (since,))
+        unsettled = cursor.fetchone()[0]
+        if unsettled is not None:
+            next_since = min(next_since, unsettled - 1)
+
+    result = {}
+    for client_name in tables:
+        table, keys = SYNC_TABLES[client_name]
+        wanted = [(row[1], row[2]) for row in changed if row[0] == table]
+        result[client_name] = {'upserts': [], 'deletes': []}
+        if not wanted:
+            continue
+
+        if keys == ('event_id',):
+            marks = ', '.join(['%s'] * len(wanted))
+            cursor.execute(_sql(f"SELECT * FROM {table} WHERE event_id IN ({marks})", use_mysql),
+                           tuple(event_id for event_id, _ in wanted))
+        else:
+            pairs = ' OR '.join(['(student_id = %s AND event_id = %s)'] * len(wanted))
+            cursor.execute(_sql(f"SELECT * FROM {table} WHERE {pairs}", use_mysql),
+                           tuple(v for event_id, sid in wanted for v in (sid, event_id)))
+        columns = [d[0] for d in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        present = {tuple(row[k] for k in keys) for row in rows}
+        result[client_name]['upserts'] = rows
+        for event_id, sid in wanted:
+            key = (event_id,) if keys == ('event_id',) else (sid, event_id)
+            if key not in present:
+                result[client_name]['deletes'].append(dict(zip(keys, key)))
+
+    return {'changes': result, 'next_since': next_since, 'has_more': has_more}
+
+
+def _apply(cursor, action, use_mysql, attendance_upsert_sql):
+    kind = action.get('type')
+    student_id = action.get('student_id')
+    event_id = action.get('event_id')
+    if not all([kind, student_id, event_id]):
+        return {'status': 'error', 'error': 'Missing data'}
+
+    if kind == 'register':
+        outcome, position = claim_seat(cursor, student_id, event_id, use_mysql)
+        if outcome == REGISTERED:
+            return {'status': 'ok'}
+        if outcome in (WAITLISTED, ALREADY_WAITLISTED):
+            return {'status': 'waitlisted', 'waitlist_position': position}
+        if outcome == ALREADY_REGISTERED:
+            return {'status': 'duplicate'}
+        if outcome == EVENT_NOT_FOUND:
+            return {'status': 'error', 'error': 'Event not found'}
+
+    if kind == 'unregister':
+        removed, promoted = release_seat(cursor, student_id, event_id, use_mysql)
+        return {'status': 'ok' if removed else 'not_found', 'promoted_student_id': promoted}
+
+    if kind == 'feedback':
+        rating = action.get('rating')
+        if not isinstance(rating, int) or not 1 <= rating <= 5:
+            return {'status': 'error', 'error': 'Rating must be between 1 and 5'}
+        try:
+            cursor.execute(_sql(
+                "INSERT INTO Feedback (student_id, event_id, rating, feedback_text) VALUES (%s, %s, %s, %s)",
+                use_mysql
+            ), (student_id, event_id, rating, action.get('feedback_text')))
+        except integrity_errors():
+            return {'status': 'duplicate'}
+        return {'status': 'ok'}
+
+    if kind == 'attendance':
+        status = action.get('status', 'present')
+        if status not in ('present', 'absent'):
+            return {'status': 'error', 'error': "status must be 'present' or 'absent'"}
+        cursor.execute(attendance_upsert_sql, (student_id, event_id, status))
+        return {'status': 'ok'}
+
+    return {'status': 'error', 'error': f"Unknown action type '{kind}'"}
+
+
+def apply_actions(cursor, actions, use_mysql, attendance_upsert_sql):
+    """
+    Apply queued offline actions in order on one transaction. Each action
+    runs under a savepoint; a failure rolls back only that action. Nothing
+    is committed here: the caller's commit or rollback covers the batch.
+    """
+    if not use_mysql and not cursor.connection.in_transaction:
+        # sqlite3 only opens a transaction before INSERT/UPDATE/DELETE, and an
+        # outermost SAVEPOINT is a transaction of its own that RELEASE commits
+        cursor.execute("BEGIN IMMEDIATE")
+    results = []
+    for index, action in enumerate(actions):
+        savepoint = f"sync_action_{index}"
+        cursor.execute(f"SAVEPOINT {savepoint}")
+        try:
+            result = _apply(cursor, action, use_mysql, attendance_upsert_sql)
+        except Exception as e:
+            result = {'status': 'error', 'error': str(e)}
+        if result['status'] == 'error':
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+        cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+        if not use_mysql and not cursor.connection.in_transaction:
+            raise RuntimeError(f"{savepoint} committed on release: the batch is not in a transaction")
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune old ChangeLog entries")
+    parser.add_argument('--prune-older-than-days', type=int, required=True,
+                        help="Drop superseded and delete entries older than N days")
+    parser.add_argument('--batch-size', type=int, default=PRUNE_BATCH_SIZE, help="Rows per transaction")
+    args = parser.parse_args()
+
+    from app import app, get_db, shard_router, USE_MYSQL
+    with app.app_context():
+        for shard in shard_router.shards:
+            db = get_db(shard)
+            deleted = prune_changelog(db, args.prune_older_than_days, USE_MYSQL, args.batch_size)
+            cursor = db.cursor()
+            try:
+                print(f"{shard}: pruned {deleted} ChangeLog entries, sync horizon {changelog_horizon(cursor)}")
+            finally:
+                cursor.close()
+
+
+if __name__ == '__main__':
+    main()
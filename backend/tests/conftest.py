@@ -0,0 +1,77 @@
+"""
+Shared fixtures. app.py reads its settings and creates events.db in the
+working directory when it is imported, so the suite imports it once, on
+SQLite, from a scratch directory that stays the working directory for the
+whole session.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix='campus-events-tests-')
+os.environ.update({
+    'USE_MYSQL': 'false',
+    'SHARDS': '',
+    'READ_REPLICAS': '',
+    'ADMISSION_CONTROL': 'false',
+    'SNAPSHOT_SCHEDULER': 'off',
+    'CACHE_BACKEND': 'off',
+    'RECOMMEND_SCHEDULER': 'off',
+    'TRACE_SAMPLE_RATE': '0',
+})
+os.chdir(WORK_DIR)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def app_db(app_module):
+    """Connection to the database the app's routes use"""
+    db = sqlite3.connect(os.path.join(WORK_DIR, 'events.db'), timeout=30)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def db_path(app_module, tmp_path):
+    """A fresh database file with the full schema"""
+    path = str(tmp_path / 'events.db')
+    db = sqlite3.connect(path)
+    app_module.ensure_schema(db)
+    db.close()
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    db = sqlite3.connect(db_path, timeout=30)
+    yield db
+    db.close()
+
+
+def add_event(cursor, capacity=None, date='2030-01-15', series_id=None, name='Workshop'):
+    cursor.execute(
+        "INSERT INTO Events (college_id, name, type, date, capacity, series_id) VALUES (?, ?, ?, ?, ?, ?)",
+        ('C1', name, 'workshop', date, capacity, series_id)
+    )
+    return cursor.lastrowid
+
+
+def count(cursor, query, params=()):
+    cursor.execute(query, params)
+    return cursor.fetchone()[0]
@@ -0,0 +1,65 @@
+from conftest import add_event, count
+from deletion import ARCHIVE_TABLES, CHILD_TABLES, delete_events, find_orphans, purge_orphans
+
+TABLES = CHILD_TABLES + ARCHIVE_TABLES + ('EventSummary',)
+
+
+def attach_rows(cursor, event_id, students=range(1, 6)):
+    """Child, archived and summary rows for event_id"""
+    for student_id in students:
+        for table in ('Registrations', 'RegistrationsArchive'):
+            cursor.execute(f"INSERT INTO {table} (student_id, event_id) VALUES (?, ?)", (student_id, event_id))
+        for table in ('Attendance', 'AttendanceArchive'):
+            cursor.execute(f"INSERT INTO {table} (student_id, event_id, status) VALUES (?, ?, 'present')",
+                           (student_id, event_id))
+        for table in ('Feedback', 'FeedbackArchive'):
+            cursor.execute(f"INSERT INTO {table} (student_id, event_id, rating) VALUES (?, ?, 4)",
+                           (student_id, event_id))
+        cursor.execute("INSERT INTO Waitlist (student_id, event_id) VALUES (?, ?)", (student_id + 100, event_id))
+    cursor.execute("INSERT INTO EventSummary (event_id, registered) VALUES (?, 5)", (event_id,))
+
+
+def rows_for(cursor, event_id):
+    return {table: count(cursor, f"SELECT COUNT(*) FROM {table} WHERE event_id = ?", (event_id,))
+            for table in TABLES}
+
+
+def test_delete_events_leaves_no_child_rows(db):
+    cursor = db.cursor()
+    doomed = [add_event(cursor) for _ in range(2)]
+    kept = add_event(cursor)
+    for event_id in doomed + [kept]:
+        attach_rows(cursor, event_id)
+    db.commit()
+
+    # A small batch size makes every table take several batches
+    deleted, counts = delete_events(db, doomed, False, batch_size=3)
+
+    assert deleted == 2
+    assert counts['Registrations'] == 10 and counts['archived'] == 30
+    assert count(cursor, "SELECT COUNT(*) FROM Events WHERE event_id IN (?, ?)", tuple(doomed)) == 0
+    for event_id in doomed:
+        assert set(rows_for(cursor, event_id).values()) == {0}
+    assert set(rows_for(cursor, kept).values()) == {1, 5}
+    assert find_orphans(db, False) == {}
+
+
+def test_purge_orphans_leaves_no_child_rows(db):
+    cursor = db.cursor()
+    kept = add_event(cursor)
+    attach_rows(cursor, kept)
+    # Rows left behind by an event deleted without its children
+    attach_rows(cursor, 9001)
+    attach_rows(cursor, 9002, students=(1,))
+    db.commit()
+
+    assert set(find_orphans(db, False)) == set(TABLES)
+
+    counts = purge_orphans(db, False, batch_size=2)
+
+    assert counts['EventSummary'] == 2 and counts['Registrations'] == 6
+    assert find_orphans(db, False) == {}
+    for event_id in (9001, 9002):
+        assert set(rows_for(cursor, event_id).values()) == {0}
+    assert set(rows_for(cursor, kept).values()) == {1, 5}
+    assert purge_orphans(db, False) == {}
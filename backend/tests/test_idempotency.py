@@ -0,0 +1,53 @@
+import uuid
+
+from conftest import count
+
+
+def post_event(client, key, name='Hackathon'):
+    return client.post('/events', headers={'Idempotency-Key': key},
+                       json={'college_id': 'C1', 'name': name, 'type': 'hackathon', 'date': '2030-03-01'})
+
+
+def test_replay_returns_the_stored_response(client, app_db):
+    key = str(uuid.uuid4())
+    first = post_event(client, key)
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+
+    replay = post_event(client, key)
+    assert replay.status_code == 201
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_data() == first.get_data()
+
+    event_id = first.get_json()['event_id']
+    assert count(app_db.cursor(), "SELECT COUNT(*) FROM Events WHERE event_id = ?", (event_id,)) == 1
+
+
+def test_replay_does_not_run_the_route_again(client, app_db):
+    key = str(uuid.uuid4())
+    name = f"Once {key}"
+    post_event(client, key, name)
+    post_event(client, key, name)
+    assert count(app_db.cursor(), "SELECT COUNT(*) FROM Events WHERE name = ?", (name,)) == 1
+
+
+def test_key_reused_for_a_different_request(client):
+    key = str(uuid.uuid4())
+    assert post_event(client, key, 'First').status_code == 201
+    assert post_event(client, key, 'Second').status_code == 422
+
+
+def test_server_error_is_not_stored(client, app_module, monkeypatch):
+    key = str(uuid.uuid4())
+    insert_with_id = app_module.insert_with_id
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(app_module, 'insert_with_id', fail)
+    assert post_event(client, key).status_code == 500
+
+    monkeypatch.setattr(app_module, 'insert_with_id', insert_with_id)
+    retry = post_event(client, key)
+    assert retry.status_code == 201
+    assert 'Idempotent-Replayed' not in retry.headers
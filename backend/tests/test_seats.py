@@ -0,0 +1,114 @@
+import sqlite3
+import threading
+
+from conftest import add_event, count
+from seats import (ALREADY_REGISTERED, EVENT_NOT_FOUND, REGISTERED, WAITLISTED,
+                   claim_seat, release_seat, set_capacity)
+
+
+def seats_taken(cursor, event_id):
+    return count(cursor, "SELECT seats_taken FROM Events WHERE event_id = ?", (event_id,))
+
+
+def test_full_event_waitlists_instead_of_overselling(db):
+    cursor = db.cursor()
+    event_id = add_event(cursor, capacity=2)
+
+    assert claim_seat(cursor, 1, event_id, False) == (REGISTERED, None)
+    assert claim_seat(cursor, 2, event_id, False) == (REGISTERED, None)
+    assert claim_seat(cursor, 3, event_id, False) == (WAITLISTED, 1)
+    assert claim_seat(cursor, 4, event_id, False) == (WAITLISTED, 2)
+
+    assert seats_taken(cursor, event_id) == 2
+    assert count(cursor, "SELECT COUNT(*) FROM Registrations WHERE event_id = ?", (event_id,)) == 2
+
+
+def test_duplicate_claim_keeps_one_seat(db):
+    cursor = db.cursor()
+    event_id = add_event(cursor, capacity=5)
+
+    assert claim_seat(cursor, 1, event_id, False) == (REGISTERED, None)
+    assert claim_seat(cursor, 1, event_id, False) == (ALREADY_REGISTERED, None)
+    assert seats_taken(cursor, event_id) == 1
+
+
+def test_missing_event(db):
+    assert claim_seat(db.cursor(), 1, 999, False) == (EVENT_NOT_FOUND, None)
+
+
+def test_release_promotes_waitlist_head(db):
+    cursor = db.cursor()
+    event_id = add_event(cursor, capacity=1)
+    claim_seat(cursor, 1, event_id, False)
+    claim_seat(cursor, 2, event_id, False)
+    claim_seat(cursor, 3, event_id, False)
+
+    assert release_seat(cursor, 1, event_id, False) == (True, 2)
+    assert seats_taken(cursor, event_id) == 1
+    cursor.execute("SELECT student_id FROM Registrations WHERE event_id = ?", (event_id,))
+    assert [row[0] for row in cursor.fetchall()] == [2]
+    cursor.execute("SELECT student_id FROM Waitlist WHERE event_id = ?", (event_id,))
+    assert [row[0] for row in cursor.fetchall()] == [3]
+
+
+def test_release_with_empty_waitlist_frees_the_seat(db):
+    cursor = db.cursor()
+    event_id = add_event(cursor, capacity=1)
+    claim_seat(cursor, 1, event_id, False)
+
+    assert release_seat(cursor, 1, event_id, False) == (True, None)
+    assert seats_taken(cursor, event_id) == 0
+    assert claim_seat(cursor, 2, event_id, False) == (REGISTERED, None)
+
+
+def test_release_of_waitlist_entry_keeps_seats(db):
+    cursor = db.cursor()
+    event_id = add_event(cursor, capacity=1)
+    claim_seat(cursor, 1, event_id, False)
+    claim_seat(cursor, 2, event_id, False)
+
+    assert release_seat(cursor, 2, event_id, False) == (True, None)
+    assert release_seat(cursor, 2, event_id, False) == (False, None)
+    assert seats_taken(cursor, event_id) == 1
+
+
+def test_raising_capacity_promotes_in_order(db):
+    cursor = db.cursor()
+    event_id = add_event(cursor, capacity=1)
+    for student_id in (1, 2, 3, 4):
+        claim_seat(cursor, student_id, event_id, False)
+
+    assert set_capacity(cursor, event_id, 3, False) == [2, 3]
+    assert seats_taken(cursor, event_id) == 3
+    assert count(cursor, "SELECT COUNT(*) FROM Waitlist WHERE event_id = ?", (event_id,)) == 1
+
+
+def test_concurrent_claims_never_oversell(db, db_path):
+    cursor = db.cursor()
+    event_id = add_event(cursor, capacity=5)
+    db.commit()
+
+    outcomes = []
+    start = threading.Barrier(20)
+
+    def register(student_id):
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            start.wait()
+            outcome, _ = claim_seat(conn.cursor(), student_id, event_id, False)
+            conn.commit()
+            outcomes.append(outcome)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=register, args=(student_id,)) for student_id in range(1, 21)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count(REGISTERED) == 5
+    assert outcomes.count(WAITLISTED) == 15
+    assert seats_taken(cursor, event_id) == 5
+    assert count(cursor, "SELECT COUNT(*) FROM Registrations WHERE event_id = ?", (event_id,)) == 5
+    assert count(cursor, "SELECT COUNT(*) FROM Waitlist WHERE event_id = ?", (event_id,)) == 15
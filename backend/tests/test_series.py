@@ -0,0 +1,66 @@
+from conftest import count
+from seats import claim_seat
+from series import carry_over_registrations, create_occurrences, occurrences
+
+SERIES = {'college_id': 'C1', 'name': 'Reading group', 'type': 'club', 'capacity': 2}
+DATES = ['2030-02-04', '2030-02-11', '2030-02-18', '2030-02-25']
+
+
+def registered(cursor, student_id):
+    cursor.execute("""
+        SELECT E.date FROM Registrations R JOIN Events E ON E.event_id = R.event_id
+        WHERE R.student_id = ? ORDER BY E.date
+    """, (student_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def make_series(db):
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO EventSeries (college_id, name, type, rule, start_date, capacity) "
+                   "VALUES ('C1', 'Reading group', 'club', 'FREQ=WEEKLY;COUNT=4', ?, 2)", (DATES[0],))
+    series_id = cursor.lastrowid
+    create_occurrences(cursor, series_id, SERIES, DATES, False)
+    return cursor, series_id, [row['event_id'] for row in occurrences(cursor, series_id, False)]
+
+
+def test_carry_over_skips_occurrences_with_a_waitlist(db):
+    cursor, series_id, event_ids = make_series(db)
+    # Fill the second occurrence and queue a student for it
+    for student_id in (1, 2, 3):
+        claim_seat(cursor, student_id, event_ids[1], False)
+
+    added = carry_over_registrations(cursor, series_id, [10], DATES[0], False)
+
+    assert added == 3
+    assert registered(cursor, 10) == [DATES[0], DATES[2], DATES[3]]
+    cursor.execute("SELECT student_id FROM Waitlist WHERE event_id = ?", (event_ids[1],))
+    assert [row[0] for row in cursor.fetchall()] == [3]
+
+
+def test_carry_over_skips_a_waitlist_with_free_seats(db):
+    cursor, series_id, event_ids = make_series(db)
+    # A seat was freed but the queued student has not been promoted yet
+    cursor.execute("INSERT INTO Waitlist (student_id, event_id) VALUES (5, ?)", (event_ids[2],))
+
+    carry_over_registrations(cursor, series_id, [10], DATES[0], False)
+
+    assert DATES[2] not in registered(cursor, 10)
+
+
+def test_carry_over_respects_capacity_and_recounts_seats(db):
+    cursor, series_id, event_ids = make_series(db)
+
+    assert carry_over_registrations(cursor, series_id, [10, 11, 12], DATES[0], False) == 8
+
+    for event_id in event_ids:
+        assert count(cursor, "SELECT COUNT(*) FROM Registrations WHERE event_id = ?", (event_id,)) == 2
+        assert count(cursor, "SELECT seats_taken FROM Events WHERE event_id = ?", (event_id,)) == 2
+    assert registered(cursor, 12) == []
+
+
+def test_carry_over_from_date_and_existing_registrations(db):
+    cursor, series_id, event_ids = make_series(db)
+    claim_seat(cursor, 10, event_ids[3], False)
+
+    assert carry_over_registrations(cursor, series_id, [10], DATES[2], False) == 1
+    assert registered(cursor, 10) == [DATES[2], DATES[3]]
@@ -0,0 +1,80 @@
+import pytest
+
+import sync
+from conftest import add_event, count
+
+
+@pytest.fixture
+def events(app_db):
+    cursor = app_db.cursor()
+    event_ids = [add_event(cursor, capacity=10, name=f"Sync {n}") for n in range(3)]
+    app_db.commit()
+    return event_ids
+
+
+def registrations(app_db, event_id):
+    return count(app_db.cursor(), "SELECT COUNT(*) FROM Registrations WHERE event_id = ?", (event_id,))
+
+
+def seats_taken(app_db, event_id):
+    return count(app_db.cursor(), "SELECT seats_taken FROM Events WHERE event_id = ?", (event_id,))
+
+
+def test_failing_action_rolls_back_only_its_savepoint(client, app_db, events, monkeypatch):
+    first, failing, last = events
+    claim_seat = sync.claim_seat
+
+    def claim_then_fail(cursor, student_id, event_id, use_mysql):
+        outcome = claim_seat(cursor, student_id, event_id, use_mysql)
+        if event_id == failing:
+            # The seat and the registration are written before this
+            raise RuntimeError('connection lost mid-action')
+        return outcome
+
+    monkeypatch.setattr(sync, 'claim_seat', claim_then_fail)
+    response = client.post('/sync', json={'actions': [
+        {'id': 'a', 'type': 'register', 'student_id': 7, 'event_id': first},
+        {'id': 'b', 'type': 'register', 'student_id': 7, 'event_id': failing},
+        {'id': 'c', 'type': 'register', 'student_id': 7, 'event_id': last},
+    ]})
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['id'] for r in results] == ['a', 'b', 'c']
+    assert [r['status'] for r in results] == ['ok', 'error', 'ok']
+    assert 'connection lost' in results[1]['error']
+
+    assert registrations(app_db, first) == 1 and seats_taken(app_db, first) == 1
+    assert registrations(app_db, failing) == 0 and seats_taken(app_db, failing) == 0
+    assert registrations(app_db, last) == 1 and seats_taken(app_db, last) == 1
+
+
+def test_rejected_action_leaves_the_rest_of_the_batch(client, app_db, events):
+    event_id = events[0]
+    response = client.post('/sync', json={'actions': [
+        {'type': 'register', 'student_id': 8, 'event_id': event_id},
+        {'type': 'feedback', 'student_id': 8, 'event_id': event_id, 'rating': 9},
+        {'type': 'attendance', 'student_id': 8, 'event_id': event_id, 'status': 'present'},
+    ]})
+
+    assert [r['status'] for r in response.get_json()['results']] == ['ok', 'error', 'ok']
+    assert registrations(app_db, event_id) == 1
+    assert count(app_db.cursor(), "SELECT COUNT(*) FROM Feedback WHERE event_id = ?", (event_id,)) == 0
+    assert count(app_db.cursor(), "SELECT COUNT(*) FROM Attendance WHERE event_id = ?", (event_id,)) == 1
+
+
+def test_savepoints_stay_inside_the_batch_transaction(db, app_module):
+    cursor = db.cursor()
+    event_id = add_event(cursor, capacity=10)
+    db.commit()
+
+    results = sync.apply_actions(cursor, [
+        {'type': 'register', 'student_id': 1, 'event_id': event_id},
+        {'type': 'register', 'student_id': 2, 'event_id': event_id},
+    ], False, app_module.attendance_upsert_sql())
+    assert [r['status'] for r in results] == ['ok', 'ok']
+    assert db.in_transaction
+
+    # Nothing is committed until the caller commits
+    db.rollback()
+    assert count(cursor, "SELECT COUNT(*) FROM Registrations WHERE event_id = ?", (event_id,)) == 0
@@ -0,0 +1,363 @@
+"""
+Per-request tracing, exported as OpenTelemetry (OTLP/JSON) lines.
+
+TracingMiddleware wraps the WSGI app. Every request gets an id, taken from
+X-Request-ID if the client or proxy sent one (else generated), and echoed
+back in X-Request-ID. A W3C `traceparent` header is honoured, so traces join
+the caller's. A sampled request (TRACE_SAMPLE_RATE, or the caller's sampled
+flag) records spans:
+
+    HTTP <method> <route>   the whole request, until the body is sent
+      db.execute / db.fetch*   every statement on a traced connection
+      json.serialize           JSON encoding of the response
+      http.response.write      iterating the response body to the server
+
+Database spans come from wrapping the request's connections (traced());
+execute_query() and routes that use cursors directly are both covered.
+Each finished trace is appended to TRACE_FILE as one
+ExportTraceServiceRequest JSON object per line, which the OpenTelemetry
+Collector's otlpjsonfile receiver (and most trace tools) can read.
+Serialising and writing happen on a background thread per worker; each
+line goes out in one write() on an O_APPEND descriptor, so workers sharing
+the file never interleave lines. Unsampled requests only pay for the
+request id.
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+ENVIRON_KEY = 'campus.trace'
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+HEX32 = re.compile(r'^[0-9a-f]{32}$')
+MAX_STATEMENT = 1000
+
+
+def _span_id():
+    return os.urandom(8).hex()
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, trace, name, parent_id, attributes=None):
+        self.trace = trace
+        self.span_id = _span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def finish(self, error=None):
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = str(error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 2 if self.parent_id == self.trace.remote_parent else 1,   # SERVER / INTERNAL
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end or time.time_ns()),
+            'attributes': [_attribute(k, v) for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 0},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class Trace:
+    def __init__(self, trace_id, request_id, remote_parent=None):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.remote_parent = remote_parent
+        self.spans = []
+        self.root = None
+
+    def span(self, name, parent=None, **attributes):
+        """New child span (of the root unless `parent` is given); use as a context manager"""
+        parent_id = parent.span_id if parent else (self.root.span_id if self.root else self.remote_parent)
+        span = Span(self, name, parent_id, attributes)
+        self.spans.append(span)
+        return span
+
+
+class Exporter:
+    """
+    Appends one OTLP/JSON line per trace to a local file. export() only
+    queues the finished trace; a daemon thread (started per process, so it
+    survives a pre-fork server) serialises it and appends the line with a
+    single os.write(). Traces are dropped, and counted, while the queue is
+    full rather than slowing requests down.
+    """
+    QUEUE_SIZE = 1000
+
+    def __init__(self, path, service_name):
+        self.path = path
+        self.resource = {'attributes': [_attribute('service.name', service_name)]}
+        self.stats = {'exported': 0, 'dropped': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        atexit.register(self.close)
+
+    def export(self, trace):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.QUEUE_SIZE)
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name='trace-exporter',
+                                            daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _line(self, trace):
+        return (json.dumps({'resourceSpans': [{
+            'resource': self.resource,
+            'scopeSpans': [{
+                'scope': {'name': 'campus-events.tracing'},
+                'spans': [span.to_otlp() for span in trace.spans],
+            }],
+        }]}, separators=(',', ':')) + '\n').encode('utf-8')
+
+    def _run(self, traces):
+        fd = None
+        while True:
+            trace = traces.get()
+            if trace is None:
+                break
+            try:
+                if fd is None:
+                    fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                data = self._line(trace)
+                # One write() per line: O_APPEND places it atomically at the end of the file
+                written = os.write(fd, data)
+                while written < len(data):
+                    written += os.write(fd, data[written:])
+                self.stats['exported'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f"Trace export failed: {e}")
+        if fd is not None:
+            os.close(fd)
+
+    def close(self, timeout=2):
+        """Write out the queued traces (at exit)"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+class TracingMiddleware:
+    def __init__(self, wsgi_app, exporter, sample_rate):
+        self.wsgi_app = wsgi_app
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def __call__(self, environ, start_response):
+        request_id = environ.get('HTTP_X_REQUEST_ID') or uuid.uuid4().hex
+        trace_id, remote_parent, sampled = None, None, random.random() < self.sample_rate
+        match = TRACEPARENT.match(environ.get('HTTP_TRACEPARENT', ''))
+        if match:
+            trace_id, remote_parent = match.group(1), match.group(2)
+            sampled = sampled or int(match.group(3), 16) & 1 == 1
+        trace_id = trace_id or (request_id if HEX32.match(request_id) else uuid.uuid4().hex)
+
+        trace = None
+        if sampled and self.exporter is not None:
+            trace = Trace(trace_id, request_id, remote_parent)
+            trace.root = trace.span(
+                f"HTTP {environ.get('REQUEST_METHOD')}",
+                **{'http.method': environ.get('REQUEST_METHOD', ''),
+                   'http.target': environ.get('PATH_INFO', ''),
+                   'http.request_id': request_id}
+            )
+            environ[ENVIRON_KEY] = trace
+
+        def traced_start_response(status, headers, exc_info=None):
+            headers.append(('X-Request-ID', request_id))
+            if trace is not None:
+                trace.root.attributes['http.status_code'] = int(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, traced_start_response)
+        except Exception as e:
+            if trace is not None:
+                trace.root.finish(e)
+                self.exporter.export(trace)
+            raise
+        if trace is None:
+            return body
+        return TracedBody(body, trace, self.exporter)
+
+
+class TracedBody:
+    """Response iterable that times the body write and exports the trace on close()"""
+
+    def __init__(self, body, trace, exporter):
+        self.body = body
+        self.trace = trace
+        self.exporter = exporter
+        self.write_span = trace.span('http.response.write')
+        self.error = None
+
+    def __iter__(self):
+        try:
+            for chunk in self.body:
+                yield chunk
+        except Exception as e:
+            self.error = e
+            raise
+
+    def close(self):
+        # The server calls close() exactly once, whether or not the body was read
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.write_span.finish(self.error)
+            self.trace.root.finish(self.error)
+            try:
+                self.exporter.export(self.trace)
+            except Exception as e:
+                print(f"Trace export failed: {e}")
+
+
+class TracedCursor:
+    def __init__(self, cursor, trace, db_system):
+        self._cursor = cursor
+        self._trace = trace
+        self._db_system = db_system
+
+    def _span(self, name, statement=None):
+        attributes = {'db.system': self._db_system}
+        if statement is not None:
+            attributes['db.statement'] = ' '.join(statement.split())[:MAX_STATEMENT]
+        return self._trace.span(name, **attributes)
+
+    def execute(self, query, *args):
+        with self._span('db.execute', query) as span:
+            result = self._cursor.execute(query, *args)
+            span.attributes['db.rowcount'] = self._cursor.rowcount
+            return result
+
+    def executemany(self, query, *args):
+        with self._span('db.executemany', query) as span:
+            result = self._cursor.executemany(query, *args)
+            span.attributes['db.rowcount'] = self._cursor.rowcount
+            return result
+
+    def fetchone(self):
+        with self._span('db.fetchone'):
+            return self._cursor.fetchone()
+
+    def fetchmany(self, *args):
+        with self._span('db.fetchmany') as span:
+            rows = self._cursor.fetchmany(*args)
+            span.attributes['db.rows'] = len(rows)
+            return rows
+
+    def fetchall(self):
+        with self._span('db.fetchall') as span:
+            rows = self._cursor.fetchall()
+            span.attributes['db.rows'] = len(rows)
+            return rows
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TracedConnection:
+    def __init__(self, db, trace, db_system):
+        object.__setattr__(self, '_db', db)
+        object.__setattr__(self, '_trace', trace)
+        object.__setattr__(self, '_db_system', db_system)
+
+    def cursor(self, *args):
+        return TracedCursor(self._db.cursor(*args), self._trace, self._db_system)
+
+    def commit(self):
+        with self._trace.span('db.commit', **{'db.system': self._db_system}):
+            return self._db.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._db, name, value)
+
+
+def current_trace():
+    """The sampled trace of the current request, or None"""
+    if not has_request_context():
+        return None
+    return request.environ.get(ENVIRON_KEY)
+
+
+def traced(db):
+    """Wrap a connection opened for a sampled request; anything else is returned as is"""
+    trace = current_trace()
+    if trace is None or db is None or isinstance(db, TracedConnection):
+        return db
+    db_system = 'sqlite' if type(db).__module__.startswith('sqlite3') else 'mysql'
+    return TracedConnection(db, trace, db_system)
+
+
+class TracedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with a json.serialize span per dumps() call"""
+
+    def dumps(self, obj, **kwargs):
+        trace = current_trace()
+        if trace is None:
+            return super().dumps(obj, **kwargs)
+        with trace.span('json.serialize') as span:
+            text = super().dumps(obj, **kwargs)
+            span.attributes['json.length'] = len(text)
+            return text
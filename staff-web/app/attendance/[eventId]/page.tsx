@@ -6,14 +6,15 @@ import Link from 'next/link';
 
 const BACKEND_URL = (process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:5001').replace(/\/$/, '');
 
-interface Registration {
+interface Registrant {
   reg_id: number;
   student_id: number;
-  event_id: number;
   name: string;
   email: string;
   registration_date: string;
   college_id: string;
+  attendance_status: string | null;
+  has_feedback: boolean;
 }
 
 interface Event {
@@ -24,12 +25,10 @@ interface Event {
   college_id: string;
 }
 
-interface AttendanceRecord {
-  att_id: number;
-  student_id: number;
-  event_id: number;
-  status: string;
-  marked_date: string;
+interface RosterPage {
+  event: Event;
+  registrants: Registrant[];
+  next_cursor: string | null;
 }
 
 const EventAttendancePage: React.FC = () => {
@@ -38,8 +37,7 @@ const EventAttendancePage: React.FC = () => {
   const eventId = params?.eventId as string;
 
   const [event, setEvent] = useState<Event | null>(null);
-  const [registrations, setRegistrations] = useState<Registration[]>([]);
-  const [attendanceRecords, setAttendanceRecords] = useState<AttendanceRecord[]>([]);
+  const [registrations, setRegistrations] = useState<Registrant[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
   const [message, setMessage] = useState<string | null>(null);
@@ -47,47 +45,31 @@ const EventAttendancePage: React.FC = () => {
 
   useEffect(() => {
     if (eventId) {
-      fetchEventDetails();
-      fetchRegistrations();
-      fetchAttendanceRecords();
+      fetchRoster();
     }
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [eventId]);
 
-  const fetchEventDetails = async () => {
-    try {
-      const res = await fetch(`${BACKEND_URL}/events`);
-      if (!res.ok) throw new Error(`Failed to load events (${res.status})`);
-      const events: Event[] = await res.json();
-      const currentEvent = events.find(e => e.event_id === parseInt(eventId));
-      setEvent(currentEvent || null);
-    } catch (err) {
-      console.error('Error fetching event details:', err);
-      setError('Unable to load event details.');
-    }
-  };
-
-  const fetchRegistrations = async () => {
+  // Event header, registrants, attendance and feedback flags in one query per page
+  const fetchRoster = async () => {
     try {
-      const res = await fetch(`${BACKEND_URL}/staff/registrations/${eventId}`);
-      if (!res.ok) throw new Error(`Failed to load registrations (${res.status})`);
-      const data: Registration[] = await res.json();
-      setRegistrations(data);
+      const all: Registrant[] = [];
+      let cursor: string | null = null;
+      let header: Event | null = null;
+      do {
+        const url = `${BACKEND_URL}/events/${eventId}/roster?limit=1000${cursor ? `&cursor=${cursor}` : ''}`;
+        const res = await fetch(url);
+        if (!res.ok) throw new Error(`Failed to load roster (${res.status})`);
+        const page: RosterPage = await res.json();
+        header = page.event;
+        all.push(...page.registrants);
+        cursor = page.next_cursor;
+      } while (cursor);
+      setEvent(header);
+      setRegistrations(all);
     } catch (err) {
-      console.error('Error fetching registrations:', err);
-      setError('Unable to load registrations.');
-    }
-  };
-
-  const fetchAttendanceRecords = async () => {
-    try {
-      const res = await fetch(`${BACKEND_URL}/staff/attendance/${eventId}`);
-      if (!res.ok) throw new Error(`Failed to load attendance (${res.status})`);
-      const data: AttendanceRecord[] = await res.json();
-      setAttendanceRecords(data);
-    } catch (err) {
-      console.error('Error fetching attendance:', err);
-      setError('Unable to load attendance records.');
+      console.error('Error fetching roster:', err);
+      setError('Unable to load the event roster.');
     } finally {
       setLoading(false);
     }
@@ -111,7 +93,7 @@ const EventAttendancePage: React.FC = () => {
       const body = await res.json();
       if (!res.ok) throw new Error(body.error || 'Failed to mark attendance');
       setMessage(`Attendance marked as ${status} successfully!`);
-      await fetchAttendanceRecords();
+      setRegistrations(prev => prev.map(r => r.student_id === studentId ? { ...r, attendance_status: status } : r));
     } catch (err: any) {
       console.error('Mark attendance error:', err);
       setError(err.message || 'Error marking attendance');
@@ -120,11 +102,6 @@ const EventAttendancePage: React.FC = () => {
     }
   };
 
-  const getAttendanceStatus = (studentId: number) => {
-    const record = attendanceRecords.find(r => r.student_id === studentId);
-    return record ? record.status : null;
-  };
-
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center">
@@ -144,7 +121,7 @@ const EventAttendancePage: React.FC = () => {
 
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
         {registrations.map(reg => {
-          const status = getAttendanceStatus(reg.student_id);
+          const status = reg.attendance_status;
           return (
             <div key={reg.reg_id} className="border p-4 rounded-lg">
               <h3 className="font-semibold">{reg.name}</h3>
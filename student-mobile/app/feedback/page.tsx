@@ -81,7 +81,9 @@ const FeedbackPage: React.FC = () => {
     setError(null);
 
     try {
-      const studentResponse = await fetch(`${API_BASE_URL}/students/find-or-create`, {
+      // Resolves the student, checks the registration and stores the
+      // feedback in one transaction
+      const feedbackResponse = await fetch(`${API}/actions/submit-feedback`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -89,23 +91,7 @@ const FeedbackPage: React.FC = () => {
         body: JSON.stringify({
           college_id: studentId,
           name: studentName,
-          email: studentEmail
-        }),
-      });
-
-      const studentData = await studentResponse.json();
-
-      if (!studentResponse.ok) {
-        throw new Error(studentData.error || 'Failed to find or create student');
-      }
-
-      const feedbackResponse = await fetch(`${API}/feedback`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          student_id: studentData.student_id,
+          email: studentEmail,
           event_id: selectedEvent,
           rating: rating,
           feedback_text: feedbackText